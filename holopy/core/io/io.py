@@ -33,7 +33,7 @@ import importlib
 
 from . import serialize
 from ..metadata import data_grid, get_spacing, update_metadata, copy_metadata, to_vector, illumination, clean_concat
-from ..utils import is_none, ensure_array, dict_without
+from ..utils import is_none, ensure_array, dict_without, updated
 from ..errors import NoMetadata, BadImage, LoadError
 
 attr_coords = '_attr_coords'
@@ -287,6 +287,53 @@ def save(outf, obj):
     else:
         serialize.save(outf, obj)
 
+def save_frames(outf, frames, nframes, dim='frame'):
+    """
+    Save a sequence of equally shaped arrays to a single file as they are
+    produced
+
+    Each frame is written to disk as soon as it is available, so the whole
+    sequence never needs to be held in memory. The file can be read back with
+    :func:`load`, giving an array with a new leading dimension.
+
+    Parameters
+    ----------
+    outf : basestring
+        Name of the file to save to
+    frames : iterable of xarray.DataArray
+        The frames to save. Metadata and coordinates are taken from the first
+        frame
+    nframes : int
+        Number of frames in frames
+    dim : basestring (optional)
+        Name of the new dimension indexing the frames
+    """
+    import h5netcdf
+
+    outf = default_extension(outf)
+    frames = iter(frames)
+    first = next(frames)
+    name = first.name
+    if name is None:
+        name = os.path.splitext(os.path.split(outf)[-1])[0]
+
+    with h5netcdf.File(outf, 'w') as f:
+        f.dimensions = updated(dict(first.sizes), {dim: nframes})
+        f.create_variable(dim, (dim,), data=np.arange(nframes))
+        for key, coord in first.coords.items():
+            f.create_variable(key, coord.dims, data=coord.values)
+        var = f.create_variable(name, (dim,) + first.dims, first.dtype)
+        for key, val in pack_attrs(first).items():
+            if val is not None:
+                var.attrs[key] = val
+        others = [key for key in first.coords if key not in first.dims]
+        if others:
+            var.attrs['coordinates'] = ' '.join(others)
+
+        var[0] = first.values
+        for i, frame in enumerate(frames, 1):
+            var[i] = frame.transpose(*first.dims).values
+
 def save_image(filename, im, scaling='auto', depth=8):
     """Save an ndarray or image as a tiff.
 
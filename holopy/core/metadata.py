@@ -195,8 +195,12 @@ def update_metadata(a, medium_index=None, illum_wavelen=None, illum_polarization
         copy of input image with updated metadata. The 'normals' field is not allowed to be empty.
     """
 
-    attrlist = {'medium_index': medium_index, 'illum_wavelen': dict_to_array(a,illum_wavelen), 'illum_polarization': dict_to_array(a,to_vector(illum_polarization)), 'normals': to_vector(normals), 'noise_sd': dict_to_array(a,noise_sd)}
-    b = a.copy()
+    return _set_metadata(a.copy(), medium_index, illum_wavelen, illum_polarization, normals, noise_sd)
+
+def _set_metadata(b, medium_index=None, illum_wavelen=None, illum_polarization=None, normals=None, noise_sd=None):
+    # update_metadata without the copy, so callers which only need new
+    # metadata can pass a shallow copy and avoid copying the data
+    attrlist = {'medium_index': medium_index, 'illum_wavelen': dict_to_array(b,illum_wavelen), 'illum_polarization': dict_to_array(b,to_vector(illum_polarization)), 'normals': to_vector(normals), 'noise_sd': dict_to_array(b,noise_sd)}
     b.attrs = updated(b.attrs, attrlist)
 
     for attr in attrlist:
@@ -144,6 +144,45 @@ def subimage(arr, center, shape):
 
     return copy_metadata(arr, arr.isel(x=extent[0], y=extent[1]))
 
+def radial_profile(image, center, nbins=None):
+    """
+    Azimuthally average an image about a point
+
+    Pixels are binned by their distance from center, rounded to the nearest
+    multiple of the pixel spacing, so element i of the result is the average
+    of the image on a ring of radius i pixels.
+
+    Parameters
+    ----------
+    image : xarray.DataArray
+        Image with x and y coordinates
+    center : tuple of floats
+        x and y coordinates (in the units of the image, not pixels) about which
+        to average
+    nbins : int (optional)
+        Number of rings to return. Defaults to every ring which contains at
+        least one pixel. Rings which extend past the edge of the image are
+        averaged over the pixels they do contain; rings with no pixels are nan.
+
+    Returns
+    -------
+    profile : numpy.ndarray
+        average image value on each ring
+    """
+    spacing = get_spacing(image).mean()
+    x, y = np.meshgrid(image.x.values, image.y.values, indexing='ij')
+    values = image.transpose('x', 'y', *[d for d in image.dims
+                                         if d not in ('x', 'y')]).values
+    values = values.reshape(x.shape)
+    rings = np.round(np.hypot(x - center[0], y - center[1]) / spacing).astype(int)
+    if nbins is None:
+        nbins = rings.max() + 1
+    inside = rings < nbins
+    counts = np.bincount(rings[inside], minlength=nbins)
+    sums = np.bincount(rings[inside], values[inside], minlength=nbins)
+    with np.errstate(invalid='ignore'):
+        return sums / counts
+
 def add_noise(image, noise_mean=.1, smoothing=.01, poisson_lambda=1000):
     """Add simulated noise to images. Intended for use with exact
     calculated images to make them look more like noisy 'real'
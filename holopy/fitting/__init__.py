@@ -33,7 +33,9 @@ The fitting module is used to:
 
 """
 
-from .fit import fit, rsq, chisq, FitResult, make_subset_data
+from .fit import (fit, fit_series, fit_multistart, rsq, chisq, FitResult,
+                  make_subset_data, crop_to_fringes)
 from .model import Model, Parametrization
 from .parameter import Parameter, ComplexParameter
-from .minimizer import Nmpfit
+from .minimizer import Nmpfit, LeastSquares
+from .lookup import MieLookupTable
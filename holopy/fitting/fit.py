@@ -25,8 +25,12 @@ Routines for fitting a hologram to an exact solution
 """
 
 
+import os
+import inspect
 import warnings
 import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
 from copy import copy, deepcopy
 import yaml
 
@@ -36,8 +40,14 @@ from ..core.holopy_object import HoloPyObject
 from holopy.core.metadata import flat, copy_metadata, get_spacing
 from holopy.core.math import chisq, rsq
 from holopy.core.utils import dict_without
+from holopy.core.io import load
+from holopy.core.process import center_find, subimage
 from .errors import MinimizerConvergenceFailed, InvalidMinimizer
 from .minimizer import Minimizer, Nmpfit
+from .parameter import Parameter
+from ..scattering import PreparedSchema, calc_holo, calc_field, calc_intensity
+from ..scattering.errors import MissingParameter
+from ..scattering.scatterer import checkguess
 
 def make_subset_data(data, random_subset=None, pixels=None, return_selection=False):
     if random_subset is None and pixels is None:
@@ -65,7 +75,69 @@ def make_subset_data(data, random_subset=None, pixels=None, return_selection=Fal
     else:
         return subset
 
-def fit(model, data, minimizer=Nmpfit, random_subset=None):
+def crop_to_fringes(data, model, center=None, lobes=1):
+    """
+    Crop an image to the region holding the fringes of a model's scatterer
+
+    The fringes of a particle of radius r a distance z from the detector are
+    taken to extend to the edge of the central lobe of its forward scattering,
+    at :math:`\\sin\\theta = 1.22 \\lambda_{med} / 2 r`, or to the angle past
+    which fringes are finer than two pixels and alias, whichever is smaller.
+    r and z are the guesses in model; for composite scatterers each
+    component's fringes are included.
+
+    Parameters
+    ----------
+    data : xarray.DataArray
+        Image to crop
+    model : :class:`~holopy.fitting.model.BaseModel`
+        Model whose scatterer made the fringes, with guesses for its size and
+        position. medium_index and illum_wavelen are taken from data if the
+        model does not give them.
+    center : tuple of floats (optional)
+        Pixel coordinates of the fringes' center. If not given, it is found
+        with :func:`~holopy.core.process.center_find`.
+    lobes : float (optional)
+        Number of scattering lobes to keep
+
+    Returns
+    -------
+    cropped : xarray.DataArray
+        The part of data centered on the fringes, keeping its coordinates, so
+        parameters fit to it are in the coordinates of the original image.
+    """
+    if center is None:
+        center = center_find(data)
+    spacing = get_spacing(data)
+    med_wavelen = (np.max(checkguess(model.par('illum_wavelen', data))) /
+                   np.min(checkguess(model.par('medium_index', data))))
+    detector_z = float(data.z.values.mean()) if 'z' in data.coords else 0
+    guess = model.scatterer.guess
+    components = getattr(guess, 'scatterers', [guess])
+    middle = np.mean([s.center for s in components], axis=0)
+
+    half_width = 0
+    for s in components:
+        bounds = np.array(s.bounds) - np.array(s.center)[:, np.newaxis]
+        r = np.abs(bounds).max()
+        sin_theta = min(lobes * 1.22 * med_wavelen / (2 * r),
+                        med_wavelen / (2 * spacing.min()), 1)
+        radius = (s.center[2] - detector_z) * np.tan(np.arcsin(sin_theta))
+        offset = np.abs(np.array(s.center[:2]) - middle[:2])
+        half_width = np.maximum(half_width, abs(radius) + offset)
+
+    full = np.array([len(data.x), len(data.y)])
+    # subimage wants even shapes
+    shape = np.minimum(2 * np.ceil(half_width / spacing), full // 2 * 2)
+    shape = shape.astype(int)
+    # keep the window inside the image rather than cropping it at the edges
+    center = np.clip(np.round(center), shape // 2, full - shape // 2)
+    extra = data.ndim - 2
+    return subimage(data, list(center) + [0] * extra,
+                    list(shape) + [1] * extra)
+
+def fit(model, data, minimizer=Nmpfit, random_subset=None, lookup=None,
+        analytic_derivatives=False, pixel_schedule=None, crop_fringes=False):
     """
     fit a model to some data
 
@@ -80,6 +152,33 @@ def fit(model, data, minimizer=Nmpfit, random_subset=None):
         The minimizer to use to do the fit
     random_subset : float (optional)
         Fit only a randomly selected fraction of the data points in data
+    lookup : (optional) :class:`~holopy.fitting.lookup.MieLookupTable`
+        Start the fit from the table entry which best matches data instead of
+        from the guesses in model. Parameters named r, n (or n.real), z (or
+        center[2]) and alpha are set from the table, and x (or center[0]) and
+        y (or center[1]) are used as the hologram center. Guesses are clipped
+        to the parameter limits.
+    analytic_derivatives : bool (optional)
+        Give the minimizer exact derivatives of the residual with respect to
+        the parameters, computed with :func:`.calc_holo_derivatives`, instead
+        of having it estimate them by finite differences. This is possible for
+        holograms of a single sphere where only its center, n, r and alpha
+        vary (see :attr:`.Model.derivative_names`); otherwise a warning is
+        given and finite differences are used. The minimizer must accept a
+        jacobian argument, as :class:`.Nmpfit` and :class:`.LeastSquares` do.
+    pixel_schedule : int or list of int (optional)
+        Fit coarse to fine: first fit random subsets of data with these numbers
+        of pixels, each starting from the result of the last, before the final
+        fit to all of data (or random_subset of it). Early iterations, when the
+        guess is far off, are then cheap, and the final fit starts close to
+        its answer. An int gives that many stages, with pixel counts growing
+        geometrically from MIN_STAGE_PIXELS, as in
+        :class:`~holopy.inference.TemperedStrategy`. The model in the result
+        holds the guesses the final fit started from.
+    crop_fringes : bool (optional)
+        Fit only the part of data around the scatterer's fringes, found with
+        :func:`crop_to_fringes` from the model's guesses (after any lookup).
+        Fitted positions are still in the coordinates of data.
 
     Returns
     -------
@@ -95,16 +194,40 @@ def fit(model, data, minimizer=Nmpfit, random_subset=None):
             raise InvalidMinimizer("Object supplied as a minimizer could not be"
                                    "interpreted as a minimizer")
 
+    if lookup is not None:
+        model = _seed_from_lookup(model, data, lookup)
+
+    if crop_fringes:
+        data = crop_to_fringes(data, model)
+
+    if analytic_derivatives:
+        if getattr(model, "derivative_names", None) is None:
+            warnings.warn("Analytic derivatives are not available for this "
+                          "model, using finite differences")
+            analytic_derivatives = False
+
+    full_data = data
     if random_subset is None:
         data = flat(data)
     else:
         data = make_subset_data(data, random_subset)
 
-    def residual(par_vals):
-        return model.residual(par_vals, data)
-
+    for pixels in _pixel_stages(pixel_schedule, data.sizes['flat']):
+        subset = make_subset_data(full_data, pixels=pixels)
+        try:
+            stage_pars, _ = _minimize(model, subset,
+                                      _prepare_schema(model, subset),
+                                      minimizer, analytic_derivatives)
+        except MinimizerConvergenceFailed as cf:
+            # the next stage carries on from wherever this one got to
+            stage_pars = cf.result
+        model = _model_with_guesses(model, stage_pars)
+
+    # residuals are computed with schema, or with data itself if it is None
+    schema = _prepare_schema(model, data)
     try:
-        fitted_pars, minimizer_info = minimizer.minimize(model.parameters, residual)
+        fitted_pars, minimizer_info = _minimize(model, data, schema, minimizer,
+                                                analytic_derivatives)
         converged = True
     except MinimizerConvergenceFailed as cf:
         warnings.warn("Minimizer Convergence Failed, your results may not be "
@@ -118,13 +241,345 @@ def fit(model, data, minimizer=Nmpfit, random_subset=None):
     fitted_scatterer = model.scatterer.make_from(fitted_pars)
 
     time_stop = time.time()
-    fitted = model._calc(fitted_pars, data)
+    # usually the minimizer has just computed this, so it comes from the
+    # model's cache
+    fitted = model._calc(fitted_pars, data if schema is None else schema)
+    # the result keeps the model, and should not keep its cached holograms
+    model.cache_clear()
 
     return FitResult(fitted_pars, fitted_scatterer, chisq(fitted, data),
                      rsq(fitted, data), converged, time_stop - time_start,
                      model, minimizer, minimizer_info)
 
 
+def fit_series(model, frames, filename=None, segments=1, warm_start=True,
+               executor=None, **kwargs):
+    """
+    fit a model to each frame of a time series
+
+    Parameters
+    ----------
+    model : :class:`~holopy.fitting.model.Model` object
+        Model to fit to the first frame (of each segment, if warm_start)
+    frames : sequence
+        The frames to fit, which may be loaded lazily: anything with a length
+        which gives a frame when indexed. This includes a DataArray, whose
+        first dimension indexes the frames. Frames which are strings are
+        loaded with :func:`.load` when they are fit, in the process fitting
+        them.
+    filename : string (optional)
+        A file to which each fit's parameters, chisq, rsq, convergence and
+        time are written, one tab separated line per frame, as soon as it is
+        done. If the file already holds results, frames found in it are not
+        fit again, so an interrupted series can be resumed.
+    segments : int (optional)
+        Split the frames into this many contiguous segments which are fit
+        concurrently, each starting from model. If executor is not given, a
+        process pool with one process per segment is used.
+    warm_start : bool (optional)
+        Start the fit of each frame from the results for the previous frame in
+        its segment (see :meth:`FitResult.next_model`), rather than from
+        model. If False, every frame can be fit concurrently.
+    executor : concurrent.futures.Executor (optional)
+        Where to do the fits. If None and there is one segment, they are done
+        in this process.
+    **kwargs
+        Passed to :func:`fit`
+
+    Returns
+    -------
+    results : list of :class:`FitResult`
+        The result for each frame. Results read from filename are
+        incomplete, like those from :meth:`FitResult.from_summary`.
+    """
+    done = {}
+    if filename is not None:
+        done, text = _read_series_table(filename, model)
+        table = open(filename, 'a')
+        if not text:
+            table.write('\t'.join(_series_columns(model)) + '\n')
+        elif not text.endswith('\n'):
+            # finish a line left unfinished when the series was interrupted
+            table.write('\n')
+    own_executor = executor is None and segments > 1
+    if own_executor:
+        executor = ProcessPoolExecutor(segments)
+
+    def submit(model, i):
+        args = (model, frames[i], kwargs)
+        if executor is None:
+            future = Future()
+            future.set_result(_fit_frame(*args))
+        else:
+            future = executor.submit(_fit_frame, *args)
+        future.frame = i
+        return future
+
+    results = [None] * len(frames)
+    for i, row in done.items():
+        results[i] = _series_result(model, row)
+    firsts = set()
+
+    def start_model(i):
+        # warm start from the frame before, whether fit now or read from
+        # filename, unless it is in another segment
+        if warm_start and i not in firsts and results[i - 1] is not None:
+            return _model_with_guesses(model, results[i - 1].parameters)
+        return model
+
+    chains = {}
+    pending = set()
+    edges = np.linspace(0, len(frames), segments + 1).astype(int)
+    for start, stop in zip(edges[:-1], edges[1:]):
+        firsts.add(start)
+        todo = [i for i in range(start, stop) if i not in done]
+        if warm_start and todo:
+            chains[todo[0]] = todo[1:]
+            pending.add(submit(start_model(todo[0]), todo[0]))
+        else:
+            pending.update(submit(start_model(i), i) for i in todo)
+
+    try:
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(finished, key=lambda f: f.frame):
+                i = future.frame
+                results[i] = future.result()
+                if filename is not None:
+                    table.write(_series_row(i, results[i], model) + '\n')
+                    table.flush()
+                rest = chains.pop(i, [])
+                if rest:
+                    chains[rest[0]] = rest[1:]
+                    pending.add(submit(start_model(rest[0]), rest[0]))
+    finally:
+        if filename is not None:
+            table.close()
+        if own_executor:
+            executor.shutdown()
+    return results
+
+def fit_multistart(model, data, starts=16, pixels=1000, keep=3, priors=None,
+                   executor=None, seed=None, **kwargs):
+    """
+    fit a model from many starting points to avoid local minima
+
+    Quick fits from each starting point to the same small random subset of
+    data are done concurrently, then the best few of them are finished by
+    fitting all of data.
+
+    Parameters
+    ----------
+    model : :class:`~holopy.fitting.model.Model` object
+        The model to fit. Its guesses are the first starting point.
+    data : xarray.DataArray
+        The data to fit
+    starts : int (optional)
+        Number of starting points
+    pixels : int (optional)
+        Number of pixels in the subset fit from every starting point
+    keep : int (optional)
+        Number of the best subset fits to finish
+    priors : dict (optional)
+        :class:`~holopy.inference.prior.Prior` objects to draw starting values
+        of the parameters named by their keys from. Other parameters are drawn
+        uniformly from their limits, or kept at their guesses if they have no
+        limits. Values are clipped to the limits.
+    executor : concurrent.futures.Executor (optional)
+        Where to do the fits. If None, a process pool is used.
+    seed : int (optional)
+        Seed for the random starting points and subset
+    **kwargs
+        Passed to :func:`fit`
+
+    Returns
+    -------
+    results : list of :class:`FitResult`
+        The finished fits, best (lowest chisq) first. Fits which did not
+        converge are included, with converged False, without a warning.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    lookup = kwargs.pop('lookup', None)
+    if lookup is not None:
+        # the table's guess is the first starting point
+        model = _seed_from_lookup(model, data, lookup)
+    if kwargs.pop('crop_fringes', False):
+        data = crop_to_fringes(data, model)
+    quick_kwargs = dict_without(kwargs, ['random_subset', 'pixel_schedule'])
+    if pixels < len(data.x) * len(data.y):
+        # every start fits the same pixels so that their chisqs compare
+        subset = make_subset_data(data, pixels=pixels)
+    else:
+        subset = data
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor()
+    try:
+        quick = [executor.submit(_fit_quietly, start, subset, quick_kwargs)
+                 for start in _start_models(model, starts, priors)]
+        quick = sorted((f.result() for f in quick), key=lambda r: r.chisq)
+        final = [executor.submit(_fit_quietly, result.next_model(), data,
+                                 kwargs) for result in quick[:keep]]
+        return sorted((f.result() for f in final), key=lambda r: r.chisq)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+def _start_models(model, starts, priors):
+    if priors is None:
+        priors = {}
+    values = {}
+    for p in model.parameters:
+        if p.name in priors:
+            v = priors[p.name].sample(size=starts)
+        elif p.limit is not None and not p.fixed:
+            v = np.random.uniform(p.limit[0], p.limit[1], starts)
+        else:
+            v = np.repeat(p.guess, starts)
+        if p.limit is not None and not p.fixed:
+            v = np.clip(v, *p.limit)
+        v[0] = p.guess
+        values[p.name] = v
+    return [_model_with_guesses(model, {name: v[i] for name, v in values.items()})
+            for i in range(starts)]
+
+def _fit_quietly(model, data, kwargs):
+    # fits from poor starting points are expected not to converge, which is
+    # recorded in their results rather than warned about
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return fit(model, data, **kwargs)
+
+def _fit_frame(model, frame, kwargs):
+    # a module level function so process pools can run it
+    if isinstance(frame, str):
+        frame = load(frame)
+    return fit(model, frame, **kwargs)
+
+def _model_with_guesses(model, parameters):
+    model = deepcopy(model)
+    for p in model.parameters:
+        p.guess = parameters[p.name]
+    return model
+
+SERIES_MISC = ['chisq', 'rsq', 'converged', 'time']
+
+def _series_columns(model):
+    return ['frame'] + [p.name for p in model.parameters] + SERIES_MISC
+
+def _series_row(frame, result, model):
+    values = [result.parameters[p.name] for p in model.parameters]
+    values += [getattr(result, key) for key in SERIES_MISC]
+    # plain floats and bools, since the reprs of numpy scalars (np.float64(1.5)
+    # in numpy 2) cannot be read back
+    fields = [str(bool(v)) if key == 'converged' else repr(float(v))
+              for key, v in zip(_series_columns(model)[1:], values)]
+    return '\t'.join([str(frame)] + fields)
+
+def _read_series_table(filename, model):
+    # results of the frames already in a fit_series output file, as a dict of
+    # frame: {column: value}, and the file's contents
+    if not os.path.exists(filename):
+        return {}, ''
+    with open(filename) as table:
+        text = table.read()
+    if not text:
+        return {}, text
+    columns = _series_columns(model)
+    lines = text.split('\n')
+    if lines[0].split('\t') != columns:
+        raise ValueError("{0} holds results for other parameters than those "
+                         "of this model".format(filename))
+    done = {}
+    # the last line is empty, or was left unfinished by an interruption
+    for line in lines[1:-1]:
+        fields = line.split('\t')
+        if len(fields) != len(columns):
+            continue
+        row = {key: value == 'True' if key == 'converged' else float(value)
+               for key, value in zip(columns[1:], fields[1:])}
+        done[int(fields[0])] = row
+    return done, text
+
+def _series_result(model, row):
+    parameters = {p.name: row[p.name] for p in model.parameters}
+    return FitResult(parameters, model.scatterer.make_from(parameters),
+                     row['chisq'], row['rsq'], row['converged'], row['time'],
+                     model=None, minimizer=None, minimization_details=None)
+
+def _minimize(model, data, schema, minimizer, analytic_derivatives):
+    # partials rather than closures, so that they can be pickled for
+    # minimizers which compute residuals in other processes
+    residual = partial(model.residual, data=data, schema=schema)
+    if not analytic_derivatives:
+        return minimizer.minimize(model.parameters, residual)
+    if not _accepts_jacobian(minimizer):
+        raise InvalidMinimizer("{0} does not accept analytic derivatives, "
+                               "fit with analytic_derivatives=False".format(
+                                   type(minimizer).__name__))
+    jacobian = partial(model.residual_and_jacobian, data=data)
+    return minimizer.minimize(model.parameters, residual, jacobian=jacobian)
+
+def _accepts_jacobian(minimizer):
+    # minimizers written before analytic derivatives have no jacobian argument
+    parameters = inspect.signature(minimizer.minimize).parameters.values()
+    return any(p.name == 'jacobian' or p.kind == p.VAR_KEYWORD
+               for p in parameters)
+
+# smallest number of pixels fit in the first stage of an automatic
+# pixel_schedule
+MIN_STAGE_PIXELS = 100
+
+def _pixel_stages(schedule, total):
+    # numbers of pixels to fit before fitting all total of them
+    if schedule is None:
+        return []
+    if np.isscalar(schedule):
+        if total <= MIN_STAGE_PIXELS:
+            return []
+        schedule = np.logspace(np.log10(MIN_STAGE_PIXELS), np.log10(total),
+                               schedule + 1)[:-1]
+    return sorted(int(round(p)) for p in schedule if p < total)
+
+def _prepare_schema(model, data):
+    # prepare data once for the model's calculations if the optics do not
+    # vary during the fit, otherwise every calculation prepares it
+    if getattr(model, 'calc_func', None) not in (calc_holo, calc_field, calc_intensity):
+        return None
+    optics = {}
+    for name in ['medium_index', 'illum_wavelen', 'illum_polarization']:
+        if hasattr(model, name + '_names') or isinstance(getattr(model, name, None), Parameter):
+            return None
+        optics[name] = getattr(model, name, None)
+    try:
+        return PreparedSchema(data, **optics)
+    except MissingParameter:
+        return None
+
+def _seed_from_lookup(model, data, lookup):
+    names = {'r': 'r', 'n': 'n', 'n.real': 'n', 'z': 'z', 'center[2]': 'z',
+             'alpha': 'alpha', 'x': 'x', 'center[0]': 'x', 'y': 'y',
+             'center[1]': 'y'}
+    guesses = {names[p.name]: p.guess for p in model.parameters
+               if p.name in names}
+    if 'x' in guesses and 'y' in guesses:
+        center = guesses['x'], guesses['y']
+    else:
+        center = None
+    guesses = lookup.guess(data, center)
+
+    model = deepcopy(model)
+    for par in model.parameters:
+        if par.name in names and names[par.name] in ['r', 'n', 'z', 'alpha']:
+            guess = guesses[names[par.name]]
+            if par.limit is not None:
+                guess = np.clip(guess, *par.limit)
+            par.guess = guess
+    return model
+
+
 class FitResult(HoloPyObject):
     """
     The results of a fit.
@@ -183,12 +638,7 @@ class FitResult(HoloPyObject):
         """
         Construct a model to fit the next frame in a time series
         """
-        nextmodel = deepcopy(self.model)
-
-        for p in nextmodel.parameters:
-            name = p.name
-            p.guess = self.parameters[name]
-        return nextmodel
+        return _model_with_guesses(self.model, self.parameters)
 
     @classmethod
     def from_summary(cls, summary, scatterer_cls):
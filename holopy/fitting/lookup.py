@@ -0,0 +1,244 @@
+# Copyright 2011-2016, Vinothan N. Manoharan, Thomas G. Dimiduk,
+# Rebecca W. Perry, Jerome Fung, Ryan McGorty, Anna Wang, Solomon Barkley
+#
+# This file is part of HoloPy.
+#
+# HoloPy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HoloPy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HoloPy.  If not, see <http://www.gnu.org/licenses/>.
+"""
+Precomputed tables of single sphere holograms for finding initial guesses
+"""
+
+import yaml
+import numpy as np
+
+from ..core.holopy_object import HoloPyObject
+from ..core.math import to_spherical
+from ..core.metadata import to_vector, get_spacing
+from ..core.process import center_find, radial_profile
+from ..scattering import Sphere, Mie
+
+# number of azimuthal angles averaged over to compute each radial profile
+N_AZIMUTHS = 16
+
+class MieLookupTable(HoloPyObject):
+    """
+    Radial hologram profiles of single spheres over a grid of r, n and z
+
+    The table stores the azimuthally averaged hologram of a sphere at every
+    combination of the r, n and z values given, on rings one pixel apart. A
+    measured hologram can then be compared against every entry at once to find
+    a starting point for a fit in much less time than it would take to compute
+    the holograms.
+
+    Parameters
+    ----------
+    r : array_like
+        sphere radii
+    n : array_like
+        sphere indices of refraction
+    z : array_like
+        distances from the sphere center to the detector
+    illum_wavelen : float
+        wavelength of illumination (in vacuum)
+    medium_index : float
+        index of refraction of the medium
+    spacing : float
+        pixel spacing of the detector
+    illum_polarization : tuple (optional)
+        polarization of the illumination
+    nbins : int (optional)
+        number of rings (pixels from the hologram center) in each profile
+    filename : string (optional)
+        If given, store the profiles in this file and memory map them rather
+        than holding them in memory. If the file already holds a table computed
+        with the same arguments it is reused, otherwise it is recomputed and
+        overwritten. The arguments are stored in filename + '.yaml'.
+    theory : :class:`.Mie` (optional)
+        theory used to compute the profiles
+    """
+    def __init__(self, r, n, z, illum_wavelen, medium_index, spacing,
+                 illum_polarization=(1, 0), nbins=100, filename=None,
+                 theory=None):
+        self.r = np.array(r, dtype=float)
+        self.n = np.array(n, dtype=float)
+        self.z = np.array(z, dtype=float)
+        self.illum_wavelen = illum_wavelen
+        self.medium_index = medium_index
+        self.spacing = spacing
+        self.illum_polarization = illum_polarization
+        self.nbins = nbins
+        self.filename = filename
+        if theory is None:
+            theory = Mie()
+        self.theory = theory
+
+        shape = (len(self.r), len(self.n), len(self.z), nbins)
+        if filename is None:
+            self._profiles = np.empty(shape)
+            self._compute_profiles(self._profiles)
+        else:
+            key = self._cache_key()
+            try:
+                with open(filename + '.yaml') as f:
+                    stale = yaml.safe_load(f) != key
+            except FileNotFoundError:
+                stale = True
+            if stale:
+                profiles = np.lib.format.open_memmap(filename, mode='w+',
+                                                     dtype=float, shape=shape)
+                self._compute_profiles(profiles)
+                profiles.flush()
+                del profiles
+                with open(filename + '.yaml', 'w') as f:
+                    yaml.safe_dump(key, f)
+            self._profiles = np.load(filename, mmap_mode='r')
+
+    def _cache_key(self):
+        return {'r': self.r.tolist(), 'n': self.n.tolist(), 'z': self.z.tolist(),
+                'illum_wavelen': float(self.illum_wavelen),
+                'medium_index': float(self.medium_index),
+                'spacing': float(self.spacing),
+                'illum_polarization': np.array(self.illum_polarization,
+                                               dtype=float).tolist(),
+                'nbins': int(self.nbins), 'theory': repr(self.theory)}
+
+    def _compute_profiles(self, profiles):
+        medium_wavevec = 2*np.pi/(self.illum_wavelen/self.medium_index)
+        pol = to_vector(self.illum_polarization)
+        z, rho, phi = np.meshgrid(self.z, np.arange(self.nbins) * self.spacing,
+                                  np.arange(N_AZIMUTHS) * 2*np.pi/N_AZIMUTHS,
+                                  indexing='ij')
+        # we define positive z opposite light propagation, as in calc_holo
+        pos = to_spherical(rho*np.cos(phi), rho*np.sin(phi), z)
+        pos = np.vstack((pos['r'].ravel() * medium_wavevec,
+                         pos['theta'].ravel(), pos['phi'].ravel()))
+        phase = np.exp(-1j*medium_wavevec*z.ravel())
+        for i, r in enumerate(self.r):
+            for j, n in enumerate(self.n):
+                field = np.array(self.theory._raw_fields(
+                    pos, Sphere(n=n, r=r, center=(0, 0, 0)),
+                    medium_wavevec=medium_wavevec,
+                    medium_index=self.medium_index,
+                    illum_polarization=pol)) * phase
+                holo = (np.abs(field[0] + pol.values[0])**2 +
+                        np.abs(field[1] + pol.values[1])**2)
+                profiles[i, j] = holo.reshape(z.shape).mean(axis=-1)
+
+    @property
+    def profiles(self):
+        """
+        Table of profiles, indexed by r, n, z and ring
+        """
+        return self._profiles
+
+    def query(self, profile, interpolate=False):
+        """
+        Find the sphere whose hologram best matches a radial profile
+
+        Each tabulated profile is compared to the measured one after scaling
+        its deviation from 1 by the least squares value of alpha, so
+        holograms need to be normalized but need not have alpha = 1.
+
+        Parameters
+        ----------
+        profile : array_like
+            measured radial profile, as returned by
+            :func:`~holopy.core.process.radial_profile` with pixel spacing
+            equal to the table's. Bins past the end of the table or which are
+            nan are ignored.
+        interpolate : bool (optional)
+            If True, refine the best matching grid point by fitting a parabola
+            through its neighbours along each of r, n and z. Otherwise return
+            the nearest grid point.
+
+        Returns
+        -------
+        guess : dict
+            best matching r, n, z (distance from the detector) and alpha
+        """
+        profile = np.asarray(profile, dtype=float)[:self.nbins]
+        use = np.isfinite(profile)
+        v = profile[use] - 1
+        chisq = np.empty(self._profiles.shape[:3])
+        alpha = np.empty_like(chisq)
+        # work on one radius at a time so memory mapped tables are only read
+        # in pieces
+        for i in range(len(self.r)):
+            u = self._profiles[i][..., :len(profile)][..., use] - 1
+            uv = u.dot(v)
+            uu = (u*u).sum(axis=-1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                alpha[i] = uv / uu
+                chisq[i] = v.dot(v) - uv * alpha[i]
+        chisq[~np.isfinite(chisq)] = np.inf
+        best = np.unravel_index(chisq.argmin(), chisq.shape)
+
+        guess = {'alpha': alpha[best]}
+        for axis, name in enumerate(['r', 'n', 'z']):
+            grid = getattr(self, name)
+            guess[name] = grid[best[axis]]
+            if interpolate and 0 < best[axis] < len(grid) - 1:
+                index = list(best)
+                index[axis] = slice(best[axis] - 1, best[axis] + 2)
+                guess[name] = _parabola_minimum(grid[index[axis]],
+                                                chisq[tuple(index)])
+        return guess
+
+    def guess(self, image, center=None, interpolate=False):
+        """
+        Guess the sphere which produced a hologram
+
+        Parameters
+        ----------
+        image : xarray.DataArray
+            normalized hologram of a single sphere, with the same pixel spacing
+            as the table
+        center : tuple of floats (optional)
+            x and y coordinates of the hologram center. If not given, it is
+            found with :func:`~holopy.core.process.center_find`.
+        interpolate : bool (optional)
+            Passed to :meth:`query`
+
+        Returns
+        -------
+        guess : dict
+            best matching r, n, x, y, z and alpha. z is the z coordinate of the
+            sphere center, so it includes the z coordinate of the detector.
+        """
+        if not np.allclose(get_spacing(image), self.spacing):
+            raise ValueError("Image pixel spacing {0} does not match lookup "
+                             "table spacing {1}".format(get_spacing(image),
+                                                        self.spacing))
+        if center is None:
+            center = (center_find(image) * get_spacing(image) +
+                      [image.x.values[0], image.y.values[0]])
+        guess = self.query(radial_profile(image, center, self.nbins),
+                           interpolate)
+        guess['x'], guess['y'] = center[0], center[1]
+        if 'z' in image.coords:
+            guess['z'] = guess['z'] + float(image.z.values.mean())
+        return guess
+
+
+def _parabola_minimum(x, y):
+    # vertex of the parabola through three points, kept within them
+    (x0, x1, x2), (y0, y1, y2) = x, y
+    if not np.all(np.isfinite(y)):
+        return x1
+    denom = (x0 - x1)*(x0 - x2)*(x1 - x2)
+    a = (x2*(y1 - y0) + x1*(y0 - y2) + x0*(y2 - y1)) / denom
+    b = (x2**2*(y0 - y1) + x1**2*(y2 - y0) + x0**2*(y1 - y2)) / denom
+    if a <= 0:
+        return x1
+    return np.clip(-b/(2*a), x0, x2)
@@ -24,7 +24,10 @@ of third party minimizers.
 
 
 
+from copy import copy
+
 import numpy as np
+from scipy.optimize import least_squares
 from ..core.holopy_object import HoloPyObject
 from .errors import ParameterSpecificationError, MinimizerConvergenceFailed
 from .third_party import nmpfit
@@ -34,7 +37,7 @@ class Minimizer(HoloPyObject):
     """
     Common interface to all minimizers holopy supports
     """
-    def minimize(self, parameters, cost_func):
+    def minimize(self, parameters, cost_func, *, jacobian=None):
         """
         Find the best solution to an optimization problem
 
@@ -45,6 +48,13 @@ class Minimizer(HoloPyObject):
         cost_func : function
             A function taking parameters as arguments that returns the residual
             for the minimization problem
+        jacobian : function (optional)
+            A function taking the same arguments as cost_func that returns the
+            residual and its derivatives with respect to each of parameters,
+            an array (residuals, parameters). Minimizers which use derivatives
+            call it instead of estimating them by finite differences. It is
+            only ever passed by keyword, and minimizers without this argument
+            can be used as long as analytic derivatives are not requested.
         """
         raise NotImplementedError() # pragma: nocover
 
@@ -76,30 +86,50 @@ class Nmpfit(Minimizer):
         <= gtol
     damp: float
         If nonzero, residuals larger than damp will be replaced by tanh. See
-        nmpfit documentation.
+        nmpfit documentation. Analytic derivatives are damped to match.
     maxiter: int
         Maximum number of Levenberg-Marquardt iterations to be performed.
+    fastqr: Boolean
+        If True, factor the jacobian with LAPACK instead of nmpfit's python
+        translation of MINPACK, which is much faster for large numbers of
+        pixels. Fits agree with the default to rounding error.
+    executor: concurrent.futures.Executor (optional)
+        If given, the residuals needed for each finite difference estimate of
+        the jacobian are computed concurrently on it, which speeds up fits of
+        many parameters nearly in proportion to the number of workers. The
+        fit is the same as without it. Fortran scattering theories hold the
+        GIL, so use a ProcessPoolExecutor for them; the residual function must
+        then be picklable, as it is for :func:`.fit`. The executor is not
+        saved with the minimizer.
 
     Notes
     -----
 
     See nmpfit documentation for further details. Not all functionalities of
-    nmpfit are implemented here: in particular, we do not allow analytical
-    derivatives of the residual function, which is impractical and/or
-    impossible to calculate for holograms. If you want to weight the residuals,
+    nmpfit are implemented here. Analytical derivatives of the residual
+    function are used if a jacobian is passed to minimize, in which case
+    parameter step sizes are ignored. If you want to weight the residuals,
     you need to supply a custom residual function.
 
     """
     def __init__(self, quiet = False, ftol = 1e-10, xtol = 1e-10, gtol = 1e-10,
-                 damp = 0, maxiter = 100):
+                 damp = 0, maxiter = 100, fastqr = False, executor = None):
         self.ftol = ftol
         self.xtol = xtol
         self.gtol = gtol
-        self.damp = 0
+        self.damp = damp
         self.maxiter = maxiter
         self.quiet = quiet
+        self.fastqr = fastqr
+        self.executor = executor
+
+    def _iteritems(self):
+        # executors cannot be saved, and do not change the result
+        for key, value in super()._iteritems():
+            if key != 'executor':
+                yield key, value
 
-    def minimize(self, parameters, cost_func, debug = False):
+    def minimize(self, parameters, cost_func, debug = False, *, jacobian=None):
         # marshall the paramters into a dict of the form nmpfit wants
         nmp_pars = []
         for par in parameters:
@@ -130,14 +160,21 @@ class Nmpfit(Minimizer):
                                                       " nmpfit")
             nmp_pars.append(d)
 
-        def resid_wrapper(p, fjac=None):
-            status = 0
-            return [status, cost_func(self.pars_from_minimizer(parameters, p))]
+        resid_wrapper = _NmpfitResidual(self, parameters, cost_func, jacobian)
+        # nmpfit only damps residuals it differentiates itself, so
+        # _NmpfitResidual damps them along with analytic derivatives
+        if jacobian is None:
+            damp = self.damp
+        else:
+            damp = 0
 
         # now fit it
         fitresult = nmpfit.mpfit(resid_wrapper, parinfo=nmp_pars, ftol = self.ftol,
-                                 xtol = self.xtol, gtol = self.gtol, damp = self.damp,
-                                 maxiter = self.maxiter, quiet = self.quiet)
+                                 xtol = self.xtol, gtol = self.gtol, damp = damp,
+                                 maxiter = self.maxiter, quiet = self.quiet,
+                                 autoderivative = int(jacobian is None),
+                                 fastqr = int(self.fastqr),
+                                 executor = self.executor)
 
         result_pars = self.pars_from_minimizer(parameters, fitresult.params)
 
@@ -150,3 +187,205 @@ class Nmpfit(Minimizer):
             return result_pars, fitresult
 
     minimize.__doc__ = Minimizer.minimize.__doc__
+
+
+class LeastSquares(Minimizer):
+    """
+    Bounded least squares minimizer, using scipy.optimize.least_squares
+
+    Parameters
+    ----------
+    method: string
+        'trf' (trust region reflective) or 'dogbox'. Both respect parameter
+        limits.
+    ftol: float
+        Converges when the relative change in the sum of squared residuals in
+        a step is less than ftol
+    xtol: float
+        Converges when the relative change in the parameters in a step is less
+        than xtol
+    gtol: float
+        Converges when the scaled gradient is smaller than gtol
+    max_nfev: int (optional)
+        Maximum number of residual evaluations, not counting those for finite
+        difference derivatives. If None, scipy's default is used.
+    loss: string
+        Loss function applied to the residuals, see
+        scipy.optimize.least_squares. 'linear' is ordinary least squares.
+    executor: concurrent.futures.Executor (optional)
+        If given, finite difference derivatives are computed here with the
+        residuals for all parameters evaluated concurrently on it, as for
+        :class:`Nmpfit`. Otherwise scipy computes them one at a time.
+
+    Notes
+    -----
+    Parameters are scaled and limited just as for :class:`Nmpfit`. If a
+    jacobian is passed to minimize, its analytic derivatives are used instead
+    of finite differences. The minimization details returned are scipy's
+    OptimizeResult, whose nfev and njev give the number of residual and
+    jacobian evaluations. Its total_nfev also counts the residuals computed
+    for finite difference derivatives, so it is comparable to Nmpfit's nfev.
+    """
+    def __init__(self, method='trf', ftol=1e-10, xtol=1e-10, gtol=1e-10,
+                 max_nfev=None, loss='linear', executor=None):
+        self.method = method
+        self.ftol = ftol
+        self.xtol = xtol
+        self.gtol = gtol
+        self.max_nfev = max_nfev
+        self.loss = loss
+        self.executor = executor
+
+    def _iteritems(self):
+        # executors cannot be saved, and do not change the result
+        for key, value in super()._iteritems():
+            if key != 'executor':
+                yield key, value
+
+    def minimize(self, parameters, cost_func, *, jacobian=None):
+        guess = []
+        lower = []
+        upper = []
+        for par in parameters:
+            if par.guess is None:
+                raise ParameterSpecificationError("LeastSquares requires an "
+                                                  "initial guess for all "
+                                                  "parameters")
+            if par.kwargs:
+                raise ParameterSpecificationError("Parameter " + par.name +
+                                                  " contains kwargs that are"
+                                                  " not supported by"
+                                                  " LeastSquares")
+            guess.append(par.scale(par.guess))
+            if par.limit is None:
+                lower.append(-np.inf)
+                upper.append(np.inf)
+            else:
+                lower.append(par.scale(par.limit[0]))
+                upper.append(par.scale(par.limit[1]))
+
+        residual = _ScaledResidual(self, parameters, cost_func)
+        if jacobian is not None:
+            jac = _ScaledJacobian(self, parameters, jacobian)
+        elif self.executor is not None:
+            jac = _ConcurrentJacobian(residual, self.executor, lower, upper)
+        else:
+            jac = '2-point'
+
+        result = least_squares(residual, guess, jac=jac, bounds=(lower, upper),
+                               method=self.method, ftol=self.ftol,
+                               xtol=self.xtol, gtol=self.gtol,
+                               max_nfev=self.max_nfev, loss=self.loss)
+        result.total_nfev = result.nfev
+        if jacobian is None:
+            result.total_nfev += result.njev * len(parameters)
+        if isinstance(jac, _ConcurrentJacobian):
+            result.total_nfev += jac.nfev
+        result_pars = self.pars_from_minimizer(parameters, result.x)
+        if not result.success:
+            raise MinimizerConvergenceFailed(result_pars, result)
+        return result_pars, result
+
+    minimize.__doc__ = Minimizer.minimize.__doc__
+
+
+
+class _NmpfitResidual(object):
+    # The function nmpfit minimizes. A class rather than a closure so it can be
+    # sent to the processes of a process pool executor.
+    def __init__(self, minimizer, parameters, cost_func, jacobian):
+        self.minimizer = copy(minimizer)
+        # the executor is not needed to compute residuals, and cannot be pickled
+        self.minimizer.executor = None
+        self.parameters = parameters
+        self.cost_func = cost_func
+        self.jacobian = jacobian
+        self.scale_factors = np.array([par.unscale(1) for par in parameters])
+
+    def __call__(self, p, fjac=None):
+        status = 0
+        pars = self.minimizer.pars_from_minimizer(self.parameters, p)
+        if fjac is None:
+            resid = self.cost_func(pars)
+            if self.jacobian is not None and self.minimizer.damp > 0:
+                resid = np.tanh(resid / self.minimizer.damp)
+            return [status, resid]
+        resid, derivatives = self.jacobian(pars)
+        # nmpfit wants derivatives of the model for residuals data - model,
+        # while ours are derivatives of the residual with respect to
+        # unscaled parameters
+        derivatives = -derivatives * self.scale_factors
+        if self.minimizer.damp > 0:
+            # chain rule for the tanh damping nmpfit applies without a jacobian
+            resid = np.tanh(resid / self.minimizer.damp)
+            derivatives = derivatives * ((1 - resid**2) /
+                                         self.minimizer.damp)[:, np.newaxis]
+        return [status, resid, derivatives]
+
+
+class _ScaledResidual(object):
+    # The residual as a function of scaled parameter values, picklable like
+    # _NmpfitResidual. Remembers the last residual it computed, which
+    # _ConcurrentJacobian needs.
+    def __init__(self, minimizer, parameters, cost_func):
+        self.minimizer = copy(minimizer)
+        self.minimizer.executor = None
+        self.parameters = parameters
+        self.cost_func = cost_func
+        self.last = None
+
+    def __call__(self, x):
+        resid = self.cost_func(self.minimizer.pars_from_minimizer(
+            self.parameters, x))
+        self.last = np.array(x), resid
+        return resid
+
+    def __getstate__(self):
+        # no need to send the last residual to other processes
+        return dict(self.__dict__, last=None)
+
+
+class _ScaledJacobian(object):
+    # Analytic derivatives with respect to scaled parameter values
+    def __init__(self, minimizer, parameters, jacobian):
+        self.minimizer = copy(minimizer)
+        self.minimizer.executor = None
+        self.parameters = parameters
+        self.jacobian = jacobian
+        self.scale_factors = np.array([par.unscale(1) for par in parameters])
+
+    def __call__(self, x):
+        resid, derivatives = self.jacobian(self.minimizer.pars_from_minimizer(
+            self.parameters, x))
+        return derivatives * self.scale_factors
+
+
+class _ConcurrentJacobian(object):
+    # Forward difference derivatives, with the residual for a step in each
+    # parameter computed concurrently on an executor
+    def __init__(self, residual, executor, lower, upper):
+        self.residual = residual
+        self.executor = executor
+        self.lower = np.array(lower)
+        self.upper = np.array(upper)
+        # residuals computed here other than the steps, normally none
+        self.nfev = 0
+
+    def __call__(self, x):
+        x = np.asarray(x)
+        if self.residual.last is not None and np.array_equal(
+                self.residual.last[0], x):
+            resid = self.residual.last[1]
+        else:
+            resid = self.residual(x)
+            self.nfev += 1
+        h = np.sqrt(np.finfo(float).eps) * np.maximum(1, np.abs(x))
+        # keep steps within the limits as scipy's finite differences do: step
+        # backwards if that fits, otherwise as far as fits in the wider side
+        below, above = x - self.lower, self.upper - x
+        fits = h <= np.maximum(below, above)
+        h = np.where(fits & (x + h > self.upper), -h, h)
+        h = np.where(fits, h, np.where(above >= below, above, -below))
+        steps = [x + np.identity(len(x))[j] * h[j] for j in range(len(x))]
+        stepped = list(self.executor.map(self.residual, steps))
+        return np.stack([(f - resid) / hj for f, hj in zip(stepped, h)], -1)
@@ -23,6 +23,7 @@ Classes for defining models of scattering for fitting
 """
 
 
+from collections import OrderedDict, namedtuple
 from copy import copy, deepcopy
 import numpy as np
 import xarray as xr
@@ -30,6 +31,10 @@ import inspect
 from os.path import commonprefix
 from .errors import ParameterSpecificationError
 from ..scattering.errors import MissingParameter
+from ..scattering.scatterer import Sphere, checkguess
+from ..scattering.calculations import (calc_holo, calc_holo_derivatives, interpret_theory,
+                                      PreparedSchema)
+from ..scattering.theory.mie import DERIVATIVE_PARAMETERS
 from ..core.holopy_object import HoloPyObject
 from .parameter import Parameter, ComplexParameter
 from holopy.core.utils import ensure_listlike
@@ -126,16 +131,17 @@ class ParameterizedObject(Parametrization):
 
                 # we will rename the parameter so that when it is printed it
                 # better reflects how it is used
-                new_name = tied_name(names[parameters.index(p)], name)
+                old_name = names[parameters.index(p)]
+                new_name = tied_name(old_name, name)
                 names[parameters.index(p)] = new_name
 
-                if new_name in ties:
+                if old_name in ties:
                     # if there is already an existing tie group we need to
                     # do a few things to get the name right
-                    group = ties[new_name]
+                    group = ties.pop(old_name)
 
                 else:
-                    group = [name]
+                    group = [old_name]
 
                 group.append(name)
                 ties[new_name] = group
@@ -168,6 +174,49 @@ class ParameterizedObject(Parametrization):
             parameters[i].name = name
         self.parameters = parameters
         self.ties = ties
+        self._template = self._compile()
+
+    def _compile(self):
+        # Work out once where each parameter goes in the object, so make_from
+        # can build it from a list of values without parsing parameter names.
+        # Returns None if obj does not know how to do this.
+        slots = {par.name: i for i, par in enumerate(self.parameters)}
+        tie_names = {name: groupname for groupname, group in self.ties.items()
+                     for name in group}
+
+        def leaf(par, name):
+            if isinstance(par, ComplexParameter):
+                real = leaf(par.real, name+'.real')
+                imag = leaf(par.imag, name+'.imag')
+                if real is None or imag is None:
+                    return None
+                return _ComplexTemplate(real, imag)
+            elif isinstance(par, dict):
+                items = {key: leaf(val, name+'_'+key) for key, val in par.items()}
+                if any(item is None for item in items.values()):
+                    return None
+                return _DictTemplate(items)
+            elif isinstance(par, xr.DataArray):
+                if len(par.dims) != 1:
+                    return None
+                dimname = par.dims[0]
+                items = [leaf(np.asscalar(val), name+'_'+np.asscalar(key))
+                         for key, val in zip(par[dimname], par)]
+                if any(item is None for item in items):
+                    return None
+                return _DataArrayTemplate(par, items)
+            elif not isinstance(par, Parameter):
+                return _ValueTemplate(checkguess(par))
+            elif par.fixed:
+                return _ValueTemplate(par.limit)
+            name = tie_names.get(name, name)
+            if name not in slots:
+                return None
+            return _SlotTemplate(slots[name])
+
+        if not hasattr(self.obj, '_parameter_template'):
+            return None
+        return self.obj._parameter_template(leaf)
 
     @property
     def guess(self):
@@ -182,6 +231,14 @@ class ParameterizedObject(Parametrization):
         return self.make_from(pars)
 
     def make_from(self, parameters):
+        if self._template is not None:
+            try:
+                values = [parameters[par.name] for par in self.parameters]
+            except KeyError:
+                pass
+            else:
+                return self._template.build(values)
+
         obj_pars = {}
 
         for name, par in self.obj.parameters.items():
@@ -221,6 +278,50 @@ class ParameterizedObject(Parametrization):
                 obj_pars[name] = par_val
         return self.obj.from_parameters(obj_pars)
 
+class _ValueTemplate(object):
+    def __init__(self, value):
+        self.value = value
+
+    def build(self, values):
+        return self.value
+
+
+class _SlotTemplate(object):
+    def __init__(self, index):
+        self.index = index
+
+    def build(self, values):
+        return values[self.index]
+
+
+class _ComplexTemplate(object):
+    def __init__(self, real, imag):
+        self.real = real
+        self.imag = imag
+
+    def build(self, values):
+        return self.real.build(values) + 1j * self.imag.build(values)
+
+
+class _DictTemplate(object):
+    def __init__(self, items):
+        self.items = items
+
+    def build(self, values):
+        return {key: item.build(values) for key, item in self.items.items()}
+
+
+class _DataArrayTemplate(object):
+    def __init__(self, like, items):
+        self.dims = like.dims
+        self.coords = like.coords
+        self.items = items
+
+    def build(self, values):
+        return xr.DataArray(np.array([item.build(values) for item in self.items]),
+                            dims=self.dims, coords=self.coords)
+
+
 def limit_overlaps(fraction=.1):
     """
     Generator for constraint prohibiting overlaps beyond a certain tolerance
@@ -307,6 +408,35 @@ class BaseModel(HoloPyObject):
 
 
 
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class _CalcCache(object):
+    # Least recently used cache of model calculations, keyed on the parameter
+    # values and the id of the schema. Entries hold on to their schema, so its
+    # id cannot be reused by another object while they are cached.
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, schema):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not schema:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, schema, result, maxsize):
+        self.entries[key] = (schema, result)
+        while len(self.entries) > maxsize:
+            self.entries.popitem(last=False)
+
+    def info(self, maxsize):
+        return CacheInfo(self.hits, self.misses, maxsize, len(self.entries))
+
+
 class Model(BaseModel):
     """
     Representation of a model to fit to data
@@ -320,7 +450,15 @@ class Model(BaseModel):
         One or a list of constraint functions. A constraint function should take
         a scaterer as an argument and return False if you wish to disallow that
         scatterer (usually because it is un-physical for some reason)
+
+    Notes
+    -----
+    The last calc_cache_size calculations of the model are remembered, so
+    calculating it again for exactly the same parameter values and data, as
+    minimizers sometimes do, returns the stored result. See :meth:`cache_info`.
     """
+    calc_cache_size = 16
+
     def __init__(self, scatterer, calc_func, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', alpha=None,
                  use_random_fraction=None, constraints=[]):
         super().__init__(scatterer, medium_index, illum_wavelen, illum_polarization, theory)
@@ -334,6 +472,29 @@ class Model(BaseModel):
             raise ParameterSpecificationError("You must specify at least one parameter to vary in a fit")
 
         self.constraints = ensure_listlike(constraints)
+        self._calc_cache = _CalcCache()
+
+    def __getstate__(self):
+        # copies and pickles of a model start with an empty cache
+        return dict(self.__dict__, _calc_cache=_CalcCache())
+
+    def cache_info(self):
+        """
+        Statistics of the cache of model calculations
+
+        Returns
+        -------
+        info : CacheInfo
+            named tuple of hits, misses, maxsize and currsize, as for
+            functools.lru_cache
+        """
+        return self._calc_cache.info(self.calc_cache_size)
+
+    def cache_clear(self):
+        """
+        Forget all remembered model calculations and their statistics
+        """
+        self._calc_cache = _CalcCache()
 
     @property
     def guess(self):
@@ -352,22 +513,119 @@ class Model(BaseModel):
             return self.alpha
 
     def _calc(self, pars, schema):
+        try:
+            key = (id(schema), tuple(sorted(pars.items())))
+            hash(key)
+        except TypeError:
+            # unhashable parameter values are not cached
+            return self._calc_uncached(pars, schema)
+        result = self._calc_cache.get(key, schema)
+        if result is not None:
+            # callers may change what they get, so hits are copies
+            return result.copy()
+        result = self._calc_uncached(pars, schema)
+        # callers may change what they get, so the cache keeps its own copy
+        self._calc_cache.put(key, schema, result.copy(), self.calc_cache_size)
+        return result
+
+    def _calc_uncached(self, pars, schema):
         pars = copy(pars)
         alpha = self.get_par(pars=pars, name='alpha', default=1.0)
         optics, scatterer = self._optics_scatterer(pars, schema)
 
+        if isinstance(schema, PreparedSchema):
+            detector = schema.schema
+        else:
+            detector = schema
+
         valid = True
         for constraint in self.constraints:
             valid = valid and constraint(scatterer)
         if not valid:
-            return np.ones_like(schema) * np.inf
+            return np.ones_like(detector) * np.inf
 
         try:
             return self.calc_func(schema=schema, scatterer=scatterer, scaling=alpha, theory=self.theory, **optics)
         except:
-            return np.ones_like(schema) * np.inf
+            return np.ones_like(detector) * np.inf
+
+    def residual(self, pars, data, schema=None):
+        """
+        Difference between the model and data
+
+        Parameters
+        ----------
+        pars : dict
+            parameter values
+        data : xarray.DataArray
+            data to compare against
+        schema : :class:`.PreparedSchema` (optional)
+            data prepared for calc_func, to compute the model with. Defaults
+            to data itself.
+        """
+        if schema is None:
+            schema = data
+        return get_values(self._calc(pars, schema)) - get_values(data)
 
-    def residual(self, pars, data):
-        return get_values(self._calc(pars, data)) - get_values(data)
+    @property
+    def derivative_names(self):
+        """
+        Names of the hologram derivatives computed by
+        :func:`.calc_holo_derivatives` corresponding to each parameter, or
+        None if the model's residual cannot be differentiated analytically.
+
+        Analytic derivatives are available for holograms of a single
+        homogeneous sphere computed with a theory which supports them, when
+        only the sphere's center, n, r and alpha vary.
+        """
+        if (self.calc_func is not calc_holo or
+                not isinstance(self.scatterer, ParameterizedObject) or
+                self.scatterer.ties):
+            return None
+        scatterer = self.scatterer.guess
+        if (not isinstance(scatterer, Sphere) or
+                np.size(scatterer.r) != 1 or np.size(scatterer.n) != 1):
+            return None
+        theory = interpret_theory(scatterer, self.theory)
+        if (not hasattr(theory, '_calc_holo_derivatives') or
+                not getattr(theory, 'full_radial_dependence', False)):
+            return None
+        names = [{'n': 'n.real'}.get(p.name, p.name) for p in self.parameters]
+        if not set(names).issubset(DERIVATIVE_PARAMETERS):
+            return None
+        return names
+
+    def residual_and_jacobian(self, pars, data):
+        """
+        Residual and its derivatives with respect to each parameter
+
+        Parameters
+        ----------
+        pars : dict
+            parameter values, as for residual
+        data : xarray.DataArray
+            data to compare against
+
+        Returns
+        -------
+        residual : ndarray(points)
+            flattened residual
+        jacobian : ndarray(points, parameters)
+            derivatives of the residual with respect to each of the model's
+            parameters, in order
+        """
+        names = self.derivative_names
+        if names is None:
+            raise ParameterSpecificationError("This model's residual cannot be "
+                                              "differentiated analytically")
+        pars = copy(pars)
+        alpha = self.get_par(pars=pars, name='alpha', default=1.0)
+        optics, scatterer = self._optics_scatterer(pars, data)
+        holo, derivatives = calc_holo_derivatives(data, scatterer, scaling=alpha,
+                                                  theory=self.theory, **optics)
+        holo = holo.transpose(*data.dims)
+        derivatives = derivatives.sel(parameter=names).transpose('parameter', *data.dims)
+        return ((holo.values - data.values).ravel(),
+                derivatives.values.reshape(len(names), -1).T)
 
     # TODO: Allow a layer on top of theory to do things like moving sphere
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with HoloPy.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import tempfile
 import warnings
 import numpy as np
@@ -25,9 +26,10 @@ from numpy.testing import assert_equal, assert_approx_equal, assert_allclose, as
 from ...scattering import Sphere, Spheres, LayeredSphere, Mie, calc_holo
 from ...core import detector_grid, load, save, update_metadata
 from ...core.process import normalize
-from .. import fit, Parameter, ComplexParameter, Parametrization, Model, FitResult
+from .. import fit, fit_series, fit_multistart, crop_to_fringes, Nmpfit, Parameter, ComplexParameter, Parametrization, Model, FitResult
 from ...core.tests.common import (assert_obj_close, get_example_data, assert_read_matches_write)
 from ..errors import InvalidMinimizer
+from ..fit import _pixel_stages
 from ..model import limit_overlaps, ParameterizedObject
 
 gold_alpha = .6497
@@ -189,6 +191,43 @@ def test_integer_correctness():
     result = fit(model, holo)
     assert_allclose(result.scatterer.center, [10.2, 9.8, 10.3])
 
+@attr('fast')
+def test_analytic_derivatives():
+    schema = detector_grid(shape = 40, spacing = .1)
+    s = Sphere(center = (2.1, 1.9, 8.3), r = .5, n = 1.58)
+    holo = calc_holo(schema, s, illum_wavelen = .660, medium_index = 1.33,
+                     illum_polarization = (1, 0), scaling = .7)
+
+    par_s = Sphere(center = (Parameter(2, [1, 3]), Parameter(2, [1, 3]), Parameter(8, [5, 10])),
+                   r = Parameter(.48, [.3, .7]), n = Parameter(1.57, [1.4, 1.7]))
+    model = Model(par_s, calc_holo, alpha = Parameter(.6, [.1, 1]))
+    assert_equal(model.derivative_names,
+                 ['center[0]', 'center[1]', 'center[2]', 'n.real', 'r', 'alpha'])
+
+    result = fit(model, holo, analytic_derivatives=True)
+    assert_allclose(result.scatterer.center, s.center, rtol=1e-6)
+    assert_allclose([result.scatterer.r, result.scatterer.n], [s.r, s.n], rtol=1e-6)
+    assert_allclose(result.alpha, .7, rtol=1e-6)
+
+    # minimizers without a jacobian argument still fit, but cannot be given
+    # derivatives
+    class PlainNmpfit(Nmpfit):
+        def minimize(self, parameters, cost_func, debug = False):
+            return super().minimize(parameters, cost_func, debug)
+    result = fit(model, holo, minimizer=PlainNmpfit)
+    assert_allclose(result.scatterer.r, s.r, rtol=1e-6)
+    assert_raises(InvalidMinimizer, fit, model, holo, minimizer=PlainNmpfit,
+                  analytic_derivatives=True)
+
+    # models without analytic derivatives fall back to finite differences
+    model = Model(LayeredSphere((1.58, 1.4), (Parameter(.3, [.2, .4]), .2), (2.1, 1.9, 8.3)),
+                  calc_holo)
+    assert_equal(model.derivative_names, None)
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always')
+        fit(model, holo, analytic_derivatives=True)
+        assert any("finite differences" in str(warning.message) for warning in w)
+
 def test_model_guess():
     ps = Sphere(n=Parameter(1.59, [1.5,1.7]), r = .5, center=(5,5,5))
     m = Model(ps, calc_holo)
@@ -217,3 +256,107 @@ def test_layered():
     model = Model(guess, calc_holo)
     res = fit(model, hs)
     assert_allclose(res.scatterer.t, (1, 1), rtol = 1e-12)
+
+@attr('fast')
+def test_fit_series():
+    schema = detector_grid(shape=20, spacing=.1)
+    frames = [calc_holo(schema, Sphere(center=(1 + .02*t, 1, 8), r=.5, n=1.58),
+                        1.33, .66, illum_polarization=(1, 0)) for t in range(4)]
+    par_s = Sphere(center=(Parameter(.97, [.5, 1.5]), Parameter(1.02, [.5, 1.5]), 8),
+                   r=.5, n=Parameter(1.57, [1.4, 1.7]))
+    model = Model(par_s, calc_holo, 1.33, .66, illum_polarization=(1, 0))
+    gold = [1 + .02*t for t in range(4)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'series.tsv')
+        results = fit_series(model, frames, filename, segments=2,
+                             minimizer=Nmpfit(quiet=True))
+        assert_allclose([r.scatterer.center[0] for r in results], gold)
+        # the second frame of each segment started from the first
+        assert_equal(results[1].model.parameters[0].guess,
+                     results[0].parameters['center[0]'])
+
+        with open(filename) as f:
+            header, *lines = f.readlines()
+        rows = {int(line.split('\t')[0]): line for line in lines}
+        # rows hold plain numbers, whatever numpy types the results had
+        for line in lines:
+            fields = line.strip().split('\t')
+            assert_equal(fields[-2], 'True')
+            np.array(fields[1:-2] + fields[-1:], dtype=float)
+
+        # interrupt the series partway through writing frame 3
+        with open(filename, 'w') as f:
+            f.writelines([header] + [rows[i] for i in range(3)] + [rows[3][:10]])
+        resumed = fit_series(model, frames, filename,
+                             minimizer=Nmpfit(quiet=True))
+        assert_equal([r.model is None for r in resumed], [True]*3 + [False])
+        assert_obj_close([r.parameters for r in resumed[:3]],
+                         [r.parameters for r in results[:3]])
+        assert_equal(resumed[3].model.parameters[0].guess,
+                     results[2].parameters['center[0]'])
+        assert_allclose(resumed[3].scatterer.center[0], gold[3])
+
+        # frames missing between finished ones start from the frame before
+        with open(filename, 'w') as f:
+            f.writelines([header, rows[2], rows[0]])
+        resumed = fit_series(model, frames, filename,
+                             minimizer=Nmpfit(quiet=True))
+        assert_equal([r.model is None for r in resumed], [True, False]*2)
+        for i in [1, 3]:
+            assert_equal(resumed[i].model.parameters[0].guess,
+                         results[i-1].parameters['center[0]'])
+        assert_allclose([r.scatterer.center[0] for r in resumed], gold)
+
+@attr('fast')
+def test_pixel_schedule():
+    assert_equal(_pixel_stages(2, 10000), [100, 1000])
+    assert_equal(_pixel_stages([5000, 20000, 300], 10000), [300, 5000])
+    assert_equal(_pixel_stages(3, 50), [])
+
+    schema = detector_grid(shape=40, spacing=.1)
+    s = Sphere(center=(2.1, 1.9, 8.3), r=.5, n=1.58)
+    holo = calc_holo(schema, s, 1.33, .66, illum_polarization=(1, 0))
+    par_s = Sphere(center=(Parameter(2, [1, 3]), Parameter(2, [1, 3]), Parameter(8, [5, 10])),
+                   r=Parameter(.48, [.3, .7]), n=Parameter(1.57, [1.4, 1.7]))
+    model = Model(par_s, calc_holo, 1.33, .66, illum_polarization=(1, 0))
+    np.random.seed(0)
+    result = fit(model, holo, minimizer=Nmpfit(quiet=True), pixel_schedule=2)
+    assert_obj_close(result.scatterer, s, rtol=1e-6)
+    # the final fit starts from the last coarse stage
+    assert result.model.parameters[0].guess != 2
+    assert_equal(model.parameters[0].guess, 2)
+    # results do not hold on to calculated holograms
+    assert_equal(result.model.cache_info().currsize, 0)
+
+@attr('fast')
+def test_crop_to_fringes():
+    schema = detector_grid(shape=100, spacing=.1)
+    s = Sphere(center=(3, 7, 4), r=.5, n=1.58)
+    holo = calc_holo(schema, s, 1.33, .66, illum_polarization=(1, 0))
+    par_s = Sphere(center=(Parameter(3.1, [1, 9]), Parameter(6.9, [1, 9]), Parameter(4, [2, 6])),
+                   r=.5, n=Parameter(1.57, [1.4, 1.7]))
+    model = Model(par_s, calc_holo, 1.33, .66, illum_polarization=(1, 0))
+    cropped = crop_to_fringes(holo, model)
+    # the central lobe reaches z*tan(asin(1.22*.66/1.33)) = 3.04 um out
+    assert_equal(cropped.shape, (62, 62, 1))
+    # coordinates are kept, and the window is moved inside the image
+    assert_allclose(cropped.x.values[[0, -1]], [0, 6.1])
+    assert_allclose(cropped.y.values[[0, -1]], [3.8, 9.9])
+
+    result = fit(model, holo, minimizer=Nmpfit(quiet=True), crop_fringes=True)
+    assert_obj_close(result.scatterer, s, rtol=1e-6)
+
+def test_fit_multistart():
+    schema = detector_grid(shape=60, spacing=.1)
+    s = Sphere(center=(3, 3, 7), r=.6, n=1.59)
+    holo = calc_holo(schema, s, 1.33, .66, illum_polarization=(1, 0))
+    # a single fit from these guesses stops in a local minimum
+    par_s = Sphere(center=(Parameter(3.1, [1, 5]), Parameter(2.9, [1, 5]), Parameter(13, [3, 15])),
+                   r=Parameter(.35, [.3, 1]), n=Parameter(1.5, [1.4, 1.7]))
+    model = Model(par_s, calc_holo, 1.33, .66, illum_polarization=(1, 0))
+    results = fit_multistart(model, holo, starts=8, pixels=300, keep=2, seed=1,
+                             minimizer=Nmpfit(quiet=True))
+    assert_equal(len(results), 2)
+    assert results[0].chisq <= results[1].chisq
+    assert_obj_close(results[0].scatterer, s, rtol=1e-6)
@@ -0,0 +1,88 @@
+# Copyright 2011-2016, Vinothan N. Manoharan, Thomas G. Dimiduk,
+# Rebecca W. Perry, Jerome Fung, Ryan McGorty, Anna Wang, Solomon Barkley
+#
+# This file is part of HoloPy.
+#
+# HoloPy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HoloPy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HoloPy.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from nose.plugins.attrib import attr
+from numpy.testing import assert_allclose, assert_equal
+
+from ...scattering import Sphere, calc_holo
+from ...core import detector_grid
+from ...core.process import radial_profile
+from ...inference.prior import make_center_priors
+from .. import MieLookupTable, Parameter, Model, fit
+from ..fit import _seed_from_lookup
+
+optics = dict(illum_wavelen=.66, medium_index=1.33, illum_polarization=(1, 0))
+
+def make_table(**kwargs):
+    return MieLookupTable(r=[.4, .5, .6], n=[1.5, 1.6, 1.7], z=[8, 10, 12],
+                          spacing=.1, nbins=40, **optics, **kwargs)
+
+def make_holo():
+    schema = detector_grid(shape=81, spacing=.1)
+    return calc_holo(schema, Sphere(n=1.6, r=.5, center=(4, 4, 10)),
+                     scaling=.8, **optics)
+
+@attr('fast')
+def test_lookup_profiles():
+    table = make_table()
+    assert_equal(table.profiles.shape, (3, 3, 3, 40))
+    profile = radial_profile(make_holo(), (4, 4), 40)
+    # the table is computed from 16 azimuths instead of every pixel
+    assert_allclose(1 + .8 * (table.profiles[1, 1, 1] - 1), profile, atol=2e-2)
+
+@attr('fast')
+def test_lookup_query():
+    table = make_table()
+    holo = make_holo()
+    guess = table.guess(holo, (4, 4))
+    assert_equal([guess['r'], guess['n'], guess['z']], [.5, 1.6, 10])
+    assert_allclose(guess['alpha'], .8, rtol=5e-2)
+
+    interpolated = table.guess(holo, (4, 4), interpolate=True)
+    assert_allclose([interpolated['r'], interpolated['n'], interpolated['z']],
+                    [.5, 1.6, 10], rtol=5e-2)
+
+    z_prior = make_center_priors(holo, lookup=table)[2]
+    assert_equal([z_prior.lower_bound, z_prior.upper_bound], [8, 12])
+
+    model = Model(Sphere(n=Parameter(1.5, [1, 2]), r=Parameter(.3, [.1, .55]),
+                         center=(4, 4, Parameter(15, [5, 20]))),
+                  calc_holo, alpha=Parameter(1, [.1, 1]), **optics)
+    seeded = _seed_from_lookup(model, holo, table)
+    assert_allclose([p.guess for p in seeded.parameters], [10, 1.6, .5, .8],
+                    rtol=5e-2)
+    # the original model is not changed
+    assert_equal(model.parameters[2].guess, .3)
+
+@attr('fast')
+def test_lookup_memmap():
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'table.npy')
+        table = make_table(filename=filename)
+        assert isinstance(table.profiles, np.memmap)
+        mtime = os.path.getmtime(filename)
+        reopened = make_table(filename=filename)
+        assert_equal(os.path.getmtime(filename), mtime)
+        assert_equal(np.array(reopened.profiles), make_table().profiles)
+    finally:
+        shutil.rmtree(tempdir)
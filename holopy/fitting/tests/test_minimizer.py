@@ -18,6 +18,7 @@
 
 
 import warnings
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 import numpy as np
 
@@ -25,7 +26,7 @@ from numpy.testing import assert_equal, assert_raises, assert_allclose
 from ...scattering.scatterer import Sphere, Spheres
 from ...core import detector_grid
 from .. import fit, Parameter, Model
-from ..minimizer import Nmpfit
+from ..minimizer import Nmpfit, LeastSquares
 from ..errors import ParameterSpecificationError, MinimizerConvergenceFailed
 from ...core.tests.common import assert_obj_close
 from holopy.scattering.calculations import calc_holo
@@ -80,6 +81,114 @@ def test_minimizer():
     assert_equal(parinfo[2]['limited'], [True, True])
     assert_obj_close(gold_dict, result2, context = 'minimized_parameters_with_parinfo')
 
+def test_parallel_jacobian():
+    x = np.arange(-10, 10, .1)
+    y = 5.3*x**2 - 1.8*x + 3.4
+
+    def cost_func(pars):
+        return pars['a']*x**2 + pars['b']*x + pars['c'] - y
+
+    parameters = [Parameter(name='a', guess=5, mpside=2),
+                  Parameter(name='b', guess=-2, limit=[-4, 4.]),
+                  Parameter(name='c', guess=3, step=1e-4)]
+    serial, serial_details = Nmpfit(quiet=True).minimize(parameters, cost_func)
+    with ThreadPoolExecutor(3) as executor:
+        minimizer = Nmpfit(quiet=True, executor=executor)
+        result, details = minimizer.minimize(parameters, cost_func)
+    # concurrent evaluation gives exactly the same fit
+    assert_equal(result, serial)
+    assert_equal(details.nfev, serial_details.nfev)
+    assert_equal(minimizer, Nmpfit(quiet=True))
+
+    # residuals computed in other processes
+    schema = detector_grid(shape=20, spacing=.1)
+    s = Sphere(center=(1, 1, 5), n=1.59, r=.5)
+    holo = calc_holo(schema, s, 1.33, .66, illum_polarization=(1, 0))
+    par_s = Sphere(center=(Parameter(1.05, [0, 2]), Parameter(.95, [0, 2]), 5),
+                   n=1.59, r=Parameter(.48, [.4, .6]))
+    model = Model(par_s, calc_holo, 1.33, .66, illum_polarization=(1, 0))
+    serial = fit(model, holo, minimizer=Nmpfit(quiet=True))
+    with ProcessPoolExecutor(2) as executor:
+        minimizer = Nmpfit(quiet=True, executor=executor)
+        result = fit(model, holo, minimizer=minimizer)
+    assert_equal(result.parameters, serial.parameters)
+
+def test_damped_jacobian():
+    x = np.arange(-10, 10, .1)
+    y = 5.3*x**2 - 1.8*x + 3.4
+    # an outlier, which damping keeps from dominating the fit
+    y[50] += 100
+
+    def cost_func(pars):
+        return pars['a']*x**2 + pars['b']*x + pars['c'] - y
+
+    def jacobian(pars):
+        return cost_func(pars), np.stack([x**2, x, np.ones_like(x)], -1)
+
+    parameters = [Parameter(name='a', guess=5),
+                  Parameter(name='b', guess=-2),
+                  Parameter(name='c', guess=3)]
+    minimizer = Nmpfit(quiet=True, damp=10)
+    numeric, _ = minimizer.minimize(parameters, cost_func)
+    analytic, _ = minimizer.minimize(parameters, cost_func, jacobian=jacobian)
+    assert_obj_close(analytic, numeric, rtol=1e-6)
+    undamped, _ = Nmpfit(quiet=True).minimize(parameters, cost_func)
+    assert abs(numeric['c'] - 3.4) < abs(undamped['c'] - 3.4)
+
+def test_least_squares():
+    x = np.arange(-10, 10, .1)
+    y = 5.3*x**2 - 1.8*x + 3.4
+
+    def cost_func(pars):
+        return pars['a']*x**2 + pars['b']*x + pars['c'] - y
+
+    def jacobian(pars):
+        return cost_func(pars), np.stack([x**2, x, np.ones_like(x)], -1)
+
+    parameters = [Parameter(name='a', guess=5),
+                  Parameter(name='b', guess=-1, limit=[-1.5, 4.]),
+                  Parameter(name='c', guess=3)]
+    # the best b is outside its limits, so the fit stops at the limit
+    a, c = np.linalg.lstsq(np.stack([x**2, np.ones_like(x)], -1), y + 1.5*x,
+                           rcond=-1)[0]
+    result, details = LeastSquares().minimize(parameters, cost_func)
+    assert_allclose([result[k] for k in 'abc'], [a, -1.5, c], rtol=1e-6)
+    assert_equal(details.total_nfev, details.nfev + 3 * details.njev)
+
+    analytic, details = LeastSquares().minimize(parameters, cost_func,
+                                                jacobian=jacobian)
+    assert_obj_close(analytic, result, rtol=1e-6)
+    assert_equal(details.total_nfev, details.nfev)
+
+    with ThreadPoolExecutor(3) as executor:
+        minimizer = LeastSquares(executor=executor)
+        concurrent, details = minimizer.minimize(parameters, cost_func)
+    assert_obj_close(concurrent, result, rtol=1e-6)
+    assert_equal(minimizer, LeastSquares())
+
+    # concurrent steps stay within limits, for a parameter at its lower limit
+    # and one whose range is narrower than a step
+    evaluated = []
+    def recording_cost(pars):
+        evaluated.append((pars['b'], pars['c']))
+        return cost_func(pars)
+    pinned = [Parameter(name='a', guess=5),
+              Parameter(name='b', guess=-1.5, limit=[-1.5, 4.]),
+              Parameter(name='c', guess=3.4, limit=[3.4, 3.4 + 1e-9])]
+    with ThreadPoolExecutor(3) as executor:
+        pinned_result, _ = LeastSquares(executor=executor).minimize(
+            pinned, recording_cost)
+    b, c = np.array(evaluated).T
+    assert b.min() >= -1.5 - 1e-12
+    assert c.min() >= 3.4 - 1e-12 and c.max() <= 3.4 + 1e-9 + 1e-12
+    assert_allclose(pinned_result['b'], -1.5)
+
+    with assert_raises(ParameterSpecificationError):
+        LeastSquares().minimize([Parameter(name='a', guess=1, mpside=2)],
+                                cost_func)
+    with assert_raises(MinimizerConvergenceFailed):
+        LeastSquares(max_nfev=1).minimize(parameters, cost_func)
+
 def test_iter_limit():
     gold_fit_dict={'0:Sphere.r': 0.52480509800531849, '1:Sphere.center[1]': 14.003687569304704, 'alpha': 0.93045027963762217, '0:Sphere.center[2]': 19.93177549652841, '1:Sphere.r': 0.56292664494653732, '0:Sphere.center[1]': 15.000340621607815, '1:Sphere.center[0]': 14.020984607646726, '0:Sphere.center[0]': 15.000222185576494, '1:Sphere.center[2]': 20.115613202192328}
 
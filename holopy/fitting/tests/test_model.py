@@ -18,6 +18,7 @@
 
 
 import tempfile
+from copy import deepcopy
 
 import numpy as np
 import xarray as xr
@@ -31,6 +32,7 @@ from holopy.fitting.model import Model, ComplexParameter, Parametrization, Param
 from holopy.fitting import Parameter as par
 from holopy.core.tests.common import assert_read_matches_write
 from holopy.scattering.calculations import calc_holo
+from holopy.core import detector_grid
 from holopy.inference import prior
 
 @attr('fast')
@@ -102,6 +104,21 @@ def test_multidim():
     expected_params = [par(0,[-1,1],'letters_r'),par(0,0,'letters_g'),prior.Gaussian(0,1,'letters_b'),prior.Gaussian(0,1,'count_one'),par(0,[-1,1],'count_two'), par(0,0,'count_three')]
     assert_equal(m.parameters[-6:], expected_params)
 
+@attr('fast')
+def test_make_from_tied_cluster():
+    n1 = par(1.59, [1, 2])
+    s = Spheres([Sphere(n=n1, r=par(.5, [.1, 1]), center=[par(2*i, [0, 20]), 2, 3])
+                 for i in range(3)])
+    par_s = ParameterizedObject(s)
+    assert_equal(par_s.ties, {'Sphere.n': ['0:Sphere.n', '1:Sphere.n', '2:Sphere.n']})
+    params = {p.name: p.guess + .1 for p in par_s.parameters}
+    out_s = Spheres([Sphere(n=1.69, r=.6, center=[2*i + .1, 2, 3]) for i in range(3)])
+    assert_obj_close(par_s.make_from(params), out_s)
+
+    # the precompiled path must agree with building from named parameters
+    par_s._template = None
+    assert_obj_close(par_s.make_from(params), out_s)
+
 def test_pullingoutguess():
     g = Sphere(center = (par(guess=.567e-5, limit=[0,1e-5]),
                    par(.567e-5, (0, 1e-5)), par(15e-6, (1e-5, 2e-5))),
@@ -133,3 +150,34 @@ def test_io():
 
     model = Model(Sphere(par(1)), calc_holo, theory=Mie(False))
     assert_read_matches_write(model)
+
+@attr('fast')
+def test_calc_cache():
+    schema = detector_grid(shape=10, spacing=.1)
+    model = Model(Sphere(n=par(1.59, [1, 2]), r=.5, center=(.5, .5, 5)),
+                  calc_holo, 1.33, .66, (1, 0))
+    holo = model._calc({'n': 1.59}, schema)
+    again = model._calc({'n': 1.59}, schema)
+    assert_equal(again.values, holo.values)
+    assert_equal(model.cache_info(), (1, 1, 16, 1))
+    # callers get their own copies
+    expected = holo.values.copy()
+    holo.values[:] = 0
+    again.values[:] = 0
+    assert_equal(model._calc({'n': 1.59}, schema).values, expected)
+    assert_equal(model.cache_info().hits, 2)
+
+    # other parameters or data are calculated
+    model._calc({'n': 1.6}, schema)
+    model._calc({'n': 1.59}, schema.copy())
+    assert_equal(model.cache_info(), (2, 3, 16, 3))
+
+    # least recently used results are dropped first
+    model.calc_cache_size = 2
+    model._calc({'n': 1.7}, schema)
+    model._calc({'n': 1.59}, schema)
+    assert_equal(model.cache_info(), (2, 5, 2, 2))
+
+    assert_equal(deepcopy(model).cache_info(), (0, 0, 2, 0))
+    model.cache_clear()
+    assert_equal(model.cache_info(), (0, 0, 2, 0))
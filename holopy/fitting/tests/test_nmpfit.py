@@ -21,6 +21,7 @@ Test fitting a hologram using nmpfit without any wrapping
 
 
 import numpy as np
+from numpy.testing import assert_equal, assert_allclose
 
 from ...scattering import Mie, Sphere, calc_holo
 from ..third_party import nmpfit
@@ -108,3 +109,24 @@ def test_nmpfit():
 
     assert_obj_close(fitresult.params,
                                gold_single[np.array([0,2,3,4,5,6])], rtol=1e-3)
+
+def test_nmpfit_fastqr():
+    fitresult = nmpfit.mpfit(residfunct, parinfo = parinfo, ftol = ftol,
+                             xtol = xtol, gtol = gtol, damp = damp,
+                             maxiter = maxiter, quiet = True, fastqr = 1)
+
+    assert_obj_close(fitresult.params,
+                               gold_single[np.array([0,2,3,4,5,6])], rtol=1e-3)
+
+    # the LAPACK factorization is the same as the MINPACK one
+    a = np.random.RandomState(0).normal(size=(200, 6))
+    a[:, 2] *= 10
+    fvec = np.linspace(-1, 1, 200)
+    fitter = nmpfit.mpfit(None)
+    r, ipvt, rdiag, acnorm, qtf = fitter.qrfac_lapack(a.copy(), fvec)
+    _, ipvt_minpack, _, acnorm_minpack = fitter.qrfac(a.copy(), pivot=1)
+    assert_equal(ipvt, ipvt_minpack)
+    assert_allclose(acnorm, acnorm_minpack)
+    q = a[:, ipvt].dot(np.linalg.inv(r))
+    assert_allclose(q.T.dot(q), np.identity(6), atol=1e-12)
+    assert_allclose(qtf, q.T.dot(fvec))
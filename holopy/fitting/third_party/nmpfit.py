@@ -470,6 +470,7 @@ Perform Levenberg-Marquardt least-squares minimization, based on MINPACK-1.
 #numerixenv.check()
 
 import numpy
+import scipy.linalg
 import types
 
 
@@ -664,7 +665,8 @@ class mpfit(Serializable):
                                             damp=0., maxiter=200, factor=100., nprint=1,
                                             iterfunct='default', iterkw={}, nocovar=0,
                                             fastnorm=0, rescale=0, autoderivative=1, quiet=0,
-                                            diag=None, epsfcn=None, debug=0):
+                                            diag=None, epsfcn=None, debug=0,
+                                            executor=None, fastqr=0):
         """
 Inputs:
 fcn:
@@ -698,6 +700,15 @@ fastnorm:
         this keyword may sacrifice some stability in the fitting process.
                 Default: clear (=0)
 
+fastqr:
+        Set this keyword to compute the QR factorization of the jacobian, and
+        its product with the residuals, with LAPACK rather than with the
+        translated MINPACK routine.  For systems with large numbers of data
+        points this is much faster.  The factorization is the same up to
+        rounding, and column pivoting may break ties differently, so fits can
+        differ in the last digits.
+                Default: clear (=0)
+
 ftol:
         A nonnegative input variable. Termination occurs when both the actual
         and predicted relative reductions in the sum of squares are at most
@@ -810,6 +821,14 @@ damp:
 
         Note: DAMP doesn't work with autoderivative=0
 
+executor:
+        An object with a submit method like the executors of
+        concurrent.futures.  If given, the function evaluations for each
+        finite difference estimate of the jacobian are submitted to it
+        together, so they can run concurrently.  For a process pool, fcn and
+        functkw must be picklable.  The results do not depend on it.
+        Default: None  Evaluations are done one at a time
+
 xtol:
         A nonnegative input variable. Termination occurs when the relative error
         between two consecutive iterates is at most xtol (and status is
@@ -917,6 +936,7 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
         self.debug = debug
         self.errmsg = ''
         self.fastnorm = fastnorm
+        self.fastqr = fastqr
         self.nfev = 0
         self.damp = damp
         self.machar = machar(double=1)
@@ -1122,7 +1142,8 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
             fjac = self.fdjac2(fcn, x, fvec, step, qulim, ulim, dside,
                                                     epsfcn=epsfcn,
                                                     autoderivative=autoderivative, dstep=dstep,
-                                                    functkw=functkw, ifree=ifree, xall=self.params)
+                                                    functkw=functkw, ifree=ifree, xall=self.params,
+                                                    executor=executor)
             if (is_none(fjac)):
                 self.errmsg = 'WARNING: premature termination by FDJAC2'
                 return
@@ -1147,7 +1168,12 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
                         if (sum < 0): fjac[:,whupeg[i]] = 0
 
             ## Compute the QR factorization of the jacobian
-            [fjac, ipvt, wa1, wa2] = self.qrfac(fjac, pivot=1)
+            if (self.fastqr):
+                ## fjac comes back as the square triangle of R, already in
+                ## pivoted order, along with (q transpose)*fvec
+                [fjac, ipvt, wa1, wa2, qtf] = self.qrfac_lapack(fjac, fvec)
+            else:
+                [fjac, ipvt, wa1, wa2] = self.qrfac(fjac, pivot=1)
 
             ## On the first iteration if "diag" is unspecified, scale
             ## according to the norms of the columns of the initial jacobian
@@ -1165,27 +1191,28 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
                 delta = factor*xnorm
                 if (delta == 0.): delta = factor
 
-            ## Form (q transpose)*fvec and store the first n components in qtf
-            catch_msg = 'forming (q transpose)*fvec'
-            wa4 = fvec.copy()
-            for j in range(n):
-                lj = ipvt[j]
-                temp3 = fjac[j,lj]
-                if (temp3 != 0):
-                    fj = fjac[j:,lj]
-                    wj = wa4[j:]
-                    ## *** optimization wa4(j:*)
-                    wa4[j:] = wj - fj * numpy.sum(fj*wj) / temp3
-                fjac[j,lj] = wa1[j]
-                qtf[j] = wa4[j]
-            ## From this point on, only the square matrix, consisting of the
-            ## triangle of R, is needed.
-            fjac = fjac[0:n, 0:n]
-            fjac.shape = [n, n]
-            temp = fjac.copy()
-            for i in range(n):
-                temp[:,i] = fjac[:, ipvt[i]]
-            fjac = temp.copy()
+            if (self.fastqr == 0):
+                ## Form (q transpose)*fvec and store the first n components in qtf
+                catch_msg = 'forming (q transpose)*fvec'
+                wa4 = fvec.copy()
+                for j in range(n):
+                    lj = ipvt[j]
+                    temp3 = fjac[j,lj]
+                    if (temp3 != 0):
+                        fj = fjac[j:,lj]
+                        wj = wa4[j:]
+                        ## *** optimization wa4(j:*)
+                        wa4[j:] = wj - fj * numpy.sum(fj*wj) / temp3
+                    fjac[j,lj] = wa1[j]
+                    qtf[j] = wa4[j]
+                ## From this point on, only the square matrix, consisting of the
+                ## triangle of R, is needed.
+                fjac = fjac[0:n, 0:n]
+                fjac.shape = [n, n]
+                temp = fjac.copy()
+                for i in range(n):
+                    temp[:,i] = fjac[:, ipvt[i]]
+                fjac = temp.copy()
 
             ## Check for overflow.  This should be a cheap test here since FJAC
             ## has been reduced to a (small) square matrix, and the test is
@@ -1492,7 +1519,7 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
         if (self.debug): print('Entering call...')
         if (self.qanytied): x = self.tie(x, self.ptied)
         self.nfev = self.nfev + 1
-        if (fjac == None):
+        if is_none(fjac):
             [status, f] = fcn(x, fjac=fjac, **functkw)
 
             if (self.damp > 0):
@@ -1504,6 +1531,30 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
         else:
             return(fcn(x, fjac=fjac, **functkw))
 
+    ## Call user function for each of several sets of parameters, all at once
+    ## on the executor if there is one.  Returns the list of function values,
+    ## in the order of xs, or None if any call fails.
+    def call_many(self, fcn, xs, functkw, executor=None):
+        if (self.debug): print('Entering call_many...')
+        if executor is None:
+            values = []
+            for x in xs:
+                [status, f] = self.call(fcn, x, functkw)
+                if (status < 0): return(None)
+                values.append(f)
+            return(values)
+
+        if (self.qanytied): xs = [self.tie(x, self.ptied) for x in xs]
+        self.nfev = self.nfev + len(xs)
+        futures = [executor.submit(fcn, x, fjac=None, **functkw) for x in xs]
+        values = []
+        for future in futures:
+            [status, f] = future.result()
+            if (status < 0): return(None)
+            if (self.damp > 0): f = numpy.tanh(f/self.damp)
+            values.append(f)
+        return(values)
+
 
     def enorm(self, vec):
 
@@ -1524,8 +1575,8 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
 
             ## This is hopefully a compromise between speed and robustness.
             ## Need to do this because of the possibility of over- or underflow.
-            mx = max(vec)
-            mn = min(vec)
+            mx = numpy.max(vec)
+            mn = numpy.min(vec)
             mx = max(abs(mx), abs(mn))
             if mx == 0: return(vec[0]*0.)
             if mx > agiant or mx < adwarf:
@@ -1538,7 +1589,8 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
 
     def fdjac2(self, fcn, x, fvec, step=None, ulimited=None, ulimit=None, dside=None,
                                     epsfcn=None, autoderivative=1,
-                                    functkw=None, xall=None, ifree=None, dstep=None):
+                                    functkw=None, xall=None, ifree=None, dstep=None,
+                                    executor=None):
 
         if (self.debug): print('Entering fdjac2...')
         machep = self.machar.machep
@@ -1557,22 +1609,20 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
             mperr = 0
             fjac = numpy.zeros(nall, numpy.float)
             numpy.put(fjac, ifree, 1.0)  ## Specify which parameters need derivatives
-            [status, fp] = self.call(fcn, xall, functkw, fjac=fjac)
+            [status, fp, pderiv] = self.call(fcn, xall, functkw, fjac=fjac)
+            if (status < 0): return(None)
 
-            if len(fjac) != m*nall:
+            fjac = numpy.asarray(pderiv, dtype=numpy.float)
+            if fjac.shape != (m, nall):
                 print('ERROR: Derivative matrix was not computed properly.')
                 return(None)
 
             ## This definition is c1onsistent with CURVEFIT
             ## Sign error found (thanks Jesus Fernandez <fernande@irm.chu-caen.fr>)
-            fjac.shape = [m,nall]
             fjac = -fjac
 
             ## Select only the free parameters
-            if len(ifree) < nall:
-                fjac = fjac[:,ifree]
-                fjac.shape = [m, n]
-                return(fjac)
+            return(fjac[:,ifree])
 
         fjac = numpy.zeros([m, n], numpy.float)
 
@@ -1604,28 +1654,35 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
             wh = (numpy.nonzero(mask))[0]
 
             if len(wh) > 0: numpy.put(h, wh, -numpy.take(h, wh))
-        ## Loop through parameters, computing the derivative for each
+        ## Parameters for every function evaluation needed: a step forward in
+        ## each free parameter, then a step back in those which have two-sided
+        ## derivatives.  They are independent, so they can be done together.
+        twosided = [j for j in range(n) if abs(dside[j]) > 1]
+        trials = []
         for j in range(n):
             xp = xall.copy()
             xp[ifree[j]] = xp[ifree[j]] + h[j]
-            [status, fp] = self.call(fcn, xp, functkw)
-            if (status < 0): return(None)
+            trials.append(xp)
+        for j in twosided:
+            xm = xall.copy()
+            xm[ifree[j]] = xm[ifree[j]] - h[j]
+            trials.append(xm)
+        values = self.call_many(fcn, trials, functkw, executor)
+        if values is None: return(None)
+        fm = dict(zip(twosided, values[n:]))
 
-            if abs(dside[j]) <= 1:
+        ## Loop through parameters, computing the derivative for each
+        for j in range(n):
+            fp = values[j]
+            if j not in fm:
                 ## COMPUTE THE ONE-SIDED DERIVATIVE
                 ## Note optimization fjac(0:*,j)
                 fjac[0:,j] = (fp-fvec)/h[j]
 
             else:
                 ## COMPUTE THE TWO-SIDED DERIVATIVE
-                xp[ifree[j]] = xall[ifree[j]] - h[j]
-
-                mperr = 0
-                [status, fm] = self.call(fcn, xp, functkw)
-                if (status < 0): return(None)
-
                 ## Note optimization fjac(0:*,j)
-                fjac[0:,j] = (fp-fm)/(2*h[j])
+                fjac[0:,j] = (fp-fm[j])/(2*h[j])
         return(fjac)
 
 
@@ -1827,6 +1884,18 @@ e.g. mpfit.status, mpfit.errmsg, mpfit.params, npfit.niter, mpfit.covar.
             rdiag[j] = -ajnorm
         return([a, ipvt, rdiag, acnorm])
 
+    ## Pivoted QR factorization of a by LAPACK, used instead of qrfac when
+    ## fastqr is set.  Rather than the householder vectors in a, it returns
+    ## the n by n upper triangular matrix r with columns in pivoted order,
+    ## followed by (q transpose)*fvec.
+    def qrfac_lapack(self, a, fvec):
+
+        if (self.debug): print('Entering qrfac_lapack...')
+        acnorm = numpy.sqrt(numpy.sum(a*a, axis=0))
+        q, r, ipvt = scipy.linalg.qr(a, mode='economic', pivoting=True)
+        rdiag = numpy.diagonal(r).copy()
+        return([r, ipvt, rdiag, acnorm, numpy.dot(fvec, q)])
+
 
     #     Original FORTRAN documentation
     #     **********
@@ -204,7 +204,7 @@ def updated(prior, v, extra_uncertainty=0):
     else:
         return Gaussian(v.value, sd, prior.name)
 
-def make_center_priors(im, z_range_extents=5, xy_uncertainty_pixels=1, z_range_units=None):
+def make_center_priors(im, z_range_extents=5, xy_uncertainty_pixels=1, z_range_units=None, lookup=None):
     """
     Make sensible default priors for the center of a sphere in a hologram
 
@@ -224,6 +224,10 @@ def make_center_priors(im, z_range_extents=5, xy_uncertainty_pixels=1, z_range_u
     z_range_units : float
          Specify the range of the z prior in your data units. If this is provided,
          z_range_extents is ignored.
+    lookup : :class:`~holopy.fitting.lookup.MieLookupTable` (optional)
+         If provided, the z prior spans the lookup table z values on either
+         side of the best match to the image, and z_range_extents and
+         z_range_units are ignored.
     """
     if z_range_units is not None:
         z_range = z_range_units
@@ -235,5 +239,13 @@ def make_center_priors(im, z_range_extents=5, xy_uncertainty_pixels=1, z_range_u
     spacing = get_spacing(im)
     center = center_find(im) * spacing + [im.x[0], im.y[0]]
 
+    if lookup is not None:
+        # lookup.guess gives the z coordinate of the sphere, table z values are
+        # distances from the detector
+        offset = float(im.z.values.mean()) if 'z' in im.coords else 0
+        i = np.abs(lookup.z + offset - lookup.guess(im, center)['z']).argmin()
+        z_range = (lookup.z[max(i - 1, 0)] + offset,
+                   lookup.z[min(i + 1, len(lookup.z) - 1)] + offset)
+
     xy_sd = xy_uncertainty_pixels * spacing
     return [Gaussian(c, s) for c, s in zip(center, xy_sd)] + [Uniform(*z_range)]
@@ -28,7 +28,7 @@ from emcee import EnsembleSampler
 import emcee
 
 from holopy.core.holopy_object import HoloPyObject
-from holopy.fitting import make_subset_data
+from holopy.fitting import make_subset_data, crop_to_fringes
 from holopy.inference.result import SamplingResult, TemperedSamplingResult
 
 from . import prior
@@ -54,17 +54,20 @@ def tempered_sample(model, data, nwalkers=100, min_pixels=50, max_pixels=2000,
     return s.sample(model, data, samples)
 
 class EmceeStrategy(HoloPyObject):
-    def __init__(self, nwalkers=100, pixels=2000, threads='auto', cleanup_threads=True, seed=None):
+    def __init__(self, nwalkers=100, pixels=2000, threads='auto', cleanup_threads=True, seed=None, crop_fringes=False):
         self.nwalkers = nwalkers
         self.pixels = pixels
         self.threads = threads
         self.cleanup_threads = cleanup_threads
         self.seed = seed
+        self.crop_fringes = crop_fringes
 
     def make_guess(self, parameters):
         return np.vstack([p.sample(size=(self.nwalkers)) for p in parameters]).T
 
     def sample(self, model, data, nsamples=1000, walker_initial_pos=None):
+        if self.crop_fringes:
+            data = crop_to_fringes(data, model)
         if self.pixels is not None:
             data = make_subset_data(data, pixels=self.pixels)
         if walker_initial_pos is None:
@@ -85,7 +88,7 @@ class EmceeStrategy(HoloPyObject):
 
 
 class TemperedStrategy(EmceeStrategy):
-    def __init__(self, next_initial_dist=sample_one_sigma_gaussian, nwalkers=100, min_pixels=50, max_pixels=1000, threads='auto', stages=3, stage_len=30, seed=None):
+    def __init__(self, next_initial_dist=sample_one_sigma_gaussian, nwalkers=100, min_pixels=50, max_pixels=1000, threads='auto', stages=3, stage_len=30, seed=None, crop_fringes=False):
 
         self.seed = seed
         self.stages = stages
@@ -99,8 +102,11 @@ class TemperedStrategy(EmceeStrategy):
         self.stage_len=stage_len
         self.nwalkers=nwalkers
         self.next_initial_dist = next_initial_dist
+        self.crop_fringes = crop_fringes
 
     def sample(self, model, data, nsamples=1000):
+        if self.crop_fringes:
+            data = crop_to_fringes(data, model)
         stage_results = []
         guess = self.make_guess(model.parameters)
         for stage in self.stage_strategies[:-1]:
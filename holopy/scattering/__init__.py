@@ -40,6 +40,6 @@ The HoloPy scattering module is used to:
 '''
 
 from . import scatterer, theory
-from .scatterer import Sphere, Spheres, Scatterer, Scatterers, JanusSphere_Uniform, JanusSphere_Tapered, Ellipsoid, Capsule, Cylinder, Bisphere, LayeredSphere, Spheroid
-from .calculations import calc_holo, calc_field, calc_intensity, calc_cross_sections, calc_scat_matrix
+from .scatterer import Sphere, Spheres, SphereArray, Scatterer, Scatterers, JanusSphere_Uniform, JanusSphere_Tapered, Ellipsoid, Capsule, Cylinder, Bisphere, LayeredSphere, Spheroid
+from .calculations import PreparedSchema, calc_holo, calc_holo_derivatives, calc_holo_series, trajectory, calc_field, calc_intensity, calc_cross_sections, calc_cross_sections_batch, calc_scat_matrix
 from .theory import Mie, Multisphere, DDA, Tmatrix
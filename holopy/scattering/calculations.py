@@ -24,10 +24,11 @@ calc_intensity and calc_holo, based on subclass's calc_field
 
 import xarray as xr
 from ..core.holopy_object import SerializableMetaclass
-from ..core.metadata import vector, illumination, update_metadata, to_vector, copy_metadata, from_flat, detector_points, dict_to_array
-from ..core.utils import dict_without, is_none, ensure_array
+from ..core.metadata import vector, illumination, update_metadata, to_vector, copy_metadata, from_flat, detector_points, dict_to_array, _set_metadata
+from ..core.io import load, save_frames
+from ..core.utils import dict_without, is_none, ensure_array, updated
 from .scatterer import Sphere, Spheres, Spheroid, Cylinder, checkguess
-from .errors import AutoTheoryFailed, MissingParameter
+from .errors import AutoTheoryFailed, MissingParameter, TheoryNotCompatibleError
 
 try:
     from .theory import Mie, Multisphere
@@ -37,10 +38,14 @@ except:
     pass
 
 import numpy as np
+import multiprocessing
+import time
+from copy import copy
 from warnings import warn
 
 def prep_schema(schema, medium_index, illum_wavelen, illum_polarization):
-    schema = update_metadata(schema, medium_index, illum_wavelen, illum_polarization)
+    # only metadata changes, so the data need not be copied
+    schema = _set_metadata(schema.copy(deep=False), medium_index, illum_wavelen, illum_polarization)
 
     if schema.illum_wavelen is None:
         raise MissingParameter("wavelength")
@@ -69,10 +74,94 @@ def prep_schema(schema, medium_index, illum_wavelen, illum_polarization):
 
         if illumination in schema.dims:
             schema = schema.sel(illumination=schema.illumination[0], drop=True)
-        schema = update_metadata(schema, illum_wavelen=illum_wavelen, illum_polarization=illum_polarization)
+        schema = _set_metadata(schema.copy(deep=False), illum_wavelen=illum_wavelen, illum_polarization=illum_polarization)
 
     return schema
 
+class PreparedSchema(object):
+    """
+    A detector whose optical metadata has been validated and broadcast once
+
+    :func:`calc_holo`, :func:`calc_field` and :func:`calc_intensity` accept a
+    PreparedSchema in place of a schema and then skip preparing it, which saves
+    repeated work when computing many times on the same detector, as in
+    fitting. A PreparedSchema cannot be modified; prepare a new one to change
+    its metadata.
+
+    Parameters
+    ----------
+    schema : xarray.DataArray
+        detector to compute on
+    medium_index, illum_wavelen, illum_polarization : optional
+        optical metadata, as for :func:`calc_holo`. Values not given are
+        taken from schema.
+
+    Notes
+    -----
+    Optics passed to a calculation along with a PreparedSchema are checked
+    against the prepared ones. If they are None or the same they are ignored,
+    otherwise the schema is prepared again with them for that calculation.
+    The prepared schema shares its data with schema.
+    """
+    def __init__(self, schema, medium_index=None, illum_wavelen=None, illum_polarization=None):
+        if isinstance(schema, PreparedSchema):
+            schema = schema.schema
+        self._schema = _set_metadata(schema.copy(deep=False), medium_index, illum_wavelen, illum_polarization)
+        self._prepared = prep_schema(self._schema, None, None, None)
+        self._given = {'medium_index': medium_index, 'illum_wavelen': illum_wavelen,
+                       'illum_polarization': illum_polarization}
+
+    @property
+    def schema(self):
+        """
+        The detector, with the metadata given when it was prepared
+        """
+        return self._schema
+
+    @property
+    def prepared(self):
+        """
+        The detector as prepared for scattering theories
+        """
+        return self._prepared
+
+    @property
+    def medium_index(self):
+        return self._prepared.medium_index
+
+    @property
+    def illum_wavelen(self):
+        return self._prepared.illum_wavelen
+
+    @property
+    def illum_polarization(self):
+        return self._prepared.illum_polarization
+
+    @property
+    def normals(self):
+        return self._prepared.normals
+
+    def __repr__(self):
+        return "{0}({1!r})".format(self.__class__.__name__, self._schema)
+
+    def _matches(self, medium_index, illum_wavelen, illum_polarization):
+        # whether calculations with these optics can reuse this preparation
+        def same(given, name):
+            prepared = getattr(self._schema, name)
+            return (given is None or given is self._given[name] or
+                    given is prepared or given is getattr(self._prepared, name) or
+                    (np.isscalar(given) and np.isscalar(prepared) and
+                     given == prepared))
+        return (same(medium_index, 'medium_index') and
+                same(illum_wavelen, 'illum_wavelen') and
+                same(illum_polarization, 'illum_polarization'))
+
+def _prepared(schema, medium_index, illum_wavelen, illum_polarization):
+    # a PreparedSchema for these optics, reusing schema if it is one already
+    if isinstance(schema, PreparedSchema) and schema._matches(medium_index, illum_wavelen, illum_polarization):
+        return schema
+    return PreparedSchema(schema, medium_index, illum_wavelen, illum_polarization)
+
 def interpret_theory(scatterer,theory='auto'):
     if isinstance(theory, str) and theory == 'auto':
         theory = determine_theory(scatterer.guess())
@@ -101,12 +190,14 @@ def determine_theory(scatterer):
     else:
         raise AutoTheoryFailed(scatterer)
 
-def calc_intensity(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto'):
+def calc_intensity(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', chunk_size=None, out=None):
     """
     Calculate intensity at a location or set of locations
 
     Parameters
     ----------
+    schema : xarray.DataArray or :class:`PreparedSchema`
+        detector to compute on
     scatterer : :class:`.scatterer` object
         (possibly composite) scatterer for which to compute scattering
     medium_index : float or complex
@@ -118,22 +209,47 @@ def calc_intensity(schema, scatterer, medium_index=None, illum_wavelen=None, ill
         Scattering theory object to use for the calculation. This is optional
         if there is a clear choice of theory for your scatterer. If there is not
         a clear choice, calc_intensity will error out and ask you to specify a theory
+    chunk_size : int (optional)
+        Compute the result this many detector points at a time, so that memory
+        use beyond the result itself does not grow with the detector size.
+        Only supported by :class:`.Mie`, since other theories would solve for
+        the scatterer again for every chunk.
+    out : array_like (optional)
+        Preallocated C contiguous array, such as a numpy.memmap, to write the
+        result into. Detector dimensions must be in the order x, y, z (or
+        point). Implies computing in chunks.
+
     Returns
     -------
     inten : :class:`.Image`
         scattered intensity
     """
-    field = calc_field(schema, scatterer, medium_index=medium_index, illum_wavelen=illum_wavelen, illum_polarization=illum_polarization, theory=theory)
-    return finalize(schema, (abs(field*(1-schema.normals))**2).sum(dim=vector))
-
-
-def calc_holo(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', scaling=1.0):
+    prepared = _prepared(schema, medium_index, illum_wavelen, illum_polarization)
+    schema = prepared.schema
+    if chunk_size is not None or out is not None:
+        theory = interpret_theory(scatterer,theory)
+        uschema = _streaming_schema(theory, prepared.prepared)
+        projection = 1 - uschema.normals.values[:, np.newaxis]
+        def intensity(field):
+            return (np.abs(field*projection.astype(_real_dtype(field)))**2).sum(axis=0)
+        # streamed results already carry the schema's metadata, and are not
+        # passed through finalize so they are not copied
+        return theory._calc_streamed(dict_to_array(schema, scatterer).guess(), uschema, intensity,
+                                     dtype=np.finfo(theory._field_dtype).dtype, out=out, chunk_size=chunk_size)
+    field = calc_field(prepared, scatterer, theory=theory)
+    normals = schema.normals.astype(_real_dtype(field))
+    return finalize(schema, (abs(field*(1-normals))**2).sum(dim=vector))
+
+
+def calc_holo(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', scaling=1.0, chunk_size=None, out=None):
     """
     Calculate hologram formed by interference between scattered
     fields and a reference wave
 
     Parameters
     ----------
+    schema : xarray.DataArray or :class:`PreparedSchema`
+        detector to compute on
     scatterer : :class:`.scatterer` object
         (possibly composite) scatterer for which to compute scattering
     medium_index : float or complex
@@ -146,6 +262,15 @@ def calc_holo(schema, scatterer, medium_index=None, illum_wavelen=None, illum_po
         if there is a clear choice of theory for your scatterer. If there is not
         a clear choice, calc_intensity will error out and ask you to specify a theory
     scaling : scaling value (alpha) for amplitude of reference wave
+    chunk_size : int (optional)
+        Compute the result this many detector points at a time, so that memory
+        use beyond the result itself does not grow with the detector size.
+        Only supported by :class:`.Mie`, since other theories would solve for
+        the scatterer again for every chunk.
+    out : array_like (optional)
+        Preallocated C contiguous array, such as a numpy.memmap, to write the
+        result into. Detector dimensions must be in the order x, y, z (or
+        point). Implies computing in chunks.
 
     Returns
     -------
@@ -153,13 +278,166 @@ def calc_holo(schema, scatterer, medium_index=None, illum_wavelen=None, illum_po
         Calculated hologram from the given distribution of spheres
     """
 
+    prepared = _prepared(schema, medium_index, illum_wavelen, illum_polarization)
+    schema, uschema = prepared.schema, prepared.prepared
     scaling = checkguess(dict_to_array(schema, scaling))
     theory = interpret_theory(scatterer,theory)
-    uschema = prep_schema(schema, medium_index, illum_wavelen, illum_polarization)
-    scat = theory._calc_field(dict_to_array(schema, scatterer).guess(), uschema)
-    holo = scattered_field_to_hologram(scat*scaling, uschema.illum_polarization, uschema.normals)
+    scatterer = dict_to_array(schema, scatterer).guess()
+    if theory._can_stream(uschema) and not isinstance(scaling, xr.DataArray):
+        # compute the hologram directly, without storing the scattered field
+        return theory._calc_holo(scatterer, uschema, scaling, out=out, chunk_size=chunk_size)
+    elif chunk_size is not None or out is not None:
+        raise ValueError("Cannot compute this hologram in chunks; chunk_size and out "
+                         "need a single illumination, scalar scaling and a theory "
+                         "which supports it")
+    else:
+        scat = theory._calc_field(scatterer, uschema)
+        if isinstance(scaling, xr.DataArray):
+            scaling = scaling.astype(_real_dtype(scat))
+        holo = scattered_field_to_hologram(scat*scaling, uschema.illum_polarization, uschema.normals)
     return finalize(uschema, holo)
 
+def calc_holo_derivatives(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', scaling=1.0, chunk_size=None):
+    """
+    Calculate a hologram and its derivatives with respect to the scatterer's
+    parameters and the reference wave scaling
+
+    Parameters
+    ----------
+    schema, scatterer, medium_index, illum_wavelen, illum_polarization, scaling :
+        as for :func:`calc_holo`. The scatterer must be a single homogeneous
+        sphere and the hologram needs a single illumination.
+    theory : :class:`.theory` object (optional)
+        Scattering theory object to use for the calculation. It must be able to
+        compute derivatives, as :class:`.Mie` can with full_radial_dependence.
+    chunk_size : int (optional)
+        Number of detector points to compute at once
+
+    Returns
+    -------
+    holo : :class:`.Image` object
+        Calculated hologram, as from :func:`calc_holo`
+    derivatives : xarray.DataArray
+        Derivatives of the hologram, along a 'parameter' dimension with
+        coordinates 'center[0]', 'center[1]', 'center[2]', 'n.real', 'n.imag',
+        'r' and 'alpha'. Detector dimensions are in the order x, y, z.
+    """
+    prepared = _prepared(schema, medium_index, illum_wavelen, illum_polarization)
+    schema, uschema = prepared.schema, prepared.prepared
+    scaling = checkguess(dict_to_array(schema, scaling))
+    theory = interpret_theory(scatterer,theory)
+    if not hasattr(theory, '_calc_holo_derivatives'):
+        raise TheoryNotCompatibleError(theory, scatterer,
+                                       "it cannot compute hologram derivatives")
+    scatterer = dict_to_array(schema, scatterer).guess()
+    return theory._calc_holo_derivatives(scatterer, uschema, scaling, chunk_size=chunk_size)
+
+def calc_holo_series(schema, scatterers, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', scaling=1.0,
+                     filename=None, processes='auto', progress=None):
+    """
+    Calculate holograms of a sequence of scatterers, such as the frames of a
+    simulated movie
+
+    Frames are computed in parallel by a pool of worker processes. The prepared
+    schema is sent to each worker once, and only scatterers and holograms are
+    passed for each frame.
+
+    Parameters
+    ----------
+    schema : xarray.DataArray
+        detector, shared by every frame
+    scatterers : iterable of :class:`.scatterer` objects
+        the scatterer in each frame. :func:`trajectory` builds these from
+        an array of sphere positions
+    medium_index, illum_wavelen, illum_polarization, theory, scaling :
+        as for :func:`calc_holo`
+    filename : string (optional)
+        If given, frames are written to this file (with
+        :func:`~holopy.core.io.io.save_frames`) as they are computed instead of
+        being kept in memory
+    processes : int or 'auto' (optional)
+        Number of worker processes. 'auto' uses one per cpu, None or 1 computes
+        every frame in this process
+    progress : function (optional)
+        Called after each frame as progress(frames_done, total_frames,
+        frames_per_second). :func:`print_throughput` prints these
+
+    Returns
+    -------
+    holos : xarray.DataArray
+        holograms, with a leading frame dimension. If filename was given this
+        is lazily loaded from the file
+    """
+    scatterers = list(scatterers)
+    theory = interpret_theory(scatterers[0], theory)
+    args = PreparedSchema(schema, medium_index, illum_wavelen, illum_polarization), theory, scaling
+    if processes == 'auto':
+        processes = multiprocessing.cpu_count()
+
+    def report(frames):
+        start = time.time()
+        for i, frame in enumerate(frames, 1):
+            if progress is not None:
+                progress(i, len(scatterers), i / (time.time() - start))
+            yield frame
+
+    if processes is None or processes <= 1:
+        _init_series_worker(*args)
+        frames = report(map(_calc_series_frame, scatterers))
+        pool = None
+    else:
+        pool = multiprocessing.Pool(processes, _init_series_worker, args)
+        frames = report(pool.imap(_calc_series_frame, scatterers))
+
+    try:
+        if filename is None:
+            return xr.concat(list(frames), 'frame').assign_coords(frame=np.arange(len(scatterers)))
+        save_frames(filename, frames, len(scatterers))
+        return load(filename, lazy=True)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+_series_args = None
+
+def _init_series_worker(schema, theory, scaling):
+    global _series_args
+    _series_args = schema, theory, scaling
+
+def _calc_series_frame(scatterer):
+    schema, theory, scaling = _series_args
+    return calc_holo(schema, scatterer, theory=theory, scaling=scaling)
+
+def print_throughput(frames_done, total_frames, frames_per_second):
+    """
+    Print progress of :func:`calc_holo_series`
+    """
+    print("frame {0}/{1}, {2:.2f} frames/s".format(frames_done, total_frames, frames_per_second))
+
+def trajectory(scatterer, centers):
+    """
+    Make a sequence of scatterers by moving a scatterer along a trajectory
+
+    Parameters
+    ----------
+    scatterer : :class:`.Sphere` or :class:`.Spheres`
+        scatterer to move. Anything other than its position is kept fixed
+    centers : array_like (frames, 3) or (frames, spheres, 3)
+        center of the sphere, or of each sphere in a Spheres, in each frame
+
+    Returns
+    -------
+    scatterers : list
+        the scatterer in each frame
+    """
+    def moved(s, center):
+        if isinstance(s, Spheres):
+            return Spheres([moved(sphere, c) for sphere, c in zip(s.scatterers, center)])
+        s = copy(s)
+        s.center = np.array(center)
+        return s
+    return [moved(scatterer, c) for c in np.asarray(centers)]
+
 def calc_cross_sections(scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto'):
     """
     Calculate scattering, absorption, and extinction
@@ -188,6 +466,68 @@ def calc_cross_sections(scatterer, medium_index=None, illum_wavelen=None, illum_
     theory = interpret_theory(scatterer,theory)
     return theory._calc_cross_sections(scatterer=scatterer.guess(), medium_wavevec=2*np.pi/(illum_wavelen/medium_index), medium_index=medium_index, illum_polarization=to_vector(illum_polarization))
 
+def calc_cross_sections_batch(n, r, medium_index, illum_wavelen, weights=None, theory='auto'):
+    """
+    Calculate cross sections of homogeneous spheres over many wavelengths and
+    radii at once.
+
+    Parameters
+    ----------
+    n : float, complex or array_like
+        Refractive index of the spheres. If an array, it must be the same length
+        as illum_wavelen and gives the index at each wavelength
+    r : float or array_like
+        Sphere radii
+    medium_index : float
+        Refractive index of the medium in which the spheres are imbedded
+    illum_wavelen : float or array_like
+        Wavelengths of illumination light
+    weights : array_like (optional)
+        Weights of each radius in a size distribution, same length as r. If
+        given, cross sections are averaged over the distribution and the
+        asymmetry parameter is averaged weighted by scattering cross section.
+    theory : :class:`.Mie` object (optional)
+        Scattering theory object to use for the calculation
+
+    Returns
+    -------
+    cross_sections : xarray.DataArray
+        Dimensional scattering, absorption, and extinction cross sections, and
+        <cos theta>, along a cross_section dimension. Array valued
+        illum_wavelen and r (unless averaged with weights) add dimensions.
+    """
+    theory = interpret_theory(Sphere(), theory)
+    wavelens = ensure_array(illum_wavelen).astype(float)
+    radii = ensure_array(r).astype(float)
+    n = ensure_array(n)
+    if len(n) not in (1, len(wavelens)):
+        raise ValueError("n must be a single index or one index per wavelength")
+
+    medium_wavevec = 2*np.pi/(wavelens/medium_index)
+    sections = theory._raw_cross_sections_batch(
+        n[:, np.newaxis], radii[np.newaxis, :], medium_wavevec[:, np.newaxis],
+        medium_index)
+    dims = ['illum_wavelen', 'r']
+    coords = {'illum_wavelen': wavelens, 'r': radii}
+
+    if weights is not None:
+        weights = ensure_array(weights).astype(float)
+        if len(weights) != len(radii):
+            raise ValueError("weights must be the same length as r")
+        cscat = sections[0]
+        asym = (sections[3] * cscat * weights).sum(axis=-1) / (cscat * weights).sum(axis=-1)
+        sections = (sections * weights).sum(axis=-1) / weights.sum()
+        sections[3] = asym
+        dims.remove('r')
+        del coords['r']
+
+    cross_sections = xr.DataArray(np.moveaxis(sections, 0, -1), dims=dims + ['cross_section'],
+                                  coords=updated(coords, cross_section=['scattering', 'absorbtion', 'extinction', 'assymetry']))
+    for dim, val in [('illum_wavelen', illum_wavelen), ('r', r)]:
+        if np.isscalar(val) and dim in cross_sections.dims:
+            cross_sections = cross_sections.isel(**{dim: 0})
+    return cross_sections
+
 def calc_scat_matrix(schema, scatterer, medium_index=None, illum_wavelen=None, theory='auto'):
     """
     Compute farfield scattering matrices for scatterer
@@ -216,13 +556,15 @@ def calc_scat_matrix(schema, scatterer, medium_index=None, illum_wavelen=None, t
     uschema=prep_schema(schema, medium_index=medium_index, illum_wavelen=illum_wavelen, illum_polarization = False)
     return finalize(uschema, theory._calc_scat_matrix(scatterer.guess(), uschema))
 
-def calc_field(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto'):
+def calc_field(schema, scatterer, medium_index=None, illum_wavelen=None, illum_polarization=None, theory='auto', chunk_size=None, out=None):
     """
     Calculate hologram formed by interference between scattered
     fields and a reference wave
 
     Parameters
     ----------
+    schema : xarray.DataArray or :class:`PreparedSchema`
+        detector to compute on
     scatterer : :class:`.scatterer` object
         (possibly composite) scatterer for which to compute scattering
     medium_index : float or complex
@@ -234,15 +576,36 @@ def calc_field(schema, scatterer, medium_index=None, illum_wavelen=None, illum_p
         Scattering theory object to use for the calculation. This is optional
         if there is a clear choice of theory for your scatterer. If there is not
         a clear choice, calc_intensity will error out and ask you to specify a theory
+    chunk_size : int (optional)
+        Compute the result this many detector points at a time, so that memory
+        use beyond the result itself does not grow with the detector size.
+        Only supported by :class:`.Mie`, since other theories would solve for
+        the scatterer again for every chunk.
+    out : array_like (optional)
+        Preallocated C contiguous array, such as a numpy.memmap, to write the
+        result into. Detector dimensions must be in the order x, y, z (or
+        point), after a leading vector dimension of length 3. Implies
+        computing in chunks.
 
     Returns
     -------
     e_field : :class:`.Vector` object
         Calculated hologram from the given distribution of spheres
     """
+    prepared = _prepared(schema, medium_index, illum_wavelen, illum_polarization)
+    schema, uschema = prepared.schema, prepared.prepared
     theory = interpret_theory(scatterer,theory)
-    uschema = prep_schema(schema, medium_index=medium_index, illum_wavelen=illum_wavelen, illum_polarization=illum_polarization)
-    return finalize(uschema, theory._calc_field(dict_to_array(schema, scatterer).guess(), uschema))
+    scatterer = dict_to_array(schema, scatterer).guess()
+    if chunk_size is not None or out is not None:
+        return theory._calc_streamed(scatterer, _streaming_schema(theory, uschema), lambda field: field,
+                                     components=[(vector, ['x', 'y', 'z'])], out=out, chunk_size=chunk_size)
+    return finalize(uschema, theory._calc_field(scatterer, uschema))
+
+def _streaming_schema(theory, uschema):
+    if not theory._can_stream(uschema):
+        raise ValueError("Cannot compute in chunks; chunk_size and out need a "
+                         "single illumination and a theory which supports it")
+    return uschema
 
 # this is pulled out separate from the calc_holo method because occasionally you
 # want to turn prepared  e_fields into holograms directly
@@ -259,11 +622,21 @@ def scattered_field_to_hologram(scat, ref, normals):
     detector_normal : (float, float, float)
         Vector normal to the detector the hologram should be measured at
         (defaults to z hat, a detector in the x, y plane)
+
+    Notes
+    -----
+    The hologram is computed in the precision of scat, so a single precision
+    field gives a single precision hologram.
     """
-    holo = (np.abs(scat+ref)**2 * (1 - normals)).sum(dim=vector)
+    dtype = _real_dtype(scat)
+    holo = (np.abs(scat+ref.astype(dtype))**2 * (1 - normals.astype(dtype))).sum(dim=vector)
 
     return holo
 
+def _real_dtype(field):
+    # float32 for complex64 fields, float64 for complex128 fields
+    return np.finfo(field.dtype).dtype
+
 def _field_scalar_shape(e):
     # this is a clever hack with list arithmetic to get [1, 3] or [1,
     # 1, 3] as needed
@@ -27,21 +27,76 @@ which may break code that depends on it.
 
 
 import numpy as np
+import xarray as xr
 from numpy import sqrt
-from holopy.core.math import cartesian_distance
 from .scatterer import Sphere, Spheres
 
-def distances(cluster, gaponly=False):
+def _positions(cluster):
+    """
+    Sphere centers of a cluster as an array with spheres and x, y, z last
+
+    Returns the array and, if cluster is not a Spheres, the dims and coords
+    to label results with.
+    """
+    if isinstance(cluster, Spheres):
+        return np.asarray(cluster.centers, dtype=float), None, None
+    if isinstance(cluster, xr.DataArray):
+        dims, coords = list(cluster.dims[:-1]), cluster.coords
+        centers = cluster.values
+    else:
+        centers = np.asarray(cluster, dtype=float)
+        if centers.ndim > 3:
+            raise ValueError("Arrays of sphere centers should have shape "
+                             "(spheres, 3) or (frames, spheres, 3)")
+        dims, coords = ['frame', 'sphere'][3-centers.ndim:], {}
+    if centers.ndim < 2 or centers.shape[-1] != 3:
+        raise ValueError("Sphere centers should have shape (..., spheres, 3), "
+                         "not {0}".format(centers.shape))
+    return np.asarray(centers, dtype=float), dims, coords
+
+def _label(values, dims, coords, names):
+    # replace the sphere dimension by one for each of names
+    sphere = dims[-1]
+    new_dims = dims[:-1] + [sphere + '_' + name for name in names]
+    new_coords = {dim: coords[dim] for dim in dims[:-1] if dim in coords}
+    if sphere in coords:
+        for dim in new_dims[-len(names):]:
+            new_coords[dim] = coords[sphere].values
+    return xr.DataArray(values, dims=new_dims, coords=new_coords)
+
+def _center_distances(centers):
+    # distance between every pair of centers, for centers of shape (..., N, 3)
+    dist = np.zeros(centers.shape[:-1] + centers.shape[-2:-1])
+    for i in range(3):
+        x = centers[..., i]
+        dist += (x[..., :, np.newaxis] - x[..., np.newaxis, :])**2
+    return np.sqrt(dist, out=dist)
+
+def distances(cluster, gaponly=False, r=None):
     """
     calculate the distances between each sphere in a cluster and each of the others
 
     Parameters
     ----------
-    cluster: :class:`holopy.scattering.scatterer.Scatterer`
-        A sphere cluster to determine the interparticle distances of.
+    cluster: :class:`holopy.scattering.scatterer.Spheres` or array_like
+        A sphere cluster to determine the interparticle distances of, or the
+        centers of its spheres as an array of shape (spheres, 3). Clusters
+        from many frames can be given at once as an array of shape
+        (frames, spheres, 3) or an xarray.DataArray whose last two dimensions
+        index the spheres and x, y, z.
     gaponly: bool
         Whether to calculate the distances between particle centers
         or between particle surfaces (gap distances).
+    r: float or array_like (optional)
+        Sphere radii, broadcast against the sphere dimension of cluster. Only
+        used for gap distances, defaults to the radii of cluster's spheres.
+
+    Returns
+    -------
+    dist: array
+        dist[..., i, j] is the distance between spheres i and j. An ndarray if
+        cluster is a Spheres, otherwise an xarray.DataArray with the sphere
+        dimension replaced by two (e.g. sphere_a and sphere_b).
 
     Notes
     -----
@@ -52,16 +107,23 @@ def distances(cluster, gaponly=False):
     distances starting from any sphere of interest.
 
     """
-    num = len(cluster.centers)
-    dist = np.zeros([num,num])
-    for i in np.arange(0,num):
-        for j in np.arange(0,num):
-            dist[i,j] = cartesian_distance(cluster.centers[i,:],cluster.centers[j,:])
-            #modification to change center to center distances
-            #to gap distances if asked for
-            if gaponly==True and i!=j:
-                dist[i,j] = dist[i,j]-cluster.r[i]-cluster.r[j]
-    return dist
+    centers, dims, coords = _positions(cluster)
+    dist = _center_distances(centers)
+    #modification to change center to center distances
+    #to gap distances if asked for
+    if gaponly:
+        if r is None:
+            if dims is not None:
+                raise ValueError("Radii must be given to find gap distances "
+                                 "from an array of sphere centers")
+            r = cluster.r
+        r = np.broadcast_to(np.asarray(r, dtype=float), centers.shape[:-1])
+        dist -= r[..., :, np.newaxis] + r[..., np.newaxis, :]
+        diagonal = np.arange(centers.shape[-2])
+        dist[..., diagonal, diagonal] = 0
+    if dims is None:
+        return dist
+    return _label(dist, dims, coords, ['a', 'b'])
 
 def angles(cluster, degrees=True):
     """
@@ -69,11 +131,19 @@ def angles(cluster, degrees=True):
 
     Parameters
     ----------
-    cluster: :class:`holopy.scattering.scatterer.Scatterer`
-        A sphere cluster to determine the interparticle distances of.
+    cluster: :class:`holopy.scattering.scatterer.Spheres` or array_like
+        A sphere cluster to determine the interparticle angles of, or its
+        sphere centers in any of the forms accepted by :func:`distances`.
     degrees: bool
         Whether to return angles in degrees (True) or in radians (False).
 
+    Returns
+    -------
+    ang: array
+        ang[..., a, b, c] is the angle abc. An ndarray if cluster is a
+        Spheres, otherwise an xarray.DataArray labeled as in
+        :func:`distances`.
+
     Notes
     -----
     Angle abc is the acute angle formed by edges conecting points ab and bc.
@@ -82,20 +152,21 @@ def angles(cluster, degrees=True):
     for angles aba, and NAN's for "angles" aab.
 
     """
-    num = len(cluster.centers)
-    ang = np.zeros([num,num,num])
-    dist = distances(cluster)
-    for i in np.arange(0,num):
-        for j in np.arange(0,num): #this particle is the center of the angle
-            for k in np.arange(0,num):
-                Adjacent1=dist[i,j]
-                Adjacent2=dist[j,k]
-                Opposite=dist[i,k]
-                #use the law of cosines to determine the angles from the distances
-                ang[i,j,k] = np.arccos((Adjacent1**2+Adjacent2**2-Opposite**2)/(2*Adjacent1*Adjacent2))
+    centers, dims, coords = _positions(cluster)
+    dist = _center_distances(centers)
+    Adjacent1 = dist[..., :, :, np.newaxis]
+    Adjacent2 = dist[..., np.newaxis, :, :]
+    Opposite = dist[..., :, np.newaxis, :]
+    #use the law of cosines to determine the angles from the distances
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cos = (Adjacent1**2 + Adjacent2**2 - Opposite**2) / (2*Adjacent1*Adjacent2)
+        ang = np.arccos(np.clip(cos, -1, 1))
     if degrees==True:
         ang=ang/np.pi*180.0
-    return ang #ang[a,b,c] is the acute angle abc as used in geometry (be in the middle)
+    #ang[a,b,c] is the acute angle abc as used in geometry (be in the middle)
+    if dims is None:
+        return ang
+    return _label(ang, dims, coords, ['a', 'b', 'c'])
 
 def make_tricluster(index,radius,gap,xcom=0,ycom=0,zcom=0):
     """
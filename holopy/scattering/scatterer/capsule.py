@@ -89,6 +89,11 @@ class Capsule(CenteredScatterer):
                               (flat_indicator_b | flat_indicator_c))
             return flat_indicator.reshape(subdivisions[0], subdivisions[1],
                                           subdivisions[2])
-        r = (self.h + 2 * self.d)/2
-        return Indicators([cylinder, s0.contains, s1.contains],
-                          [[-r, r], [-r, r], [-r, r]])
+        return Indicators([cylinder, s0.contains, s1.contains], self._bound)
+
+    @property
+    def _bound(self):
+        # the capsule is contained in the hull of its two end caps
+        normal = (self.h/2)*np.dot(rotation_matrix(*self.rotation), (0, 0, 1))
+        r = np.abs(normal) + self.d/2
+        return [[-ri, ri] for ri in r]
@@ -84,6 +84,9 @@ class Scatterers(Scatterer):
 
 
     def from_parameters(self, parameters, update = False):
+        return type(self)(self._components_from_parameters(parameters, update))
+
+    def _components_from_parameters(self, parameters, update=False):
         if update:
             parameters = updated(self.parameters, {key: val for key, val in parameters.items() if key[0].isdigit()})
         n_scatterers = len(set([p.split(':')[0] for p in list(parameters.keys())]))
@@ -111,7 +114,27 @@ class Scatterers(Scatterer):
             scatterers.append(getattr(scatterer,
                               scat_type)().from_parameters(collected[i]))
 
-        return type(self)(scatterers)
+        return scatterers
+
+    def _parameter_template(self, leaf, prefix=''):
+        """
+        Compile a recipe for rebuilding this scatterer from a flat sequence
+
+        See :meth:`.CenteredScatterer._parameter_template`
+        """
+        if (type(self).from_parameters is not Scatterers.from_parameters or
+                type(self).parameters is not Scatterers.parameters):
+            return None
+        children = []
+        for i, scatterer in enumerate(self.scatterers):
+            if not hasattr(scatterer, '_parameter_template'):
+                return None
+            child = scatterer._parameter_template(leaf, '{0}{1}:{2}.'.format(
+                prefix, i, scatterer.__class__.__name__))
+            if child is None:
+                return None
+            children.append(child)
+        return _CompositeTemplate(type(self), children)
 
     def _prettystr(self, level, indent="  "):
         '''
@@ -188,6 +211,12 @@ class Scatterers(Scatterer):
 
         return new
 
+    @property
+    def bounds(self):
+        bounds = [s.bounds for s in self.get_component_list()]
+        return [(min(b[i][0] for b in bounds), max(b[i][1] for b in bounds))
+                for i in range(3)]
+
     def in_domain(self, points):
         ind = self.scatterers[0].contains(points).astype('int')
         for i, s in enumerate(self.scatterers[1:]):
@@ -210,3 +239,12 @@ class Scatterers(Scatterer):
         new = copy(self)
         new.scatterers = [s.select(keys) for s in self.scatterers]
         return new
+
+
+class _CompositeTemplate(object):
+    def __init__(self, cls, children):
+        self.cls = cls
+        self.children = children
+
+    def build(self, values):
+        return self.cls([child.build(values) for child in self.children])
@@ -51,6 +51,14 @@ class CsgScatterer(Scatterer):
     def bounds(self):
         return [(min(b1[0], b2[0]), max(b1[1], b2[1])) for b1, b2 in zip(self.s1.bounds, self.s2.bounds)]
 
+    @property
+    def num_domains(self):
+        return 1
+
+    @property
+    def _classifies_blocks(self):
+        return self.s1._classifies_blocks or self.s2._classifies_blocks
+
     def rotated(self, alpha, beta, gamma):
         centers = np.array([s.center for s in (self.s1, self.s2)])
         new_centers = self.center + rotate_points(centers - self.center, alpha, beta, gamma)
@@ -64,11 +72,21 @@ class Union(CsgScatterer):
     def in_domain(self, points):
         return np.logical_or(self.s1.in_domain(points), self.s2.in_domain(points))
 
+    def _block_domain(self, lo, hi):
+        d1, d2 = self.s1._block_domain(lo, hi), self.s2._block_domain(lo, hi)
+        return np.where((d1 > 0) | (d2 > 0), 1,
+                        np.where((d1 == 0) & (d2 == 0), 0, -1))
+
 
 class Difference(CsgScatterer):
     def in_domain(self, points):
         return np.logical_and(self.s1.in_domain(points), np.logical_not(self.s2.in_domain(points)))
 
+    def _block_domain(self, lo, hi):
+        d1, d2 = self.s1._block_domain(lo, hi), self.s2._block_domain(lo, hi)
+        return np.where((d1 == 0) | (d2 > 0), 0,
+                        np.where((d1 > 0) & (d2 == 0), 1, -1))
+
     @property
     def bounds(self):
         # this isn't as good as we can do, but it is at least correct
@@ -77,3 +95,12 @@ class Difference(CsgScatterer):
 class Intersection(CsgScatterer):
     def in_domain(self, points):
         return np.logical_and(self.s1.in_domain(points), self.s2.in_domain(points))
+
+    def _block_domain(self, lo, hi):
+        d1, d2 = self.s1._block_domain(lo, hi), self.s2._block_domain(lo, hi)
+        return np.where((d1 == 0) | (d2 == 0), 0,
+                        np.where((d1 > 0) & (d2 > 0), 1, -1))
+
+    @property
+    def bounds(self):
+        return [(max(b1[0], b2[0]), min(b1[1], b2[1])) for b1, b2 in zip(self.s1.bounds, self.s2.bounds)]
@@ -24,6 +24,7 @@ Defines cylinder scatterers.
 
 
 import numpy as np
+from ...core.math import rotation_matrix
 
 from .scatterer import CenteredScatterer, Indicators
 from ..errors import InvalidScatterer
@@ -57,3 +58,10 @@ class Cylinder(CenteredScatterer):
                                            "".format(rotation))
         self.rotation = rotation
         super(Cylinder, self).__init__(center)
+
+    @property
+    def _bound(self):
+        # extent along each axis of the rotated cylinder, whose own axis is z
+        axis = np.abs(rotation_matrix(*self.rotation)[:, 2])
+        r = self.h/2 * axis + self.d/2 * np.sqrt(1 - np.minimum(axis**2, 1))
+        return [[-ri, ri] for ri in r]
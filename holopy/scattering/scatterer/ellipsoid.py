@@ -25,7 +25,7 @@ Defines ellipsoidal scatterers.
 
 import numpy as np
 
-from .scatterer import CenteredScatterer, Indicators
+from .scatterer import _squared_extent, CenteredScatterer, Indicators
 from ..errors import InvalidScatterer
 from functools import reduce
 
@@ -82,6 +82,18 @@ class Ellipsoid(CenteredScatterer):
         NOTE: Ellipsoid indicators does not currently apply rotations
         """
         return Indicators(lambda point: ((point / self.r) ** 2).sum(-1) < 1,
-                          [[-self.r[0], self.r[0]], [-self.r[1], self.r[1]],
-                            [-self.r[2], self.r[2]]])
+                          self._bound)
+
+    @property
+    def _bound(self):
+        return [[-self.r[0], self.r[0]], [-self.r[1], self.r[1]],
+                [-self.r[2], self.r[2]]]
+
+    def _block_domain(self, lo, hi):
+        dmin, dmax = _squared_extent(lo, hi, self.center, self.r)
+        return np.where(dmax < 1, 1, np.where(dmin < 1, -1, 0))
+
+    @property
+    def _classifies_blocks(self):
+        return True
 
@@ -62,8 +62,12 @@ class JanusSphere_Uniform(CenteredScatterer):
         normal = np.dot(rotation_matrix(*self.rotation),(0, 0, 1))
         def cap(point):
             return (np.dot(point, normal) > 0) & s1.contains(point)
+        return Indicators([s0.contains, cap], self._bound)
+
+    @property
+    def _bound(self):
         r = max(self.r)
-        return Indicators([s0.contains, cap], [[-r, r], [-r, r], [-r, r]])
+        return [[-r, r], [-r, r], [-r, r]]
 
 class JanusSphere_Tapered(CenteredScatterer):
     def __init__(self, n = None, r = None, rotation = (0, 0), center = None):
@@ -106,6 +110,12 @@ class JanusSphere_Tapered(CenteredScatterer):
         #TODO: check that this is the correct way to rotate a vector        
         def cap(point):
             return s1.contains(point) & ~ s0.contains(point)
-        r = max(self.r)
-        return Indicators([s0.contains, cap], [[-r, r], [-r, r], [-r, r]])
+        return Indicators([s0.contains, cap], self._bound)
+
+    @property
+    def _bound(self):
+        # the cap is inside a sphere of radius r[0] displaced along the normal
+        normal = (self.r[1]-self.r[0])*np.dot(rotation_matrix(*self.rotation),(0, 0, 1))
+        r = self.r[0]
+        return [[min(-r, c - r), max(r, c + r)] for c in normal]
 
@@ -24,6 +24,7 @@ The abstract base class for all scattering objects
 
 from collections import defaultdict
 
+import itertools
 from itertools import chain
 from copy import copy
 
@@ -92,7 +93,9 @@ class Scatterer(HoloPyObject):
         return self.in_domain(points) > 0
 
     def index_at(self, points, background = 0):
-        domains = self.in_domain(points)
+        return self._index_from_domains(self.in_domain(points), background)
+
+    def _index_from_domains(self, domains, background=0):
         ns = ensure_array(self.n)
         if np.iscomplex(np.append(self.n, background)).any():
             dtype = np.complex
@@ -131,7 +134,7 @@ class Scatterer(HoloPyObject):
 
     @property
     def num_domains(self):
-        return len(self.indicators)
+        return len(self.indicators.functions)
 
     def _index_type(self, background=0.):
         if np.iscomplex([self.n]).any() or np.iscomplex(background):
@@ -151,8 +154,27 @@ class Scatterer(HoloPyObject):
 
     @property
     def bounds(self):
-        return [(c+b[0], c+b[1]) for c, b in zip(self.center,
-                                                 self.indicators.bound)]
+        return [(c+b[0], c+b[1]) for c, b in zip(self.center, self._bound)]
+
+    @property
+    def _bound(self):
+        # box containing the scatterer relative to its center. Scatterers
+        # whose extent is known analytically override this so that no
+        # indicators need to be built or searched.
+        return self.indicators.bound
+
+    def _voxel_axes(self, spacing):
+        if np.isscalar(spacing) or len(spacing) == 1:
+            spacing = np.ones(3) * spacing
+        slices = [slice(b[0], b[1], s) for b, s in zip(self.bounds, spacing)]
+        # a multidimensional np.mgrid rounds differently from a 1d one, so take
+        # each axis from a grid of the same shape as in _voxel_coords
+        axes = []
+        for i, sl in enumerate(slices):
+            single = [slice(0., 1.)] * 3
+            single[i] = sl
+            axes.append(np.mgrid[single][i].ravel())
+        return axes
 
     def _voxel_coords(self, spacing):
         if np.isscalar(spacing) or len(spacing) == 1:
@@ -162,6 +184,36 @@ class Scatterer(HoloPyObject):
                             zip(self.bounds, spacing)]]
         return np.concatenate([g[...,np.newaxis] for g in grid], 3)
 
+    def _block_domain(self, lo, hi):
+        """
+        Domain of every point in boxes, if it can be found without testing them
+
+        Parameters
+        ----------
+        lo, hi : np.ndarray (Nx3)
+            Opposite corners of each box
+
+        Returns
+        -------
+        domain : np.ndarray (N)
+            Domain shared by all points in each box (0 if they are all outside
+            the scatterer), or -1 if they may differ or it is not known.
+        """
+        if type(self)._bound is Scatterer._bound:
+            # bounds from find_bounds may not contain the whole scatterer
+            return np.full(len(lo), -1, dtype=int)
+        bounds = np.array(self.bounds, dtype=float)
+        slack = 1e-9 * (bounds[:, 1] - bounds[:, 0])
+        outside = ((hi < bounds[:, 0] - slack) |
+                   (lo > bounds[:, 1] + slack)).any(-1)
+        return np.where(outside, 0, -1)
+
+    @property
+    def _classifies_blocks(self):
+        # whether _block_domain can tell the domain of boxes which overlap
+        # the scatterer, which is what makes octree voxelation worthwhile
+        return False
+
     def voxelate(self, spacing, medium_index=0):
         """
         Represent a scatterer by discretizing into voxels
@@ -179,10 +231,39 @@ class Scatterer(HoloPyObject):
         voxelation : np.ndarray
             An array with refractive index at every pixel
         """
-        return self.index_at(self._voxel_coords(spacing))
+        return self._index_from_domains(self.voxelate_domains(spacing),
+                                        medium_index)
+
+    def voxelate_domains(self, spacing, sparse=False):
+        """
+        Find which domain of the scatterer each voxel is in
+
+        Scatterers which can classify whole blocks of voxels at once (spheres,
+        ellipsoids and CSG combinations of them) are voxelated with an octree,
+        so only blocks crossing a surface are tested voxel by voxel.
+
+        Parameters
+        ----------
+        spacing : float
+            The spacing between voxels
+        sparse : bool
+            If True, return only the voxels inside the scatterer
 
-    def voxelate_domains(self, spacing):
-        return self.in_domain(self._voxel_coords(spacing))
+        Returns
+        -------
+        domains : np.ndarray
+            The domain of each voxel (0 outside the scatterer) if sparse is
+            False. Otherwise a tuple of an (N, 3) array of the indices of
+            voxels inside the scatterer, in C order, and an (N) array of
+            their domains.
+        """
+        if not self._classifies_blocks:
+            domains = self.in_domain(self._voxel_coords(spacing))
+            if sparse:
+                indices = np.transpose(np.nonzero(domains))
+                return indices, domains[tuple(indices.T)]
+            return domains
+        return _octree_voxelate(self, self._voxel_axes(spacing), sparse)
 
 class CenteredScatterer(Scatterer):
     def __init__(self, center = None):
@@ -290,6 +371,46 @@ class CenteredScatterer(Scatterer):
 
         return type(self)(**built)
 
+    def _parameter_template(self, leaf, prefix=''):
+        """
+        Compile a recipe for rebuilding this scatterer from a flat sequence
+
+        Parameters
+        ----------
+        leaf : function
+            Called as leaf(value, name) for every value that would appear in
+            :attr:`parameters` (with name prefixed by prefix). It should return
+            an object with a build(values) method giving the value to use, or
+            None if the value cannot be compiled.
+        prefix : string
+            Prefix to names of this scatterer's parameters
+
+        Returns
+        -------
+        template : object or None
+            An object whose build(values) method gives the same scatterer as
+            :meth:`from_parameters` without parsing parameter names, or None if
+            this scatterer cannot be compiled.
+        """
+        if (type(self).from_parameters is not CenteredScatterer.from_parameters
+                or type(self).parameters is not CenteredScatterer.parameters):
+            return None
+
+        def expand(key, par):
+            # mirrors the expansion in parameters
+            if isinstance(par, (list, tuple, np.ndarray)):
+                items = [expand('{0}[{1}]'.format(key, i), p)
+                         for i, p in enumerate(par)]
+                if any(item is None for item in items):
+                    return None
+                return _ListTemplate(items)
+            return leaf(par, prefix + key)
+
+        fields = [(key, expand(key, par)) for key, par in self._dict.items()]
+        if any(field is None for key, field in fields):
+            return None
+        return _ScattererTemplate(type(self), fields)
+
     def select(self, keys):
         params = self.parameters
         for key, val in params.items():
@@ -387,3 +508,115 @@ def checkguess(par):
     if isinstance(par, xr.DataArray):
         return xr.apply_ufunc(guess, par)
     return guess(par)
+
+
+class _ListTemplate(object):
+    def __init__(self, items):
+        self.items = items
+
+    def build(self, values):
+        return [item.build(values) for item in self.items]
+
+
+class _ScattererTemplate(object):
+    def __init__(self, cls, fields):
+        self.cls = cls
+        self.fields = fields
+
+    def build(self, values):
+        return self.cls(**{key: field.build(values) for key, field in self.fields})
+
+
+# blocks of voxels with no more than this many voxels along any side are
+# tested voxel by voxel rather than subdivided
+VOXEL_LEAF_SIZE = 8
+# number of voxels handled in a single array operation
+VOXEL_BATCH_SIZE = 2**16
+
+def _octree_voxelate(scatterer, axes, sparse):
+    # Subdivide the grid of voxels into octants until the scatterer can tell
+    # the domain of a whole block from its _block_domain, or the blocks are
+    # small enough to test every voxel. All blocks at one level of the tree
+    # are classified together. Returns the same thing as voxelate_domains.
+    shape = np.array([len(ax) for ax in axes])
+    # test one point to find the type of array in_domain returns
+    start = np.array([ax[0] for ax in axes])
+    dtype = np.asarray(scatterer.in_domain(start.reshape(1, 1, 1, 3))).dtype
+
+    size = VOXEL_LEAF_SIZE
+    while size < shape.max():
+        size *= 2
+    starts = np.zeros((1, 3), dtype=int)
+    uniform = []
+    while True:
+        stops = np.minimum(starts + size, shape)
+        lo = np.stack([ax[i] for ax, i in zip(axes, starts.T)], -1)
+        hi = np.stack([ax[i - 1] for ax, i in zip(axes, stops.T)], -1)
+        domain = np.asarray(scatterer._block_domain(lo, hi))
+        inside = domain > 0
+        uniform.append((starts[inside], size, domain[inside]))
+        starts = starts[domain < 0]
+        if size <= VOXEL_LEAF_SIZE or len(starts) == 0:
+            break
+        size //= 2
+        octants = np.array(list(itertools.product([0, size], repeat=3)))
+        starts = (starts[:, np.newaxis] + octants).reshape(-1, 3)
+        starts = starts[(starts < shape).all(-1)]
+
+    if sparse:
+        indices = [np.zeros((0, 3), dtype=int)]
+        values = [np.zeros(0, dtype=dtype)]
+    else:
+        domains = np.zeros(shape, dtype=dtype)
+
+    def store(index, found):
+        if sparse:
+            inside = np.nonzero(found)
+            indices.append(index[inside])
+            values.append(found[inside])
+        else:
+            domains[tuple(index.T)] = found
+
+    for block_starts, block_size, domain in uniform:
+        for index, block in _block_indices(block_starts, block_size, shape):
+            store(index, domain[block].astype(dtype))
+    for index, block in _block_indices(starts, size, shape):
+        points = np.stack([ax[i] for ax, i in zip(axes, index.T)], -1)
+        store(index, np.asarray(scatterer.in_domain(
+            points.reshape(-1, 1, 1, 3))).reshape(-1))
+
+    if not sparse:
+        return domains
+    indices = np.concatenate(indices)
+    values = np.concatenate(values)
+    order = np.argsort(np.ravel_multi_index(tuple(indices.T), shape))
+    return indices[order], values[order]
+
+def _block_indices(starts, size, shape):
+    # Yield (N, 3) arrays of the indices of the voxels in cubic blocks of
+    # the given size starting at starts, clipped to shape, along with the
+    # block each voxel is in, a batch of blocks at a time
+    per_batch = VOXEL_BATCH_SIZE // size**3
+    if per_batch <= 1:
+        # large blocks go one at a time, without making indices past shape
+        for block, start in enumerate(starts):
+            stop = np.minimum(start + size, shape)
+            grid = np.mgrid[tuple(slice(*b) for b in zip(start, stop))]
+            yield grid.reshape(3, -1).T, np.full(grid[0].size, block)
+        return
+    offsets = np.indices((size,) * 3).reshape(3, -1).T
+    for first in range(0, len(starts), per_batch):
+        batch = starts[first:first + per_batch]
+        index = (batch[:, np.newaxis] + offsets).reshape(-1, 3)
+        block = np.repeat(np.arange(first, first + len(batch)), len(offsets))
+        keep = (index < shape).all(-1)
+        yield index[keep], block[keep]
+
+def _squared_extent(lo, hi, center, scale=1):
+    # smallest and largest sum over axes of ((x - center)/scale)**2 for points
+    # x in each box from lo to hi, computed the way the indicators compute it
+    # at each point so comparisons with them agree exactly
+    center = np.asarray(center, dtype=float)
+    near = (np.clip(center, lo, hi) - center) / scale
+    far = np.maximum(((lo - center) / scale)**2, ((hi - center) / scale)**2)
+    return (near**2).sum(-1), far.sum(-1)
@@ -26,7 +26,7 @@ Defines Sphere, a scattering primitive
 import numpy as np
 from copy import copy
 
-from .scatterer import CenteredScatterer, Indicators, checkguess
+from .scatterer import _squared_extent, CenteredScatterer, Indicators, checkguess
 from ..errors import InvalidScatterer
 from ...core.utils import ensure_array, updated
 
@@ -70,6 +70,28 @@ class Sphere(CenteredScatterer):
         r = max(rs)
         return Indicators(funcs, [[-r, r], [-r, r], [-r, r]])
 
+    @property
+    def _bound(self):
+        r = max(ensure_array(self.r))
+        return [[-r, r], [-r, r], [-r, r]]
+
+    def _block_domain(self, lo, hi):
+        dmin, dmax = _squared_extent(lo, hi, self.center)
+        domain = np.zeros(len(lo), dtype=int)
+        found = np.zeros(len(lo), dtype=bool)
+        # points are in the first layer whose radius they are inside
+        for i, r in enumerate(ensure_array(self.r)):
+            inside = ~found & (dmax < r**2)
+            crossing = ~found & ~inside & (dmin < r**2)
+            domain[inside] = i + 1
+            domain[crossing] = -1
+            found |= inside | crossing
+        return domain
+
+    @property
+    def _classifies_blocks(self):
+        return True
+
     def rotated(self, alpha, beta, gamma):
         return copy(self)
 
@@ -27,6 +27,8 @@ Defines Spheres, a Scatterers scatterer consisting of Spheres
 
 import numpy as np
 import warnings
+from itertools import chain
+from scipy.spatial import cKDTree
 
 from .sphere import Sphere
 from .composite import Scatterers
@@ -45,6 +47,9 @@ class Spheres(Scatterers):
     ----------
     spheres : list of Spheres
         Spheres which will make up the cluster
+    warn : bool
+        If True (default), warn if any of the spheres overlap. Checking is
+        skipped if False.
 
     Notes
     -----
@@ -64,17 +69,36 @@ class Spheres(Scatterers):
                         repr(s) + " is not a Sphere")
             self.scatterers = scatterers
 
-        if self.overlaps:
+        if warn and self.overlaps:
             warnings.warn(OverlapWarning(self, self.overlaps))
 
+    def _overlap_arrays(self):
+        # centers and radii of the spheres, as compared when looking for
+        # overlaps
+        return ([s.center for s in self.scatterers],
+                [s.r for s in self.scatterers])
+
+    def _find_overlaps(self):
+        # find_overlaps of the spheres, or None if their centers or radii are
+        # not numbers (e.g. parameters of a fit)
+        centers, r = self._overlap_arrays()
+        try:
+            return find_overlaps(centers, [np.max(ri) for ri in r])
+        except (TypeError, ValueError):
+            return None
+
     @property
     def overlaps(self):
+        found = self._find_overlaps()
+        if found is not None:
+            return [tuple(pair) for pair in found[0].tolist()]
+
+        centers, r = self._overlap_arrays()
         overlaps = []
-        for i, s1 in enumerate(self.scatterers):
-            for j in range(i+1, len(self.scatterers)):
-                s2= self.scatterers[j]
+        for i in range(len(r)):
+            for j in range(i+1, len(r)):
                 try:
-                    if cartesian_distance(s1.center, s2.center) < (np.max(s1.r) + np.max(s2.r)):
+                    if cartesian_distance(centers[i], centers[j]) < (np.max(r[i]) + np.max(r[j])):
                         overlaps.append((i, j))
                 except:
                     # if the coordinates are not something that we can do
@@ -84,12 +108,16 @@ class Spheres(Scatterers):
         return overlaps
 
     def largest_overlap(self):
+        found = self._find_overlaps()
+        if found is not None:
+            return found[1].max() if len(found[1]) else 0
+
+        centers, r = self._overlap_arrays()
         largest = 0
-        for i, s1 in enumerate(self.scatterers):
-            for j in range(i+1, len(self.scatterers)):
-                s2= self.scatterers[j]
-                largest = max(largest, (np.max(s1.r) + np.max(s2.r)) -
-                                       cartesian_distance(s1.center, s2.center))
+        for i in range(len(r)):
+            for j in range(i+1, len(r)):
+                largest = max(largest, (np.max(r[i]) + np.max(r[j])) -
+                                       cartesian_distance(centers[i], centers[j]))
 
         return largest
 
@@ -133,3 +161,222 @@ class Spheres(Scatterers):
     def center(self):
         return self.centers.mean(0)
 
+
+class SphereArray(Spheres):
+    '''
+    Cluster of homogeneous spheres stored as arrays
+
+    Behaves like :class:`Spheres`, but keeps the centers, radii and indices of
+    the spheres in contiguous arrays rather than in a list of :class:`.Sphere`
+    objects. This makes large clusters much cheaper to build and lets their
+    properties be read without copying. Component :class:`.Sphere` objects
+    are only made when :attr:`scatterers` is accessed.
+
+    Attributes
+    ----------
+    centers : array_like (N, 3)
+        coordinates of the center of each sphere
+    r : float or array_like (N,)
+        radius of each sphere
+    n : complex or array_like (N,)
+        index of refraction of each sphere
+    warn : bool
+        If True (default), warn if any of the spheres overlap
+    '''
+
+    def __init__(self, centers, r, n, warn=True):
+        centers = _as_column(centers)
+        if centers.ndim != 2 or centers.shape[1] != 3:
+            raise InvalidScatterer(self, "centers specified as {0}, centers "
+                "should be specified as an (N, 3) array".format(centers))
+        self._centers = centers
+        self._r = _as_column(r, centers.shape[:1])
+        self._n = _as_column(n, centers.shape[:1])
+        self._warn = warn
+
+        if self._r.dtype.kind != 'O' and np.any(self._r < 0):
+            raise InvalidScatterer(self, "radius is negative")
+        if warn and self.overlaps:
+            warnings.warn(OverlapWarning(self, self.overlaps))
+
+    @classmethod
+    def from_spheres(cls, spheres, warn=True):
+        """
+        Make a SphereArray from a list of homogeneous spheres
+
+        Parameters
+        ----------
+        spheres : list of :class:`.Sphere` or :class:`Spheres`
+            spheres to include, each with a scalar r and n
+        warn : bool
+            If True (default), warn if any of the spheres overlap
+
+        Returns
+        -------
+        cluster : SphereArray
+        """
+        if isinstance(spheres, Spheres):
+            spheres = spheres.scatterers
+        for s in spheres:
+            if not isinstance(s, Sphere) or not np.isscalar(s.r):
+                raise InvalidScatterer(cls, "SphereArray expects homogeneous "
+                    "Spheres.\n" + repr(s) + " is not a homogeneous Sphere")
+        return cls([s.center for s in spheres], [s.r for s in spheres],
+                   [s.n for s in spheres], warn=warn)
+
+    def _iteritems(self):
+        # report arrays as lists so that comparison and serialization behave
+        # as they do for Spheres
+        for key, val in super(SphereArray, self)._iteritems():
+            if isinstance(val, np.ndarray):
+                val = val.tolist()
+            yield key, val
+
+    @property
+    def scatterers(self):
+        return [Sphere(n=n, r=r, center=center) for center, r, n in
+                zip(self._centers.tolist(), self._r.tolist(), self._n.tolist())]
+
+    def add(self, scatterer):
+        if not isinstance(scatterer, Sphere) or not np.isscalar(scatterer.r):
+            raise InvalidScatterer(self, "SphereArray expects homogeneous "
+                "Spheres.\n" + repr(scatterer) + " is not a homogeneous Sphere")
+        self._centers = _as_column(np.vstack((self._centers, [scatterer.center])))
+        self._r = _as_column(np.append(self._r, scatterer.r))
+        self._n = _as_column(np.append(self._n, scatterer.n))
+
+    def from_parameters(self, parameters, update=False):
+        return self.from_spheres(
+            self._components_from_parameters(parameters, update), self._warn)
+
+    def _parameter_template(self, leaf, prefix=''):
+        if type(self).from_parameters is not SphereArray.from_parameters:
+            return None
+        centers, r, n = [], [], []
+        for i, (center, ri, ni) in enumerate(zip(self._centers.tolist(),
+                                                 self._r.tolist(), self._n.tolist())):
+            name = '{0}{1}:Sphere.'.format(prefix, i)
+            centers.append([leaf(c, '{0}center[{1}]'.format(name, j))
+                            for j, c in enumerate(center)])
+            r.append(leaf(ri, name + 'r'))
+            n.append(leaf(ni, name + 'n'))
+        if any(t is None for t in chain(chain(*centers), r, n)):
+            return None
+        return _SphereArrayTemplate(type(self), centers, r, n, self._warn)
+
+    def guess(self):
+        return self.from_spheres([sphere.guess() for sphere in self.scatterers],
+                                 self._warn)
+
+    def select(self, keys):
+        return self.from_spheres([s.select(keys) for s in self.scatterers],
+                                 warn=False)
+
+    def translated(self, coord1, coord2=None, coord3=None):
+        if coord2 is None and coord3 is None:
+            trans_coords = np.array(coord1)
+        else:
+            trans_coords = np.array([coord1, coord2, coord3])
+        if trans_coords.shape != (3,):
+            raise InvalidScatterer(self, "Cannot interpret translation coordinates")
+        return type(self)(self._centers + trans_coords, self._r, self._n,
+                          warn=False)
+
+    def rotated(self, ang1, ang2=None, ang3=None):
+        if ang2 is None and ang3 is None:
+            alpha, beta, gamma = ang1
+        else:
+            alpha, beta, gamma = ang1, ang2, ang3
+        com = self._centers.mean(0)
+        centers = com + rotate_points(self._centers - com, alpha, beta, gamma)
+        return type(self)(centers, self._r, self._n, warn=False)
+
+    def _overlap_arrays(self):
+        return self._centers, self._r
+
+    @property
+    def n(self):
+        return self._n
+    @property
+    def n_real(self):
+        return self._n.real
+    @property
+    def n_imag(self):
+        return self._n.imag
+    @property
+    def r(self):
+        return self._r
+    @property
+    def x(self):
+        return self._centers[:, 0]
+    @property
+    def y(self):
+        return self._centers[:, 1]
+    @property
+    def z(self):
+        return self._centers[:, 2]
+    @property
+    def centers(self):
+        return self._centers
+
+
+class _SphereArrayTemplate(object):
+    def __init__(self, cls, centers, r, n, warn):
+        self.cls = cls
+        self.centers = centers
+        self.r = r
+        self.n = n
+        self.warn = warn
+
+    def build(self, values):
+        return self.cls([[c.build(values) for c in center] for center in self.centers],
+                        [r.build(values) for r in self.r],
+                        [n.build(values) for n in self.n], warn=self.warn)
+
+
+def _as_column(value, shape=None):
+    # read only contiguous array, as floats unless complex or holding objects
+    value = np.array(value)
+    if value.dtype.kind in 'biu':
+        value = value.astype(float)
+    if shape is not None:
+        value = np.array(np.broadcast_to(value, shape))
+    value.flags.writeable = False
+    return value
+
+
+def find_overlaps(centers, r):
+    """
+    Find the pairs of spheres which overlap
+
+    Candidate pairs are found with a KD-tree, so this takes about
+    O(N log N) time rather than comparing every pair of spheres.
+
+    Parameters
+    ----------
+    centers : array_like (N, 3)
+        coordinates of the sphere centers
+    r : array_like (N,)
+        sphere radii
+
+    Returns
+    -------
+    pairs : array (M, 2)
+        indices i < j of overlapping spheres, sorted
+    overlap : array (M,)
+        r_i + r_j - |c_i - c_j| for each pair, always positive
+    """
+    centers = np.asarray(centers, dtype=float)
+    r = np.asarray(r, dtype=float)
+    if centers.shape != (len(r), 3):
+        raise ValueError("centers should be an (N, 3) array")
+    if len(r) < 2:
+        return np.zeros((0, 2), dtype=int), np.zeros(0)
+    pairs = cKDTree(centers).query_pairs(2 * r.max(), output_type='ndarray')
+    pairs = pairs.reshape(-1, 2)
+    i, j = pairs[:, 0], pairs[:, 1]
+    overlap = r[i] + r[j] - np.sqrt(((centers[i] - centers[j])**2).sum(-1))
+    keep = overlap > 0
+    pairs, overlap = pairs[keep], overlap[keep]
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order], overlap[order]
@@ -77,5 +77,11 @@ class Spheroid(CenteredScatterer):
             unflatten = flat_indicator.reshape(subdivisions[0], subdivisions[1],
                                                subdivisions[2]) 
             return unflatten
-        r = max(self.r)
-        return Indicators([spheroidbody], [[-r, r], [-r, r], [-r, r]])
+        return Indicators([spheroidbody], self._bound)
+
+    @property
+    def _bound(self):
+        # extent of the rotated spheroid along each axis
+        axes = np.array([self.r[0], self.r[0], self.r[1]])
+        r = np.sqrt((rotation_matrix(*self.rotation)**2).dot(axes**2))
+        return [[-ri, ri] for ri in r]
@@ -23,9 +23,16 @@ calc_intensity and calc_holo, based on subclass's calc_field
 """
 
 from .. import Sphere, Spheres, Mie, Multisphere
-from ...core import detector_grid
-from ...core.tests.common import assert_obj_close
+import os
+import shutil
+import tempfile
+import numpy as np
+from numpy.testing import assert_raises
+from ...core import detector_grid, load
+from ...core.metadata import from_flat
+from ...core.tests.common import assert_obj_close, assert_allclose, assert_equal
 from ..calculations import *
+from ..theory import scatteringtheory
 
 scatterer = Sphere(n = 1.6, r=.5, center=(5, 5, 5))
 medium_index = 1.33
@@ -51,3 +58,77 @@ def test_calc_scat_matrix():
 def test_determine_theory():
     assert_obj_close(determine_theory(Sphere()), Mie())
     assert_obj_close(determine_theory(Spheres([Sphere(), Sphere()])), Multisphere())
+
+def test_streamed_matches_field():
+    spheres = Spheres([Sphere(n = 1.6, r=.5, center=(1, 1, 5)),
+                       Sphere(n = 1.6, r=.5, center=(2, 1.5, 5))])
+    schema = prep_schema(locations, medium_index, wavelen, polarization)
+    for theory in [Mie(), Multisphere()]:
+        field = from_flat(theory._calc_field(spheres, schema))
+        expected = scattered_field_to_hologram(field * .7, schema.illum_polarization, schema.normals)
+        assert_allclose(theory._calc_holo(spheres, schema, .7), expected)
+
+    # results should not depend on how the detector is split into chunks, and
+    # can be written into a buffer supplied by the caller
+    for calc in [calc_field, calc_intensity, calc_holo]:
+        expected = calc(locations, spheres, medium_index, wavelen, polarization, Mie())
+        out = np.empty(expected.shape, expected.dtype)
+        streamed = calc(locations, spheres, medium_index, wavelen, polarization, Mie(),
+                        chunk_size=37, out=out)
+        assert_allclose(streamed, expected)
+        assert np.shares_memory(streamed.values, out)
+
+class CountingMultisphere(Multisphere):
+    solves = 0
+
+    def _scsmfo_setup(self, *args, **kwargs):
+        CountingMultisphere.solves += 1
+        return super()._scsmfo_setup(*args, **kwargs)
+
+def test_multisphere_solves_once():
+    spheres = Spheres([Sphere(n = 1.6, r=.5, center=(1, 1, 5)),
+                       Sphere(n = 1.6, r=.5, center=(2, 1.5, 5))])
+    chunk_size = scatteringtheory.HOLO_CHUNK_SIZE
+    # make the 400 point detector span many default sized chunks
+    scatteringtheory.HOLO_CHUNK_SIZE = 37
+    try:
+        CountingMultisphere.solves = 0
+        calc_holo(locations, spheres, medium_index, wavelen, polarization,
+                  CountingMultisphere())
+        assert_equal(CountingMultisphere.solves, 1)
+    finally:
+        scatteringtheory.HOLO_CHUNK_SIZE = chunk_size
+    assert_raises(ValueError, calc_holo, locations, spheres, medium_index,
+                  wavelen, polarization, Multisphere(), chunk_size=37)
+
+def test_calc_holo_series():
+    centers = [(1, 1, 5), (1.1, 1, 5), (1.2, 1.1, 6)]
+    frames = trajectory(scatterer, centers)
+    expected = [calc_holo(locations, s, medium_index, wavelen, polarization) for s in frames]
+
+    holos = calc_holo_series(locations, frames, medium_index, wavelen, polarization, processes=None)
+    assert_equal(holos.dims, ('frame',) + expected[0].dims)
+    assert_allclose(holos.values, np.array(expected))
+
+    tempdir = tempfile.mkdtemp()
+    try:
+        progress = []
+        filename = os.path.join(tempdir, 'series.h5')
+        saved = calc_holo_series(locations, frames, medium_index, wavelen, polarization, filename=filename,
+                                 processes=2, progress=lambda *args: progress.append(args))
+        assert_allclose(load(filename).values, np.array(expected))
+        assert_allclose(saved.values, np.array(expected))
+        assert_equal([p[:2] for p in progress], [(1, 3), (2, 3), (3, 3)])
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_prepared_schema():
+    prepared = PreparedSchema(locations, medium_index, wavelen, polarization)
+    for calc in [calc_holo, calc_field, calc_intensity]:
+        assert_equal(calc(prepared, scatterer).values,
+                     calc(locations, scatterer, medium_index, wavelen, polarization).values)
+    # preparing does not copy the data, and optics given with a prepared
+    # schema are used if they differ from the prepared ones
+    assert np.may_share_memory(prepared.prepared.values, locations.values)
+    assert_equal(calc_holo(prepared, scatterer, illum_wavelen=.5).values,
+                 calc_holo(locations, scatterer, medium_index, .5, polarization).values)
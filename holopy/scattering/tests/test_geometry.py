@@ -0,0 +1,60 @@
+# Copyright 2011-2016, Vinothan N. Manoharan, Thomas G. Dimiduk,
+# Rebecca W. Perry, Jerome Fung, Ryan McGorty, Anna Wang, Solomon Barkley
+#
+# This file is part of HoloPy.
+#
+# HoloPy is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# HoloPy is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with HoloPy.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Test calculations of sphere cluster geometry.
+'''
+
+import numpy as np
+import xarray as xr
+from numpy.testing import assert_allclose, assert_equal
+from nose.plugins.attrib import attr
+
+from ..geometry import distances, angles, make_tetracluster, make_sqcluster
+
+@attr('fast')
+def test_distances():
+    square = make_sqcluster(1.59, .5, .2)
+    side, diagonal = 1.2, 1.2*np.sqrt(2)
+    assert_allclose(distances(square)[0], [0, side, side, diagonal])
+    assert_allclose(distances(square, gaponly=True)[0],
+                    [0, side - 1, side - 1, diagonal - 1])
+
+@attr('fast')
+def test_angles():
+    tetra = make_tetracluster(1.59, .5, .1)
+    ang = angles(tetra)
+    assert_allclose(ang[0, 1, 2], 60)
+    assert_allclose(ang[0, 1, 0], 0)
+    assert np.isnan(ang[0, 0, 1])
+    assert_allclose(angles(make_sqcluster(1.59, .5, 0), degrees=False)[0, 1, 3],
+                    np.pi/2)
+
+@attr('fast')
+def test_batched_geometry():
+    frames = np.random.RandomState(0).rand(10, 4, 3)
+    dist = distances(frames, gaponly=True, r=.1)
+    assert_equal(dist.dims, ('frame', 'sphere_a', 'sphere_b'))
+    for i in [0, 7]:
+        assert_allclose(dist[i], distances(frames[i], gaponly=True, r=.1))
+
+    positions = xr.DataArray(frames, dims=['time', 'particle', 'xyz'],
+                             coords={'time': np.arange(10), 'particle': list('abcd')})
+    ang = angles(positions)
+    assert_equal(ang.dims, ('time', 'particle_a', 'particle_b', 'particle_c'))
+    assert_allclose(ang.sel(time=3, particle_a='a', particle_b='c', particle_c='d'),
+                    angles(frames[3])[0, 2, 3])
@@ -24,7 +24,7 @@ Test fortran-based multilayered Mie calculations and python interface.
 
 
 import numpy as np
-from numpy.testing import assert_allclose
+from numpy.testing import assert_allclose, assert_equal
 import yaml
 import os
 from nose.plugins.attrib import attr
@@ -95,3 +95,29 @@ def test_sooty_particles():
                     rtol = 2e-5)
     assert_allclose(efficiencies_from_scat_units(m_sm, x_sm), gold[2],
                     rtol = 1e-3)
+
+@attr('fast')
+def test_batch_coeffs():
+    marrays = np.array([[1.59 + 0.001j, 1.33], [1.2 + 0.01j, 1.5], [1.6, 1.6]])
+    xarrays = np.array([[5., 6.], [10., 13.], [2., 3.]])
+    batch = multilayer_sphere_lib.scatcoeffs_multi_batch(marrays, xarrays)
+    assert_equal(batch.shape, (3, 2, miescatlib.nstop(13.)))
+
+    for m, x, coeffs in zip(marrays, xarrays, batch):
+        single = multilayer_sphere_lib.scatcoeffs_multi(m, x)
+        lmax = single.shape[1]
+        assert_allclose(coeffs[:, :lmax], single, rtol=1e-6)
+        # orders beyond a particle's own expansion are not used
+        assert_equal(coeffs[:, lmax:], 0)
+
+    # last particle is a homogeneous sphere padded out to two layers
+    assert_allclose(batch[2, :, :miescatlib.nstop(3.)],
+                    miescatlib.scatcoeffs(1.6, 3., miescatlib.nstop(3.)), rtol=1e-6)
+
+    # homogeneous spheres can also be given as a single layer
+    batch = multilayer_sphere_lib.scatcoeffs_multi_batch([[1.59 + 0.001j], [1.2]],
+                                                         [[5.], [3.]])
+    for m, x, coeffs in zip([1.59 + 0.001j, 1.2], [5., 3.], batch):
+        lmax = miescatlib.nstop(x)
+        assert_allclose(coeffs[:, :lmax], miescatlib.scatcoeffs(m, x, lmax),
+                        rtol=1e-6)
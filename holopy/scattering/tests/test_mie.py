@@ -40,7 +40,7 @@ from .common import sphere, xschema, scaling_alpha, yschema, xpolarization, ypol
 from .common import x, y, z, n, radius, wavelen, index
 from ...core.tests.common import assert_obj_close, verify
 
-from ..calculations import calc_field, calc_holo, calc_intensity, calc_scat_matrix, calc_cross_sections
+from ..calculations import calc_field, calc_holo, calc_intensity, calc_scat_matrix, calc_cross_sections, calc_cross_sections_batch, calc_holo_derivatives
 
 @attr('fast')
 def test_single_sphere():
@@ -60,6 +60,34 @@ def test_single_sphere():
     # large radius (calculation not attempted because it would take forever
     assert_raises(InvalidScatterer, calc_holo, xschema, Sphere(r=1, n = 1.59, center = (5,5,5)), medium_index=index, illum_wavelen=wavelen)
 
+@attr('fast')
+def test_single_precision():
+    # single precision holograms should still match the double precision golds
+    thry = Mie(False, precision='single')
+    holo = calc_holo(xschema, sphere, index, wavelen, xpolarization, theory=thry, scaling=scaling_alpha)
+    assert_equal(holo.dtype, np.float32)
+    verify(holo, 'single_holo', rtol=1e-5)
+
+    field = calc_field(xschema, sphere, index, wavelen, xpolarization, theory=thry)
+    assert_equal(field.dtype, np.complex64)
+    verify(field, 'single_field', rtol=1e-5, atol=1e-7)
+    # chunks are superposed in single precision too
+    chunked = calc_field(xschema, sphere, index, wavelen, xpolarization,
+                         theory=thry, chunk_size=37)
+    assert_equal(chunked.dtype, np.complex64)
+    assert_allclose(chunked.values, field.values, rtol=1e-5, atol=1e-7)
+
+    s1 = Sphere(n = 1.59, r = 5e-7, center = (1e-6, -1e-6, 10e-6))
+    s2 = Sphere(n = 1.59, r = 1e-6, center=[8e-6,5e-6,5e-6])
+    s3 = Sphere(n = 1.59+0.0001j, r = 5e-7, center=[5e-6,10e-6,3e-6])
+    sc = Spheres(scatterers=[s1, s2, s3])
+    holo = calc_holo(yschema, sc, index, wavelen, theory=thry)
+    assert_equal(holo.dtype, np.float32)
+    verify(holo, 'mie_multiple_holo', rtol=1e-5)
+
+    assert_raises(ValueError, calc_holo, xschema, sphere, index, wavelen,
+                  xpolarization, Mie(precision='half'))
+
 @attr('fast')
 def test_farfield_holo():
     # Tests that a far field calculation gives a hologram that is
@@ -124,6 +152,57 @@ def test_Mie_multiple():
                   schema, el, index, wavelen, xpolarization, Mie)
     assert_raises(TheoryNotCompatibleError, calc_holo, schema, el, index, wavelen, xpolarization, Mie)
 
+@attr('fast')
+def test_amplitude_cutoff():
+    # small, well separated spheres only need to be evaluated near themselves
+    s1 = Sphere(n = 1.59, r = 5e-8, center = (1e-6, 1e-6, 5e-6))
+    s2 = Sphere(n = 1.59, r = 5e-8, center = (13e-6, 13e-6, 5e-6))
+    sc = Spheres([s1, s2])
+    cutoff = 3e-4
+
+    full = calc_field(xschema, sc, index, wavelen, xpolarization, theory=Mie())
+    culled = calc_field(xschema, sc, index, wavelen, xpolarization,
+                        theory=Mie(amplitude_cutoff=cutoff))
+    assert_equal(culled.dims, full.dims)
+    # each sphere neglects at most cutoff of field at any point
+    assert abs(culled - full).max() <= 2 * cutoff
+    # but some points should have been skipped entirely
+    assert (culled == 0).all('vector').any()
+
+    holo = calc_holo(xschema, sc, index, wavelen, xpolarization,
+                     theory=Mie(amplitude_cutoff=cutoff))
+    assert_allclose(holo, calc_holo(xschema, sc, index, wavelen, xpolarization),
+                    atol = 5 * cutoff)
+
+    # a cutoff far below the scattered field changes nothing
+    assert_allclose(calc_field(xschema, sc, index, wavelen, xpolarization,
+                               theory=Mie(amplitude_cutoff=1e-10)), full)
+
+@attr('fast')
+def test_field_tolerance():
+    wavevec = 2 * np.pi / (wavelen / index)
+    full_order, full_error = Mie().expansion_order(sphere, wavevec, index)
+    assert_equal(full_error, 0)
+
+    loose = Mie(field_tolerance=1e-3)
+    lmax, error = loose.expansion_order(sphere, wavevec, index)
+    assert lmax < full_order
+    assert error <= 1e-3
+
+    # tighter tolerances keep more terms
+    tight_lmax, tight_error = Mie(field_tolerance=1e-8).expansion_order(
+        sphere, wavevec, index)
+    assert lmax < tight_lmax <= full_order
+    assert tight_error <= 1e-8
+
+    holo = calc_holo(xschema, sphere, index, wavelen, xpolarization,
+                     scaling=scaling_alpha)
+    assert_allclose(calc_holo(xschema, sphere, index, wavelen, xpolarization,
+                              scaling=scaling_alpha, theory=loose), holo, atol=1e-2)
+    assert_allclose(calc_holo(xschema, sphere, index, wavelen, xpolarization,
+                              scaling=scaling_alpha,
+                              theory=Mie(field_tolerance=1e-8)), holo, atol=1e-6)
+
 @attr('fast')
 def test_mie_polarization():
 
@@ -245,6 +324,68 @@ def test_radiometric():
     for key, val in gold.items():
         assert_almost_equal(gold[key], val, decimal = 5)
 
+@attr('fast')
+def test_cross_sections_batch():
+    wavelens = [.4, .6, .8]
+    radii = [.1, .5, 1.2, 2.]
+    sections = calc_cross_sections_batch(n, radii, index, wavelens)
+    assert_equal(sections.dims, ('illum_wavelen', 'r', 'cross_section'))
+    for i, wl in enumerate(wavelens):
+        for j, r in enumerate(radii):
+            single = calc_cross_sections(Sphere(n=n, r=r), index, wl,
+                                         illum_polarization=xpolarization)
+            # the batch uses downward recursion rather than the single sphere
+            # code's Lentz continued fractions, so they agree closely but not to
+            # machine precision
+            assert_allclose(sections[i, j], single, rtol=1e-8, atol=1e-12)
+
+    weights = np.array([1, 2, 3, 4])
+    averaged = calc_cross_sections_batch(n, radii, index, wavelens[1],
+                                         weights=weights)
+    assert_equal(averaged.dims, ('cross_section',))
+    middle = sections.sel(illum_wavelen=.6)
+    assert_allclose(averaged[:3], (middle[:, :3] * weights[:, np.newaxis]).sum('r') / 10)
+    cscat = middle[:, 0]
+    assert_allclose(averaged[3], (middle[:, 3] * cscat * weights).sum() /
+                    (cscat * weights).sum())
+
+@attr('fast')
+def test_holo_derivatives():
+    # the detector center is directly below the sphere, where the azimuthal
+    # derivatives need care
+    schema = detector_grid(shape=(10, 11), spacing=.1)
+    sphere = Sphere(n=1.59+0.02j, r=.5, center=(.5, .5, 5))
+    pol = to_vector((.6, .8))
+    for thry in [Mie(), Mie(False)]:
+        holo, derivatives = calc_holo_derivatives(schema, sphere, index, .66, pol,
+                                                  theory=thry, scaling=.8)
+        assert_allclose(holo, calc_holo(schema, sphere, index, .66, pol,
+                                        theory=thry, scaling=.8), rtol=1e-7)
+
+        def change(name, step):
+            center, n, r = list(sphere.center), sphere.n, sphere.r
+            if name.startswith('center'):
+                center[int(name[-2])] += step
+            elif name == 'n.real':
+                n += step
+            elif name == 'n.imag':
+                n += 1j*step
+            elif name == 'r':
+                r += step
+            scaling = .8 + step if name == 'alpha' else .8
+            return calc_holo(schema, Sphere(n=n, r=r, center=center), index, .66,
+                             pol, theory=thry, scaling=scaling)
+
+        step = 1e-6
+        for name in derivatives.parameter.values:
+            finite = ((change(name, step) - change(name, -step)) / (2 * step)).values
+            assert_allclose(derivatives.sel(parameter=name), finite,
+                            rtol=1e-5, atol=1e-5 * abs(finite).max())
+
+    assert_raises(TheoryNotCompatibleError, calc_holo_derivatives, schema,
+                  LayeredSphere(n=(1.59, 1.4), t=(.3, .1), center=(.5, .5, 5)),
+                  index, .66, pol, theory=Mie())
+
 @attr('fast')
 def test_farfield_matr():
     schema = detector_points(theta = np.linspace(0, np.pi/2), phi = np.linspace(0, 1))
@@ -27,7 +27,10 @@ from numpy.testing import assert_equal, assert_raises, assert_allclose
 from nose.plugins.attrib import attr
 
 from ...core import detector_grid
-from .. import Sphere, Scatterer, Ellipsoid, Scatterers, calc_holo
+from ...core.math import rotation_matrix
+from .. import (Sphere, Scatterer, Ellipsoid, Scatterers, Spheroid, Cylinder,
+                Bisphere, calc_holo)
+from ..scatterer import Intersection, Union, Difference
 from ..scatterer.ellipsoid import isnumber
 from ..scatterer.scatterer import find_bounds
 from ..errors import InvalidScatterer, MissingParameter
@@ -155,6 +158,33 @@ def test_find_bounds():
     s = Sphere(n = 1.59, r = .5e6, center = (0, 0, 0))
     assert_allclose(find_bounds(s.indicators.functions[0])[0], np.array([-s.r,s.r]), rtol=0.1)
 
+@attr('fast')
+def test_analytic_bounds():
+    # spheroid with its long axis rotated into the x-z plane
+    s = Spheroid(n=1.59, r=(.5, 1), rotation=(0, np.pi/2, 0), center=(0, 0, 1))
+    assert_allclose(s.bounds, [(-1, 1), (-.5, .5), (.5, 1.5)])
+
+    s1 = Sphere(n=1.59, r=.5, center=(0, 0, 0))
+    lens = Intersection(s1, s1.translated(.6, 0, 0))
+    assert_allclose(lens.bounds, [(.1, .5), (-.5, .5), (-.5, .5)])
+
+    # bounds follow changes to the shape
+    s1.r = 1
+    assert_allclose(s1.bounds, [(-1, 1), (-1, 1), (-1, 1)])
+
+    # rotated cylinders and bispheres get boxes around their rotated shapes
+    c = Cylinder(n=1.59, h=2, d=1, center=(0, 0, 0), rotation=(0, np.pi/2, 0))
+    assert_allclose(c.bounds, [(-1, 1), (-.5, .5), (-.5, .5)], atol=1e-12)
+    b = Bisphere(n=1.59, h=2, d=1, center=(0, 0, 0), rotation=(0, np.pi/2, 0))
+    assert_allclose(b.bounds, [(-1.5, 1.5), (-.5, .5), (-.5, .5)], atol=1e-12)
+    # a cylinder's box is the box around its two end circles
+    c.rotation = (.3, .7, 1.1)
+    phi = np.linspace(0, 2*np.pi, 10000)
+    rims = np.hstack([[.5*np.cos(phi), .5*np.sin(phi), np.ones_like(phi)*z]
+                      for z in (-1, 1)])
+    extent = np.abs(rotation_matrix(*c.rotation).dot(rims)).max(axis=1)
+    assert_allclose(np.array(c.bounds)[:, 1], extent, rtol=1e-6)
+
 def test_sphere_nocenter():
     sphere = Sphere(n = 1.59, r = .5)
     schema = detector_grid(spacing=.1, shape=1)
@@ -172,3 +202,20 @@ def test_ellipsoid():
          [[0., 0., 0., 0., 0., 0., 0., 0.],
           [0., 0., 0., 0., 0., 0., 0., 0.],
           [0., 0., 0., 0., 0., 0., 0., 0.]]]))
+
+@attr('fast')
+def test_octree_voxelate():
+    s1 = Sphere(n=1.59, r=.5, center=(.01, .02, .03))
+    s2 = Sphere(n=1.59, r=.45, center=(.4, .1, 0))
+    scatterers = [s1, Ellipsoid(n=1.59, r=(.3, .5, .8), center=(.1, 0, 0)),
+                  Sphere(n=[1.59, 1.4], r=[.3, .5], center=(0, 0, 0)),
+                  Difference(s1, s2), Union(Intersection(s1, s2), s2)]
+    for s in scatterers:
+        # same voxels, including those exactly on a surface, as testing
+        # every point of the grid
+        dense = s.in_domain(s._voxel_coords(.013))
+        assert_equal(s.voxelate_domains(.013), dense)
+        indices, domains = s.voxelate_domains(.013, sparse=True)
+        assert_equal(indices, np.transpose(np.nonzero(dense)))
+        assert_equal(domains, dense[np.nonzero(dense)])
+    assert_equal(s1.voxelate(.1, 1.33), s1.index_at(s1._voxel_coords(.1), 1.33))
@@ -28,7 +28,8 @@ from nose.plugins.attrib import attr
 from nose.tools import raises
 
 from ..scatterer import Sphere, Ellipsoid
-from ..scatterer import Spheres
+from ..scatterer import Spheres, SphereArray
+from ..scatterer.spherecluster import find_overlaps
 from ..errors import InvalidScatterer, OverlapWarning
 
 import warnings
@@ -73,6 +74,24 @@ def test_Spheres_ovelap_checking():
         warnings.simplefilter('always', OverlapWarning)
         sc = Spheres([s1, s1, s1])
         assert len(w) > 0
+        assert_equal(sc.overlaps, [(0, 1), (0, 2), (1, 2)])
+        assert_almost_equal(sc.largest_overlap(), 1e-6)
+
+        w[:] = []
+        sc = Spheres([s1, s1, s1], warn=False)
+        assert len(w) == 0
+
+@attr('fast')
+def test_find_overlaps():
+    centers = np.random.RandomState(0).uniform(0, 10, (200, 3))
+    r = np.random.RandomState(1).uniform(.1, .6, 200)
+    dist = np.sqrt(((centers[:, np.newaxis] - centers)**2).sum(-1))
+    overlap = r[:, np.newaxis] + r - dist
+    i, j = np.nonzero(np.triu(overlap > 0, 1))
+
+    pairs, found = find_overlaps(centers, r)
+    assert_equal(pairs, np.transpose([i, j]))
+    assert_almost_equal(found, overlap[i, j])
 
 
 def test_Spheres_parameters():
@@ -123,3 +142,29 @@ def test_Spheres_rotation():
     assert_equal(sc.scatterers[1].n, sc2.scatterers[1].n)
     assert_almost_equal([0, -1, 0], sc2.scatterers[0].center)
     assert_almost_equal([0, 1, 1], sc2.scatterers[1].center)
+
+@attr('fast')
+def test_SphereArray():
+    centers = np.array([[0, 0, 0], [1, 0, 0], [5, 5, 5], [5.5, 5, 5]], dtype=float)
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter('always', OverlapWarning)
+        spheres = Spheres([Sphere(n=1.59, r=r, center=c) for c, r in
+                           zip(centers, [.6, .5, .2, .2])])
+        sa = SphereArray(centers, [.6, .5, .2, .2], 1.59)
+        assert len(w) == 2
+    assert_equal(sa.overlaps, spheres.overlaps)
+    assert_almost_equal(sa.largest_overlap(), spheres.largest_overlap())
+
+    # properties are views of the stored arrays
+    assert np.shares_memory(sa.x, sa.centers)
+    assert np.shares_memory(sa.r, sa._r)
+    for prop in ['n', 'n_real', 'n_imag', 'r', 'x', 'y', 'z', 'centers', 'center']:
+        assert_almost_equal(getattr(sa, prop), getattr(spheres, prop))
+
+    assert_equal(sa.scatterers, spheres.scatterers)
+    assert_equal(SphereArray.from_spheres(spheres, warn=False), sa)
+    assert_equal(sa.from_parameters(sa.parameters), sa)
+    assert_almost_equal(sa.translated(1, 1, 1).centers, centers + 1)
+    assert_almost_equal(sa.rotated(-np.pi/2, 0, 0).centers,
+                        spheres.rotated(-np.pi/2, 0, 0).centers)
+
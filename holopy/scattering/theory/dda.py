@@ -210,11 +210,9 @@ class DDA(ScatteringTheory):
         spacing = self.required_spacing(medium_wavelen, medium_index, scatterer.n)
         outf = tempfile.NamedTemporaryFile(dir = temp_dir, delete=False)
 
-        vox = scatterer.voxelate_domains(spacing)
-        idx = np.concatenate([g[..., np.newaxis] for g in
-                              np.mgrid[[slice(0,d) for d in vox.shape]]],
-                             3).reshape((-1, 3))
-        vox = vox.flatten()
+        # only the occupied voxels are written, so there is no need to hold
+        # the whole grid
+        idx, vox = scatterer.voxelate_domains(spacing, sparse=True)
         ns = ensure_array(scatterer.n)
         n_domains = len(ns)
         if n_domains > 1:
@@ -222,7 +220,7 @@ class DDA(ScatteringTheory):
             outf.write("Nmat={0}\n".format(n_domains).encode('utf-8'))
         else:
             out = idx
-        np.savetxt(outf, out[np.nonzero(vox)], fmt='%d')
+        np.savetxt(outf, out, fmt='%d')
         outf.close()
 
         cmd = []
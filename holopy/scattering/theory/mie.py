@@ -27,19 +27,39 @@ scattered field.
 '''
 
 import numpy as np
+import xarray as xr
+from scipy.special import spherical_jn, spherical_yn
+from ...core.math import to_spherical
+from ...core.metadata import flat, primdim
 from ...core.utils import ensure_array
-from ..errors import TheoryNotCompatibleError, InvalidScatterer
+from ..errors import TheoryNotCompatibleError, InvalidScatterer, MissingParameter
 from ..scatterer import Sphere, Scatterers
-from .scatteringtheory import ScatteringTheory
+from .scatteringtheory import (ScatteringTheory, field_array, wavevec,
+                               detector_layout, detector_chunk)
 try:
-    from .mie_f import mieangfuncs, miescatlib
-    from .mie_f.multilayer_sphere_lib import scatcoeffs_multi
+    from .mie_f import mieangfuncs, miescatlib, mie_specfuncs
+    from .mie_f.mieangfuncs import dn_1_down, lentz_dn1
+    from .mie_f.multilayer_sphere_lib import scatcoeffs_multi, scatcoeffs_multi_batch
 except ImportError:
     import warnings
     from ..errors import NoScattering
     warnings.simplefilter('always', NoScattering)
     warnings.warn(NoScattering('Mie'))
 
+# number of spheres whose coefficients Mie._raw_cross_sections_batch computes
+# at once
+CROSS_SECTION_BATCH_SIZE = 1024
+
+# number of detector points Mie._calc_holo_derivatives handles at once. Each
+# point needs several arrays of one value per expansion order, so this is
+# smaller than HOLO_CHUNK_SIZE
+DERIVATIVE_CHUNK_SIZE = 2**12
+
+# parameters of a single sphere hologram whose derivatives
+# Mie._calc_holo_derivatives computes
+DERIVATIVE_PARAMETERS = ['center[0]', 'center[1]', 'center[2]', 'n.real',
+                         'n.imag', 'r', 'alpha']
+
 class Mie(ScatteringTheory):
     """
     Compute scattering using the Lorenz-Mie solution.
@@ -60,6 +80,35 @@ class Mie(ScatteringTheory):
 
     Currently, in calculating the Lorenz-Mie scattering coefficients,
     the maximum size parameter x = ka is limited to 1000. 
+
+    When superposing the fields of many spheres, an amplitude_cutoff can be
+    given to skip detector points where a sphere's scattered field is
+    negligible. Each sphere is then only evaluated on the tile of the detector
+    within the distance at which its far field amplitude, relative to the
+    incident field, falls below amplitude_cutoff. A cutoff a few times smaller
+    than the noise in your data leaves holograms unchanged to within that
+    noise.
+
+    By default the expansion is carried to the order given by the Wiscombe
+    criterion. If a field_tolerance is given, fields are instead computed with
+    the smallest order whose estimated relative error in the scattered field,
+    from the decay of |a_n| and |b_n|, is below field_tolerance. Use
+    expansion_order to see the order and error estimate used for a scatterer.
+
+    If precision is 'single', fields are stored and superposed in single
+    precision (complex64), and holograms and intensities are computed from
+    them in single precision. The field of each sphere still comes out of the
+    compiled angular sums in double precision and is converted before it is
+    superposed. Holograms, and fields computed with chunk_size, are computed
+    a chunk of detector points at a time, so these double precision
+    temporaries are only chunk sized. Scattering coefficients are always
+    computed in double precision. Choose the precision with the theory, e.g.
+    ``calc_holo(..., theory=Mie(precision='single'))``.
+
+    For a single homogeneous sphere, Mie can also compute the derivatives of a
+    hologram with respect to the sphere's center, index and radius and the
+    reference wave scaling alpha, by differentiating the series term by term
+    (see :func:`.calc_holo_derivatives`). This needs full_radial_dependence.
     """
 
     # don't need to define __init__() because we'll use the base class
@@ -67,7 +116,8 @@ class Mie(ScatteringTheory):
 
     def __init__(self, compute_escat_radial = True,
                  full_radial_dependence = True,
-                 eps1 = 1e-2, eps2 = 1e-16):
+                 eps1 = 1e-2, eps2 = 1e-16, amplitude_cutoff = None,
+                 field_tolerance = None, precision = 'double'):
         #compute_escat_radial determines if radial components will be calculated
         #full_radial dependence deermines if the full spherical Hankel function
         # will be used, or if it will be approximated to be in the far field.
@@ -75,19 +125,240 @@ class Mie(ScatteringTheory):
         self.full_radial_dependence = full_radial_dependence
         self.eps1 = eps1
         self.eps2 = eps2
+        # amplitude_cutoff determines the scattered field amplitude (relative to
+        # the incident field) below which a sphere's contribution is neglected
+        # when superposing fields from several spheres.
+        self.amplitude_cutoff = amplitude_cutoff
+        # field_tolerance determines the relative error in the scattered field
+        # allowed when truncating the expansion below the Wiscombe order.
+        self.field_tolerance = field_tolerance
+        self.precision = precision
         # call base class constructor
         super().__init__()
 
     def _can_handle(self, scatterer):
         return isinstance(scatterer, Sphere)
 
+    def _calc_field(self, scatterer, schema):
+        if (self.amplitude_cutoff is None or
+                not isinstance(scatterer, Scatterers) or
+                len(ensure_array(schema.illum_wavelen)) > 1 or
+                'x' not in schema.coords):
+            return super()._calc_field(scatterer, schema)
+
+        # superpose fields, evaluating each sphere only where it is significant
+        f = flat(schema)
+        medium_wavevec = wavevec(schema)
+        x, y, z = f.x.values, f.y.values, f.z.values
+        field = np.zeros((len(x), 3), dtype=self._field_dtype)
+        for s in scatterer.get_component_list():
+            if not self._can_handle(s):
+                raise TheoryNotCompatibleError(self, scatterer)
+            if s.center is None:
+                raise MissingParameter("center")
+            scat_coeffs = self._field_coeffs(s, medium_wavevec, schema.medium_index)
+            radius = self._significance_radius(scat_coeffs, medium_wavevec)
+            tile = _detector_tile(schema, s.center, radius)
+            # we define positive z opposite light propagation
+            dx, dy, dz = x[tile] - s.center[0], y[tile] - s.center[1], s.center[2] - z[tile]
+            near = dx**2 + dy**2 + dz**2 <= radius**2
+            if not near.any():
+                continue
+            tile = tile[near]
+            pos = to_spherical(dx[near], dy[near], dz[near])
+            pos = np.vstack((pos['r'] * medium_wavevec, pos['theta'], pos['phi']))
+            tile_field = np.vstack(mieangfuncs.mie_fields(
+                pos, scat_coeffs, schema.illum_polarization.values[:2],
+                self.compute_escat_radial, self.full_radial_dependence)).T.astype(
+                    self._field_dtype)
+            field[tile] += tile_field * np.exp(-1j*medium_wavevec*s.center[2])
+
+        return field_array(field, {primdim(f): f[primdim(f)]}, schema)
+
+    def _can_stream(self, schema):
+        # scattering coefficients are cheap enough to recompute for each
+        # chunk, but spatial culling is only implemented in _calc_field
+        return (self.amplitude_cutoff is None and
+                self._streamable_schema(schema))
+
+    def _calc_holo_derivatives(self, scatterer, schema, scaling=1.0,
+                               chunk_size=None):
+        """
+        Calculate a hologram of a single sphere and its derivatives with
+        respect to the sphere's parameters and alpha.
+
+        Parameters
+        ----------
+        scatterer : :mod:`scatterer.Sphere` object
+            homogeneous sphere
+        schema : xarray.DataArray
+            detector, as prepared by prep_schema
+        scaling : float
+            scaling value (alpha) for amplitude of reference wave
+        chunk_size : int (optional)
+            number of detector points to compute at once, defaults to
+            DERIVATIVE_CHUNK_SIZE
+
+        Returns
+        -------
+        holo : xarray.DataArray
+            hologram
+        derivatives : xarray.DataArray
+            derivatives of the hologram with respect to each of
+            DERIVATIVE_PARAMETERS, along a 'parameter' dimension
+
+        Notes
+        -----
+        The scattered field is linear in the scattering coefficients, so its
+        derivatives with respect to r and n are series of the same form with
+        the derivatives of a_n and b_n in their place. Derivatives with
+        respect to the center are found from the gradient of the series in
+        kr, theta and phi. Derivatives with respect to the imaginary part of n
+        are i times those with respect to the real part, since the field is an
+        analytic function of n.
+        """
+        if not isinstance(scatterer, Sphere) or len(ensure_array(scatterer.r)) > 1:
+            raise TheoryNotCompatibleError(self, scatterer,
+                                           "derivatives are only implemented "
+                                           "for homogeneous spheres")
+        if not self.full_radial_dependence:
+            raise ValueError("Hologram derivatives need full_radial_dependence")
+        if scatterer.center is None:
+            raise MissingParameter("center")
+        # flattened detectors have x, y and z as levels of their index
+        coords = set(schema.coords).union(
+            *[index.names for index in schema.indexes.values()])
+        if (len(ensure_array(schema.illum_wavelen)) > 1 or
+                not coords.issuperset('xyz') or
+                schema.normals.dims != ('vector',)):
+            raise ValueError("Hologram derivatives need a single illumination, "
+                             "a single detector normal and x, y and z "
+                             "detector coordinates")
+        if chunk_size is None:
+            chunk_size = DERIVATIVE_CHUNK_SIZE
+
+        medium_wavevec = wavevec(schema)
+        medium_index = schema.medium_index
+        if scatterer.r == 0:
+            raise InvalidScatterer(scatterer, "Radius is zero")
+        if medium_wavevec * scatterer.r > 1e3:
+            raise InvalidScatterer(scatterer, "radius too large, field "+
+                                   "calculation would take forever")
+        coeffs = _scat_coeffs_derivatives(scatterer.n / medium_index,
+                                          medium_wavevec * scatterer.r,
+                                          self.eps1, self.eps2)
+        lmax, _ = self._truncation(coeffs[0])
+        # coefficients and their derivatives with respect to r and n
+        coeffs = coeffs[..., :lmax] * np.array(
+            [1, medium_wavevec, 1 / medium_index])[:, np.newaxis, np.newaxis]
+
+        ref = schema.illum_polarization.values
+        projection = (1 - schema.normals.values)[:, np.newaxis]
+        center = scatterer.center
+        phase = np.exp(-1j*medium_wavevec*center[2])
+
+        dims, shape = detector_layout(schema)
+        npoints = int(np.prod(shape))
+        holo = np.empty(npoints)
+        derivatives = np.empty((len(DERIVATIVE_PARAMETERS), npoints))
+        for start in range(0, npoints, chunk_size):
+            chunk = slice(start, min(start + chunk_size, npoints))
+            x, y, z = detector_chunk(schema, dims, shape, chunk)
+            # we define positive z opposite light propagation
+            pos = to_spherical(x - center[0], y - center[1], center[2] - z)
+            fields, gradient = _mie_fields_gradient(
+                coeffs, pos['r'] * medium_wavevec, pos['theta'], pos['phi'],
+                ref[:2], self.compute_escat_radial)
+            fields *= phase
+            gradient *= phase * medium_wavevec
+            total = fields[0] * scaling + ref[:, np.newaxis]
+            # the field depends on the center through the position relative
+            # to it, whose z is reversed, and through the phase
+            dfields = [-gradient[0], -gradient[1],
+                       gradient[2] - 1j*medium_wavevec*fields[0],
+                       fields[2], 1j*fields[2], fields[1]]
+            holo[chunk] = (np.abs(total)**2 * projection).sum(axis=0)
+            for i, dfield in enumerate(dfields):
+                derivatives[i, chunk] = 2 * scaling * (
+                    np.real(total.conj() * dfield) * projection).sum(axis=0)
+            derivatives[-1, chunk] = 2 * (
+                np.real(total.conj() * fields[0]) * projection).sum(axis=0)
+
+        coords = {key: val for key, val in schema.coords.items()}
+        holo = xr.DataArray(holo.reshape(shape), dims=dims, coords=coords,
+                            attrs=schema.attrs, name=schema.name)
+        coords['parameter'] = DERIVATIVE_PARAMETERS
+        derivatives = xr.DataArray(derivatives.reshape((-1,) + shape),
+                                   dims=['parameter'] + dims, coords=coords,
+                                   attrs=schema.attrs)
+        return holo, derivatives
+
+    def _significance_radius(self, scat_coeffs, medium_wavevec):
+        '''
+        Distance beyond which the scattered field amplitude of a sphere is below
+        amplitude_cutoff.
+
+        Notes
+        -----
+        Since |pi_n| and |tau_n| are bounded by n(n+1)/2, the far field
+        amplitude is bounded by sum((2n+1)/2 (|a_n| + |b_n|)) / kr at all
+        scattering angles.
+        '''
+        s_max = _amplitude_terms(scat_coeffs).sum()
+        return s_max / (medium_wavevec * self.amplitude_cutoff)
+
+    def expansion_order(self, scatterer, medium_wavevec, medium_index):
+        '''
+        Expansion order used for field calculations, and its estimated error.
+
+        Parameters
+        ----------
+        scatterer : :mod:`scatterer.Sphere` object
+        medium_wavevec : float
+            Wave vector in the medium, k = 2 * pi * n_med / lambda_0
+        medium_index : float
+            Medium refractive index
+
+        Returns
+        -------
+        lmax : int
+            Order at which the expansion is truncated
+        error : float
+            Estimated relative error in the scattered field from truncating
+            at lmax, compared to the full Wiscombe expansion
+
+        Notes
+        -----
+        The error is estimated as the fraction of the bound on the far field
+        amplitude, sum((2n+1)/2 (|a_n| + |b_n|)), carried by the neglected
+        orders. In the near field, where higher orders decay more slowly, the
+        actual error may be larger.
+        '''
+        return self._truncation(self._scat_coeffs(scatterer, medium_wavevec,
+                                                  medium_index))
+
+    def _truncation(self, scat_coeffs):
+        terms = _amplitude_terms(scat_coeffs)
+        if self.field_tolerance is None:
+            return len(terms), 0.
+        # tail[l] is the fraction of the amplitude in orders above l
+        tail = np.append(np.cumsum(terms[::-1])[::-1], 0) / terms.sum()
+        lmax = max(int(np.argmax(tail <= self.field_tolerance)), 1)
+        return lmax, tail[lmax]
+
+    def _field_coeffs(self, s, medium_wavevec, medium_index):
+        # scattering coefficients truncated according to field_tolerance
+        scat_coeffs = self._scat_coeffs(s, medium_wavevec, medium_index)
+        lmax, _ = self._truncation(scat_coeffs)
+        return scat_coeffs[:, :lmax]
+
     def _raw_scat_matrs(self, scatterer, pos, medium_wavevec, medium_index):
         '''
         Returns far-field amplitude scattering matrices (with theta and phi
         dependence only) -- assume spherical wave asymptotic r dependence
         '''
         if isinstance(scatterer, Sphere):
-            scat_coeffs = self._scat_coeffs(scatterer, medium_wavevec, medium_index)
+            scat_coeffs = self._field_coeffs(scatterer, medium_wavevec, medium_index)
 
             # In the mie solution the amplitude scattering matrix is independent of phi
             return [mieangfuncs.asm_mie_far(scat_coeffs, theta) for
@@ -96,7 +367,7 @@ class Mie(ScatteringTheory):
             raise TheoryNotCompatibleError(self, scatterer)
 
     def _raw_fields(self, positions, scatterer, medium_wavevec, medium_index, illum_polarization):
-        scat_coeffs = self._scat_coeffs(scatterer, medium_wavevec, medium_index)
+        scat_coeffs = self._field_coeffs(scatterer, medium_wavevec, medium_index)
         return mieangfuncs.mie_fields(positions, scat_coeffs, illum_polarization.values[:2],
                                       self.compute_escat_radial,
                                       self.full_radial_dependence)
@@ -155,6 +426,65 @@ class Mie(ScatteringTheory):
 
         return np.array([cscat, cabs, cext, asym])
 
+    def _raw_cross_sections_batch(self, n, r, medium_wavevec, medium_index):
+        """
+        Calculate cross sections and asymmetry parameters of many homogeneous
+        spheres at once.
+
+        Parameters
+        ----------
+        n : array_like
+            sphere refractive indices
+        r : array_like
+            sphere radii
+        medium_wavevec : array_like
+            wave vectors in the medium
+        medium_index : float
+            medium refractive index
+
+        Returns
+        -------
+        cross_sections : ndarray (4, ...)
+            Dimensional scattering, absorption, and extinction cross sections,
+            and <cos \theta>, for n, r and medium_wavevec broadcast against
+            each other
+
+        Notes
+        -----
+        Spheres are sorted by size parameter and computed in batches of
+        CROSS_SECTION_BATCH_SIZE, so spheres in a batch need similar numbers
+        of expansion terms.
+        """
+        n, r, medium_wavevec = np.broadcast_arrays(n, r, medium_wavevec)
+        shape = n.shape
+        m_arr = (n / medium_index).ravel()
+        x_arr = (medium_wavevec * r).ravel()
+        medium_wavevec = medium_wavevec.ravel()
+        for m, x in [(m_arr[x_arr.argmin()], x_arr.min()),
+                     (m_arr[x_arr.argmax()], x_arr.max())]:
+            if x == 0:
+                raise InvalidScatterer(Sphere(n=m*medium_index, r=0),
+                                       "Radius is zero")
+            if x > 1e3:
+                raise InvalidScatterer(Sphere(n=m*medium_index),
+                                       "radius too large, field "+
+                                       "calculation would take forever")
+
+        order = np.argsort(x_arr)
+        cross_sections = np.empty((4, len(x_arr)))
+        for start in range(0, len(x_arr), CROSS_SECTION_BATCH_SIZE):
+            batch = order[start:start + CROSS_SECTION_BATCH_SIZE]
+            albl = scatcoeffs_multi_batch(m_arr[batch, np.newaxis],
+                                          x_arr[batch, np.newaxis])
+            k = medium_wavevec[batch]
+            cscat, cext, cback = miescatlib.cross_sections(
+                albl[:, 0], albl[:, 1]) * (2. * np.pi / k**2)
+            asym = 4. * np.pi / (k**2 * cscat) * \
+                miescatlib.asymmetry_parameter(albl[:, 0], albl[:, 1])
+            cross_sections[:, batch] = cscat, cext - cscat, cext, asym
+
+        return cross_sections.reshape((4,) + shape)
+
     def _scat_coeffs(self, s, medium_wavevec, medium_index):
         '''
         Calculate Mie scattering coefficients.
@@ -217,3 +547,181 @@ class Mie(ScatteringTheory):
             return  miescatlib.internal_coeffs(m_arr[0], x_arr[0], lmax)
         # else:
 #             return scatcoeffs_multi(m_arr, x_arr)
+
+
+def _amplitude_terms(scat_coeffs):
+    # contribution of each order to the bound on the far field amplitude
+    n = np.arange(1, scat_coeffs.shape[1] + 1)
+    return (2*n + 1) / 2 * abs(scat_coeffs).sum(axis=0)
+
+def _detector_tile(schema, center, radius):
+    '''
+    Flat indices of detector points within a lateral distance radius of center
+
+    For rectangular detectors the indices are found directly from the grid
+    coordinates, so the cost scales with the size of the tile rather than the
+    size of the detector.
+    '''
+    if ('x' in schema.dims and 'y' in schema.dims and 'z' in schema.dims and
+            all(np.all(np.diff(schema[d].values) > 0) for d in ('x', 'y'))):
+        xs, ys, nz = schema.x.values, schema.y.values, len(schema.z)
+        xs_idx = np.arange(np.searchsorted(xs, center[0] - radius),
+                           np.searchsorted(xs, center[0] + radius, 'right'))
+        ys_idx = np.arange(np.searchsorted(ys, center[1] - radius),
+                           np.searchsorted(ys, center[1] + radius, 'right'))
+        # flat() stacks x, y, z in that order
+        return ((xs_idx[:, None, None] * len(ys) + ys_idx[None, :, None]) * nz +
+                np.arange(nz)[None, None, :]).ravel()
+    return np.arange(len(flat(schema).x))
+
+def _scat_coeffs_derivatives(m, x, eps1, eps2):
+    '''
+    Lorenz-Mie coefficients of a homogeneous sphere and their derivatives
+
+    Parameters
+    ----------
+    m : complex
+        Sphere relative refractive index (n_sphere / n_medium)
+    x : float
+        Sphere size parameter (k_med * a)
+    eps1, eps2 : float
+        Parameters of the Lentz continued fraction, see miescatlib.scatcoeffs
+
+    Returns
+    -------
+    ndarray(3, 2, nstop), complex
+        a_n and b_n, their derivatives with respect to x, and their
+        derivatives with respect to m
+
+    Notes
+    -----
+    Writes [Bohren1983]_ eq. 4.88 as a_n = (D psi - m psi') / (D xi - m xi')
+    and b_n = (m D psi - psi') / (m D xi - xi'), with D = D_n(mx), and
+    differentiates the numerators and denominators using D' = n(n+1)/z^2 - 1
+    - D^2 and psi'' = (n(n+1)/x^2 - 1) psi.
+    '''
+    nstop = miescatlib.nstop(x)
+    n = np.arange(1, nstop + 1)
+    mx = m * x
+    D = dn_1_down(mx, nstop + 1, nstop,
+                  lentz_dn1(mx, nstop + 1, eps1, eps2))[1:]
+    dD = n*(n + 1)/mx**2 - 1 - D**2
+    psi, xi = mie_specfuncs.riccati_psi_xi(x, nstop)
+    # psi_n' = psi_{n-1} - n psi_n / x
+    dpsi, dxi = psi[:-1] - n*psi[1:]/x, xi[:-1] - n*xi[1:]/x
+    psi, xi = psi[1:], xi[1:]
+    ddpsi, ddxi = (n*(n + 1)/x**2 - 1) * psi, (n*(n + 1)/x**2 - 1) * xi
+
+    def terms(f, df, ddf):
+        # numerators (f = psi) or denominators (f = xi) of a_n and b_n, and
+        # their derivatives with respect to x and m
+        return np.array([
+            [D*f - m*df, m*D*f - df],
+            [m*dD*f + D*df - m*ddf, m**2*dD*f + m*D*df - ddf],
+            [x*dD*f - df, (D + mx*dD)*f]])
+
+    num, den = terms(psi, dpsi, ddpsi), terms(xi, dxi, ddxi)
+    coeffs = num[0] / den[0]
+    return np.array([coeffs] + [(num[i] - coeffs*den[i]) / den[0]
+                                for i in (1, 2)])
+
+def _mie_fields_gradient(coeffs, kr, theta, phi, einc, radial):
+    '''
+    Scattered fields of a sphere with full radial dependence, and the spatial
+    gradient of the first of them
+
+    Parameters
+    ----------
+    coeffs : ndarray(sets, 2, nstop), complex
+        sets of expansion coefficients a_n and b_n. The field is linear in
+        them, so sets of coefficient derivatives give field derivatives.
+    kr, theta, phi : ndarray(points)
+        spherical coordinates of the points relative to the sphere, with kr
+        nondimensionalized by the wavevector
+    einc : ndarray(2)
+        incident polarization
+    radial : bool
+        include the radial component of the scattered field
+
+    Returns
+    -------
+    fields : ndarray(sets, 3, points), complex
+        cartesian scattered field of each coefficient set, as from
+        mieangfuncs.mie_fields
+    gradient : ndarray(3, 3, points), complex
+        derivatives of the cartesian field of the first coefficient set with
+        respect to kx, ky and kz
+
+    Notes
+    -----
+    Azimuthal derivatives are divided by sin(theta) analytically, using
+    S1 - cos(theta) S2 = sin(theta)^2 T, so the gradient is finite on the
+    axis through the sphere.
+    '''
+    nstop = coeffs.shape[-1]
+    n = np.arange(1, nstop + 1)[:, np.newaxis]
+    mu, st = np.cos(theta), np.sin(theta)
+    cp, sp = np.cos(phi), np.sin(phi)
+
+    # angular functions and their derivatives with respect to cos(theta)
+    pi = np.zeros((nstop + 1, len(mu)))
+    dpi = np.zeros_like(pi)
+    pi[1] = 1
+    for l in range(2, nstop + 1):
+        pi[l] = ((2*l - 1)*mu*pi[l - 1] - l*pi[l - 2]) / (l - 1)
+        dpi[l] = ((2*l - 1)*(pi[l - 1] + mu*dpi[l - 1]) - l*dpi[l - 2]) / (l - 1)
+    tau = n*mu*pi[1:] - (n + 1)*pi[:-1]
+    dtau = n*pi[1:] + n*mu*dpi[1:] - (n + 1)*dpi[:-1]
+    pi, dpi = pi[1:], dpi[1:]
+
+    # spherical hankel function h_n(kr), xi_n'(kr)/kr and their derivatives
+    h = spherical_jn(n, kr) + 1j*spherical_yn(n, kr)
+    dh = spherical_jn(n, kr, True) + 1j*spherical_yn(n, kr, True)
+    ddh = -2/kr*dh - (1 - n*(n + 1)/kr**2)*h
+    dxi = h/kr + dh
+    ddxi = -h/kr**2 + dh/kr + ddh
+
+    prefactor = (1j**n * (2*n + 1) / (n*(n + 1))).T
+    ca = coeffs[:, 0] * prefactor
+    cb = 1j * coeffs[:, 1] * prefactor
+    cr = coeffs[:, 0] * (1j**(n + 1) * (2*n + 1)).T
+
+    def series(pi, tau, h, dxi, c=slice(None)):
+        # amplitude scattering matrix elements S1 and S2 and the radial series
+        return (ca[c].dot(pi*dxi) + cb[c].dot(tau*h),
+                ca[c].dot(tau*dxi) + cb[c].dot(pi*h), cr[c].dot(pi*h))
+
+    e1 = einc[0]*cp + einc[1]*sp
+    e2 = einc[0]*sp - einc[1]*cp
+    radial = 1 if radial else 0
+
+    def spherical(S1, S2, Er):
+        # theta, phi and radial field components
+        return 1j*S2*e1, -1j*S1*e2, radial*e1*Er
+
+    def cartesian(Eth, Eph, Er):
+        return np.array([mu*cp*Eth - sp*Eph + st*cp*Er,
+                         mu*sp*Eth + cp*Eph + st*sp*Er,
+                         -st*Eth + mu*Er])
+
+    S1, S2, R = series(pi, tau, h, dxi)
+    fields = np.moveaxis(cartesian(*spherical(S1, S2, st*R/kr)), 0, 1)
+    S1, S2, R = S1[0], S2[0], R[0]
+    Eth, Eph, Er = spherical(S1, S2, st*R/kr)
+
+    S1_r, S2_r, R_r = series(pi, tau, dh, ddxi, 0)
+    d_kr = cartesian(*spherical(S1_r, S2_r, st*(R_r - R/kr)/kr))
+    S1_t, S2_t, R_t = series(-st*dpi, -st*dtau, h, dxi, 0)
+    d_theta = (cartesian(*spherical(S1_t, S2_t, (mu*R + st*R_t)/kr)) +
+               np.array([-st*cp*Eth + mu*cp*Er, -st*sp*Eth + mu*sp*Er,
+                         -mu*Eth - st*Er]))
+    # derivatives with respect to phi, divided by sin(theta)
+    T = ca[0].dot(dxi*(pi + mu*dpi)) - cb[0].dot(h*dpi)
+    Rphi = radial*e2*R/kr
+    d_phi = np.array([1j*st*T*(e1*sp + e2*cp) - sp*Er - st*cp*Rphi,
+                      1j*st*T*(e2*sp - e1*cp) + cp*Er - st*sp*Rphi,
+                      1j*S2*e2 - mu*Rphi])
+    gradient = np.array([st*cp*d_kr + (mu*cp*d_theta - sp*d_phi)/kr,
+                         st*sp*d_kr + (mu*sp*d_theta + cp*d_phi)/kr,
+                         mu*d_kr - st*d_theta/kr])
+    return fields, gradient
@@ -42,7 +42,7 @@ import numpy as np
 from numpy import array, sin, cos, zeros, arange, real, imag, exp
 
 import scipy
-from scipy.special import riccati_jn, riccati_yn
+from scipy.special import riccati_jn, riccati_yn, spherical_jn, spherical_yn
 
 try:
     from . import mieangfuncs
@@ -202,3 +202,103 @@ def R_psi(z1, z2, nmax, eps1 = 1e-3, eps2 = 1e-16):
     for i in arange(1, nmax + 1):
         output[i] = output[i - 1] * (dnz2[i] + i / z2) / (dnz1[i] + i / z1)
     return output
+
+def riccati_psi_xi_batch(x, nstop):
+    '''
+    Calculate Riccati-Bessel functions psi and xi for an array of real
+    arguments.
+
+    Parameters
+    ----------
+    x : array_like, float
+        Arguments
+    nstop : int
+        Maximum order to calculate to
+
+    Returns
+    -------
+    psi, xi : ndarray(x.shape + (nstop + 1,))
+        psi and xi for orders 0 to nstop along the last axis
+    '''
+    x = np.asarray(x, dtype = 'float64')[..., np.newaxis]
+    n = arange(nstop + 1)
+    # y_n overflows for orders much larger than x, where psi is negligible
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        psi = x * spherical_jn(n, x)
+        xi = psi + 1j * x * spherical_yn(n, x)
+    return psi, xi
+
+def log_der_13_batch(z, nstop):
+    '''
+    Calculate logarithmic derivatives of Riccati-Bessel functions psi
+    and xi for an array of complex arguments.
+
+    Parameters
+    ----------
+    z : array_like, complex
+        Arguments
+    nstop : int
+        Maximum order of computation
+
+    Returns
+    -------
+    dn1, dn3 : ndarray(z.shape + (nstop + 1,)), complex
+
+    Notes
+    -----
+    D_n^1 is computed by downward recursion started far enough above
+    max(nstop, |z|) that the (arbitrary) starting value has decayed away, as in
+    BHMIE, rather than by the Lentz continued fraction used in log_der_13,
+    which is only available for scalar arguments. D_n^3 then follows by up
+    recursion as in [Mackowski1990]_.
+    '''
+    z = np.asarray(z, dtype = 'complex128')
+    nmx = max(nstop, int(np.round_(np.absolute(z).max()))) + 25
+
+    dn1 = zeros(z.shape + (nstop + 1,), dtype = 'complex128')
+    dn = zeros(z.shape, dtype = 'complex128')
+    for i in range(nmx - 1, -1, -1):
+        dn = (i + 1.) / z - 1.0 / (dn + (i + 1.) / z)
+        if i <= nstop:
+            dn1[..., i] = dn
+
+    dn3 = zeros(z.shape + (nstop + 1,), dtype = 'complex128')
+    dn3[..., 0] = 1.j
+    psixi = -1j * exp(1.j * z) * sin(z)
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        for i in arange(1, nstop + 1):
+            # Mackowski eqns 63, 64
+            psixi = psixi * ((i / z) - dn1[..., i - 1]) * ((i / z) - dn3[..., i - 1])
+            dn3[..., i] = dn1[..., i] + 1j / psixi
+    return dn1, dn3
+
+def Qratio_batch(z1, z2, nstop, dns1, dns2):
+    '''
+    Calculate ratio of Riccati-Bessel functions defined in [Yang2003]_
+    eq. 23 by up recursion, for arrays of arguments.
+
+    Parameters
+    ----------
+    z1, z2 : ndarray, complex
+        Arguments, of the same shape
+    nstop : int
+        Maximum order of computation
+    dns1, dns2 : tuple of ndarray
+        Logarithmic derivatives of z1 and z2, as from log_der_13_batch
+    '''
+    z1 = np.asarray(z1, dtype = 'complex128')
+    z2 = np.asarray(z2, dtype = 'complex128')
+    d1z1, d3z1 = dns1
+    d1z2, d3z2 = dns2
+
+    qns = zeros(z1.shape + (nstop + 1,), dtype = 'complex128')
+    # initialize according to Yang eqn. 34
+    a1, b1 = real(z1), imag(z1)
+    a2, b2 = real(z2), imag(z2)
+    qns[..., 0] = exp(-2.*(b2-b1)) * (exp(-1j*2.*a1)-exp(-2.*b1)) / (
+        exp(-1j*2.*a2) - exp(-2.*b2))
+    # upwards recursion in eqn. 33
+    for i in arange(1, nstop + 1):
+        qns[..., i] = qns[..., i-1] * ((d3z1[..., i] + i/z1) * (d1z2[..., i] + i/z2)
+                                       ) / ((d3z2[..., i] + i/z2) * (d1z1[..., i] + i/z1))
+    return qns
@@ -138,24 +138,26 @@ def asymmetry_parameter(al, bl):
     Parameters
     ----------
     an, bn : ndarray
-        coefficient arrays from Mie solution
+        coefficient arrays from Mie solution. Arrays with more than one
+        dimension hold the coefficients of several particles, with order along
+        the last axis.
 
     Returns
     -------
-    float
+    float or ndarray
 
     Notes
     -----
     See discussion on Bohren & Huffman p. 120.
     The output of this function omits the prefactor of 4/(x^2 Q_sca).
     '''
-    lmax = al.shape[0]
+    lmax = al.shape[-1]
     l = np.arange(lmax) + 1
     selfterm = (l[:-1] * (l[:-1] + 2.) / (l[:-1] + 1.) *
-                np.real(al[:-1] * np.conj(al[1:]) +
-                        bl[:-1] * np.conj(bl[1:]))).sum()
+                np.real(al[..., :-1] * np.conj(al[..., 1:]) +
+                        bl[..., :-1] * np.conj(bl[..., 1:]))).sum(axis=-1)
     crossterm = ((2. * l + 1.)/(l * (l + 1)) *
-                 np.real(al * np.conj(bl))).sum()
+                 np.real(al * np.conj(bl))).sum(axis=-1)
     return selfterm + crossterm
 
 def cross_sections(al, bl):
@@ -166,11 +168,13 @@ def cross_sections(al, bl):
     Parameters
     ----------
     an, bn : ndarray
-        coefficient arrays from Mie solution
+        coefficient arrays from Mie solution. Arrays with more than one
+        dimension hold the coefficients of several particles, with order along
+        the last axis.
    
     Returns
     -------
-    ndarray(3)
+    ndarray(3, ...)
         Scattering, extinction, and radar backscattering cross sections
 
     Notes
@@ -178,15 +182,15 @@ def cross_sections(al, bl):
     See Bohren & Huffman eqns. 4.61 and 4.62.
     The output omits a scaling prefactor of 2 * pi / k^2.
     '''
-    lmax = al.shape[0]
+    lmax = al.shape[-1]
 
     l = np.arange(lmax) + 1
     prefactor = (2. * l + 1.)
-    cscat = (prefactor * (np.abs(al)**2 + np.abs(bl)**2)).sum()
-    cext = (prefactor * np.real(al + bl)).sum()
+    cscat = (prefactor * (np.abs(al)**2 + np.abs(bl)**2)).sum(axis=-1)
+    cext = (prefactor * np.real(al + bl)).sum(axis=-1)
 
     # see p. 122
     alts = 2. * (np.arange(lmax) % 2) - 1
-    cback = np.abs((prefactor * alts * (al - bl)).sum())**2
+    cback = np.abs((prefactor * alts * (al - bl)).sum(axis=-1))**2
 
     return array([cscat, cext, cback])
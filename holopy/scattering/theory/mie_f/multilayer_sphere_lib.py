@@ -38,6 +38,8 @@ from ...errors import InvalidScatterer
 try:
     from . import miescatlib
     from .mie_specfuncs import Qratio, log_der_13, riccati_psi_xi
+    from .mie_specfuncs import (Qratio_batch, log_der_13_batch,
+                                riccati_psi_xi_batch)
 except ImportError:
     pass
 
@@ -123,3 +125,86 @@ def scatcoeffs_multi(marray, xarray, eps1 = 1e-3, eps2 = 1e-16):
     bn = ((hbns*marray[nlayers-1] + n/xarray[nlayers-1])*psi - psishift) / ( 
         (hbns*marray[nlayers-1] + n/xarray[nlayers-1])*xi - xishift)
     return np.array([an[1:nstop+1], bn[1:nstop+1]]) # output begins at n=1
+
+def scatcoeffs_multi_batch(marrays, xarrays):
+    '''
+    Calculate scattered field expansion coefficients for a batch of
+    particles with spherically symmetric layers.
+
+    Parameters
+    ----------
+    marrays : array_like (N, L), complex128
+        layer indices of each of N particles, innermost first
+    xarrays : array_like (N, L), real
+        layer size parameters (k * outer radius) of each of N particles,
+        innermost first
+
+    Returns
+    -------
+    scat_coeffs : ndarray (N, 2, nstop), complex
+        Scattering coefficients a_n and b_n of each particle. nstop is set by
+        the largest particle in the batch; coefficients of smaller particles
+        beyond their own expansion order are zero.
+
+    Notes
+    -----
+    Performs the same recursion as scatcoeffs_multi on every particle at once.
+    All particles must have the same number of layers L; a particle with fewer
+    layers can be padded by repeating its innermost layer.
+    '''
+    marrays = np.atleast_2d(np.array(marrays, dtype = 'complex128'))
+    xarrays = np.atleast_2d(np.array(xarrays, dtype = 'float64'))
+
+    if marrays.shape != xarrays.shape:
+        from ...scatterer.sphere import Sphere
+        raise InvalidScatterer(Sphere(),'Arrays of layer indices and size parameters must be the same shape!')
+
+    nlayers = marrays.shape[1]
+    x_outer = xarrays.max(axis = 1)
+    nstops = np.array([miescatlib.nstop(x) for x in x_outer])
+    nstop = nstops.max()
+
+    # log derivatives at every interface, m_l x_{l-1} and m_l x_l
+    if nlayers > 1:
+        dn1_in, dn3_in = log_der_13_batch(marrays[:, 1:] * xarrays[:, :-1],
+                                          nstop)
+    dn1_out, dn3_out = log_der_13_batch(marrays * xarrays, nstop)
+
+    # initialize H_n^a and H_n^b in the core, see eqns. 12a and 13a
+    hans = dn1_out[:, 0]
+    hbns = dn1_out[:, 0]
+
+    for lay in np.arange(1, nlayers):
+        m_in = marrays[:, lay-1, np.newaxis]
+        m_out = marrays[:, lay, np.newaxis]
+        derz1s = dn1_in[:, lay-1], dn3_in[:, lay-1]
+        derz2s = dn1_out[:, lay], dn3_out[:, lay]
+
+        # eqns 26-29
+        G1 = m_out*hans - m_in*derz1s[0]
+        G2 = m_out*hans - m_in*derz1s[1]
+        Gt1 = m_in*hbns - m_out*derz1s[0]
+        Gt2 = m_in*hbns - m_out*derz1s[1]
+
+        Qnl = Qratio_batch(marrays[:, lay]*xarrays[:, lay-1],
+                           marrays[:, lay]*xarrays[:, lay], nstop,
+                           derz1s, derz2s)
+
+        # eqns 24 and 25
+        hans = (G2*derz2s[0] - Qnl*G1*derz2s[1]) / (G2 - Qnl*G1)
+        hbns = (Gt2*derz2s[0] - Qnl*Gt1*derz2s[1]) / (Gt2 - Qnl*Gt1)
+
+    # Yang eqns 14 and 15
+    psi, xi = riccati_psi_xi_batch(x_outer, nstop)
+    n = np.arange(nstop+1)
+    psishift = np.concatenate((np.zeros((len(psi), 1)), psi), axis = 1)[:, 0:nstop+1]
+    xishift = np.concatenate((np.zeros((len(xi), 1)), xi), axis = 1)[:, 0:nstop+1]
+    m_L = marrays[:, -1, np.newaxis]
+    x_L = xarrays[:, -1, np.newaxis]
+    with np.errstate(over = 'ignore', invalid = 'ignore', divide = 'ignore'):
+        an = ((hans/m_L + n/x_L)*psi - psishift) / (
+            (hans/m_L + n/x_L)*xi - xishift)
+        bn = ((hbns*m_L + n/x_L)*psi - psishift) / (
+            (hbns*m_L + n/x_L)*xi - xishift)
+    coeffs = np.stack((an[:, 1:], bn[:, 1:]), axis = 1) # output begins at n=1
+    return np.where(n[1:] > nstops[:, np.newaxis, np.newaxis], 0, coeffs)
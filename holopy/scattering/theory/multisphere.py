@@ -77,6 +77,12 @@ class Multisphere(ScatteringTheory):
     qeps2 : float (optional)
         error tolerance used to determine at what order the cluster
         spherical harmonic expansion should be truncated
+    precision : string (optional)
+        'double' (default) or 'single'. In single precision only the
+        returned fields are stored in complex64; the interaction equations
+        and the field sums at detector points are computed in double
+        precision and converted afterwards, so peak memory during the
+        calculation is not reduced.
 
     Notes
     -----
@@ -122,7 +128,8 @@ class Multisphere(ScatteringTheory):
     """
 
     def __init__(self, niter=200, eps=1e-6, meth=1, qeps1=1e-5, qeps2=1e-8,
-                 compute_escat_radial = False, suppress_fortran_output = True):
+                 compute_escat_radial = False, suppress_fortran_output = True,
+                 precision = 'double'):
         self.niter = niter
         self.eps = eps
         self.meth = meth
@@ -130,6 +137,7 @@ class Multisphere(ScatteringTheory):
         self.qeps2 = qeps2
         self.compute_escat_radial = compute_escat_radial
         self.suppress_fortran_output=suppress_fortran_output
+        self.precision = precision
 
         # call base class constructor
         super(Multisphere, self).__init__()
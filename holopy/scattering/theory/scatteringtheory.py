@@ -30,12 +30,17 @@ from holopy.core.holopy_object import HoloPyObject
 from ..scatterer import Scatterers, Sphere
 from ..errors import TheoryNotCompatibleError, MissingParameter
 from ...core.metadata import vector, illumination, sphere_coords, primdim, update_metadata, clean_concat
+from ...core.math import to_spherical
 from ...core.utils import dict_without, updated, ensure_array
 try:
     from .mie_f import mieangfuncs
 except ImportError:
     pass
 
+# default number of detector points handled at once by
+# ScatteringTheory._calc_streamed
+HOLO_CHUNK_SIZE = 2**16
+
 def wavevec(a):
         return 2*np.pi/(a.illum_wavelen/a.medium_index)
 
@@ -45,6 +50,29 @@ def stack_spherical(a):
     return np.vstack((a['r'],a['theta'],a['phi']))
 
 
+def field_array(field, positions, schema):
+    # wrap a raw (point, vector) field in a DataArray labeled like the schema
+    dimstr=primdim(positions)
+    coords = {key: (dimstr, val.values) for key, val in positions[dimstr].coords.items()}
+    coords = updated(coords, {dimstr: positions[dimstr], vector: ['x', 'y', 'z']})
+    return xr.DataArray(field, dims=[dimstr, vector], coords = coords, attrs=schema.attrs)
+
+def detector_layout(schema):
+    # detector dimensions in the order x, y, z, then any others, and their
+    # sizes. Streamed results are stored in this order.
+    dims = [d for d in 'xyz' if d in schema.dims]
+    dims += [d for d in schema.dims if d not in dims]
+    return dims, tuple(schema.sizes[d] for d in dims)
+
+def detector_chunk(schema, dims, shape, chunk):
+    # x, y and z coordinates of the detector points in a slice of the
+    # flattened detector_layout
+    index = dict(zip(dims, np.unravel_index(np.arange(chunk.start, chunk.stop), shape)))
+    return np.broadcast_arrays(*[
+        schema[c].values[tuple(index[d] for d in schema[c].dims)]
+        for c in 'xyz'])
+
+
 class ScatteringTheory(HoloPyObject):
     """
     Defines common interface for all scattering theories.
@@ -59,8 +87,28 @@ class ScatteringTheory(HoloPyObject):
     So the simplest thing is to just implement _raw_scat_matrs. You only need to
     do _raw_fields there is a way to compute it more efficently and you care
     about that speed, or if it is easier and you don't care about matrices.
+
+    Theories that take a precision argument store fields in single precision
+    (complex64) if precision is 'single'. Scattering coefficients and the
+    field of each component are computed in double precision by _raw_fields
+    and converted afterwards; the superposition of the components and the
+    holograms computed from it are done in single precision. When fields are
+    computed in chunks (_calc_streamed) the double precision temporaries are
+    only chunk sized.
     """
 
+    # theories which do not take a precision argument always compute fields in
+    # double precision
+    precision = 'double'
+
+    @property
+    def _field_dtype(self):
+        dtypes = {'double': np.complex128, 'single': np.complex64}
+        if self.precision not in dtypes:
+            raise ValueError("precision must be 'single' or 'double', "
+                             "not {0}".format(self.precision))
+        return dtypes[self.precision]
+
     def _calc_field(self, scatterer, schema):
         """
         Calculate fields.  Implemented in derived classes only.
@@ -77,7 +125,7 @@ class ScatteringTheory(HoloPyObject):
             if isinstance(scatterer,Sphere) and scatterer.center is None:
                 raise MissingParameter("center")
             positions = sphere_coords(schema, s.center, wavevec=wavevec(schema))
-            field = np.vstack(self._raw_fields(stack_spherical(positions), s, medium_wavevec=wavevec(schema), medium_index=schema.medium_index, illum_polarization=schema.illum_polarization)).T
+            field = np.vstack(self._raw_fields(stack_spherical(positions), s, medium_wavevec=wavevec(schema), medium_index=schema.medium_index, illum_polarization=schema.illum_polarization)).T.astype(self._field_dtype)
             phase = np.exp(-1j*wavevec(schema)*s.center[2])
             # TODO: fix and re-enable internal fields
             #if self._scatterer_overlaps_schema(scatterer, schema):
@@ -86,11 +134,7 @@ class ScatteringTheory(HoloPyObject):
             #        self._raw_internal_fields(positions[inner].T, s,
             #                                  optics)).T
             field *= phase
-            dimstr=primdim(positions)
-            coords = {key: (dimstr, val.values) for key, val in positions[dimstr].coords.items()}
-            coords = updated(coords, {dimstr: positions[dimstr], vector: ['x', 'y', 'z']})
-            field = xr.DataArray(field, dims=[dimstr, vector], coords = coords, attrs=schema.attrs)
-            return field
+            return field_array(field, positions, schema)
 
         if len(ensure_array(schema.illum_wavelen)) > 1:
             field = []
@@ -100,20 +144,153 @@ class ScatteringTheory(HoloPyObject):
                     illum_polarization=ensure_array(schema.illum_polarization.sel(illumination=illum).values))))
             field = clean_concat(field, dim = schema.illum_wavelen.illumination)
         else:
-            # See if we can handle the scatterer in one step
-            if self._can_handle(scatterer):
-                field = get_field(scatterer)
-            elif isinstance(scatterer, Scatterers):
-            # if it is a composite, try superposition
-                scatterers = scatterer.get_component_list()
-                field = get_field(scatterers[0])
-                for s in scatterers[1:]:
-                    field += get_field(s)
-            else:
-                raise TheoryNotCompatibleError(self, scatterer)
+            scatterers = self._field_components(scatterer)
+            field = get_field(scatterers[0])
+            for s in scatterers[1:]:
+                field += get_field(s)
 
         return field
 
+    def _field_components(self, scatterer):
+        # See if we can handle the scatterer in one step
+        if self._can_handle(scatterer):
+            return [scatterer]
+        elif isinstance(scatterer, Scatterers):
+            # if it is a composite, try superposition
+            return scatterer.get_component_list()
+        else:
+            raise TheoryNotCompatibleError(self, scatterer)
+
+    def _can_stream(self, schema):
+        # _calc_streamed calls _raw_fields once per chunk, so theories which
+        # solve for the scatterer in _raw_fields (Multisphere, DDA, Tmatrix)
+        # would repeat the solve for every chunk. Theories opt in by
+        # overriding this.
+        return False
+
+    def _streamable_schema(self, schema):
+        # _calc_streamed needs x, y and z detector coordinates with a single
+        # normal and a single illumination
+        return (len(ensure_array(schema.illum_wavelen)) == 1 and
+                all(c in schema.coords for c in 'xyz') and
+                schema.normals.dims == (vector,))
+
+    def _calc_streamed(self, scatterer, schema, evaluate, components=(),
+                       dtype=None, out=None, chunk_size=None):
+        """
+        Calculate a quantity derived from the scattered field, a chunk of
+        detector points at a time.
+
+        The scattered field of every component is computed for chunk_size
+        detector points at a time, passed to evaluate, and the result written
+        into out, so memory use beyond out itself is independent of the size of
+        the detector.
+
+        Parameters
+        ----------
+        scatterer : :mod:`.scatterer` object
+            (possibly composite) scatterer for which to compute scattering
+        schema : xarray.DataArray
+            detector, as prepared by prep_schema. Must satisfy _can_stream
+        evaluate : function
+            takes the scattered field at a chunk of points, an array (3,
+            points), and returns the quantity to store, an array (components...,
+            points)
+        components : list of (dim, coords) (optional)
+            leading dimensions of the quantity returned by evaluate
+        dtype : numpy dtype (optional)
+            dtype of the result if out is not given. Defaults to the field
+            dtype
+        out : array_like (optional)
+            C contiguous array (a numpy.memmap works) to write the result
+            into. Its shape must be the component shape followed by the
+            detector shape, with detector dimensions in the order x, y, z.
+        chunk_size : int (optional)
+            number of detector points to compute at once, defaults to
+            HOLO_CHUNK_SIZE
+
+        Returns
+        -------
+        result : xarray.DataArray
+            result, with the metadata of schema and wrapping out if it was
+            given
+        """
+        if isinstance(scatterer,Sphere) and scatterer.center is None:
+            raise MissingParameter("center")
+        if chunk_size is None:
+            chunk_size = HOLO_CHUNK_SIZE
+        scatterers = self._field_components(scatterer)
+        medium_wavevec = wavevec(schema)
+
+        dims, shape = detector_layout(schema)
+        npoints = int(np.prod(shape))
+        lead = tuple(len(c) for d, c in components)
+        if out is None:
+            out = np.empty(lead + shape, dtype=dtype or self._field_dtype)
+        elif out.shape != lead + shape or not out.flags.c_contiguous:
+            raise ValueError("out must be a C contiguous array of shape "
+                             "{0}".format(lead + shape))
+        flat_out = out.reshape(lead + (npoints,))
+
+        for start in range(0, npoints, chunk_size):
+            chunk = slice(start, min(start + chunk_size, npoints))
+            x, y, z = detector_chunk(schema, dims, shape, chunk)
+            field = np.zeros((3, len(x)), dtype=self._field_dtype)
+            for s in scatterers:
+                # we define positive z opposite light propagation
+                pos = to_spherical(x - s.center[0], y - s.center[1], s.center[2] - z)
+                pos = np.vstack((pos['r'] * medium_wavevec, pos['theta'], pos['phi']))
+                # converted before the phase and the sum, so that these are
+                # done in the field dtype
+                component = np.array(self._raw_fields(
+                    pos, s, medium_wavevec=medium_wavevec,
+                    medium_index=schema.medium_index,
+                    illum_polarization=schema.illum_polarization),
+                    dtype=self._field_dtype)
+                component *= np.exp(-1j*medium_wavevec*s.center[2])
+                field += component
+            flat_out[..., chunk] = evaluate(field)
+
+        coords = {key: val for key, val in schema.coords.items()}
+        coords.update(components)
+        return xr.DataArray(out, dims=[d for d, c in components] + dims,
+                            coords=coords, attrs=schema.attrs, name=schema.name)
+
+    def _calc_holo(self, scatterer, schema, scaling=1.0, out=None, chunk_size=None):
+        """
+        Calculate a hologram without storing the scattered field at every
+        detector point.
+
+        Parameters
+        ----------
+        scatterer : :mod:`.scatterer` object
+            (possibly composite) scatterer for which to compute scattering
+        schema : xarray.DataArray
+            detector, as prepared by prep_schema. Must satisfy _can_stream
+        scaling : float
+            scaling value (alpha) for amplitude of reference wave
+        out, chunk_size : optional
+            see _calc_streamed
+
+        Returns
+        -------
+        holo : xarray.DataArray
+            hologram
+        """
+        ref = schema.illum_polarization.values
+        projection = 1 - schema.normals.values
+
+        def hologram(field):
+            holo = np.zeros(field.shape[1], dtype=np.finfo(field.dtype).dtype)
+            for i in range(3):
+                if projection[i] != 0:
+                    holo += np.abs(field[i] * scaling + ref[i])**2 * projection[i]
+            return holo
+
+        return self._calc_streamed(scatterer, schema, hologram,
+                                   dtype=np.finfo(self._field_dtype).dtype,
+                                   out=out, chunk_size=chunk_size)
+
     def _calc_cross_sections(self, scatterer, medium_wavevec, medium_index, illum_polarization):
         raw_sections = self._raw_cross_sections(scatterer=scatterer,
                                                 medium_wavevec=medium_wavevec,